@@ -6,6 +6,8 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 import os
 
+import pygit2
+
 from git_orm import models as git_models, GitError
 
 from django.core.files import File as DjangoFile
@@ -32,6 +34,12 @@ class FileModelMixin(object):
                 hash.update(data)
         return hash.hexdigest()
 
+    def get_fingerprint(self):
+        """
+        Returns a digest identifying the content of the file.
+        """
+        return self.get_file_hash()
+
     def get_value_as_string(self):
         self.file.open()
         try:
@@ -125,6 +133,13 @@ class GitFile(git_models.Model, FileModelMixin):
     def file(self):
         return DummyFileDescriptor(self)
 
+    def get_fingerprint(self):
+        """
+        Returns the id of the git blob of the content, computed from the loaded content.
+        """
+        content = self.content.encode("utf-8") if isinstance(self.content, str) else bytes(self.content)
+        return str(pygit2.hash(content))
+
     def dump(self, include_hidden=False, include_pk=True):
         field = self._meta.get_field('content')
         return field.get_prep_value(self.content)
@@ -142,6 +157,13 @@ class GitBinaryFile(git_models.Model, FileModelMixin):
     def file(self):
         return DummyFileDescriptor(self)
 
+    def get_fingerprint(self):
+        """
+        Returns the id of the git blob of the content, computed from the loaded content.
+        """
+        content = self.content.encode("utf-8") if isinstance(self.content, str) else bytes(self.content)
+        return str(pygit2.hash(content))
+
     def dump(self, include_hidden=False, include_pk=True):
         field = self._meta.get_field('content')
         return field.get_prep_value(self.content)
@@ -25,6 +25,8 @@ class ObjCache(object):
 
 class QuerySet(object):
     _prefetch_related_lookups = None
+    # Objects assigned by prefetch_related, served instead of executing the query
+    _result_cache = None
     REPR_MAXLEN = 10
 
     def __init__(self, model, query=None, transaction=None):
@@ -86,10 +88,14 @@ class QuerySet(object):
         return QuerySet(self.model, self.query, transaction)
 
     def __iter__(self):
+        if self._result_cache is not None:
+            return iter(self._result_cache)
         pks, obj_cache = self._execute()
         return iter([obj_cache[pk] for pk in pks])
 
     def __len__(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
         pks, obj_cache = self._execute()
         return len(list(pks))
 
@@ -128,6 +134,8 @@ class QuerySet(object):
         return obj_cache[pk]
 
     def exists(self, *args, **kwargs):
+        if self._result_cache is not None and not args and not kwargs:
+            return len(self._result_cache) > 0
         pks, _ = self._execute(*args, **kwargs)
         try:
             next(pks)
@@ -136,9 +144,24 @@ class QuerySet(object):
         return True
 
     def count(self, *args, **kwargs):
+        if self._result_cache is not None and not args and not kwargs:
+            return len(self._result_cache)
         pks, _ = self._execute(*args, **kwargs)
         return sum(1 for _ in pks)
 
+    def values_list(self, *fields, flat=False):
+        """
+        Returns the primary keys of the matched objects. Objects are only loaded
+        if the query filters or orders them by other fields.
+        Only values_list("pk", flat=True) is supported.
+        """
+        if not flat or len(fields) != 1 or fields[0] not in ("pk", self.model._meta.pk.attname):
+            raise NotImplementedError("only the primary keys can be listed")
+        if self._result_cache is not None:
+            return [obj.pk for obj in self._result_cache]
+        pks, _ = self._execute()
+        return list(pks)
+
     def order_by(self, *order_by):
         return QuerySet(self.model, self.query.order_by(*order_by), self.transaction)
 
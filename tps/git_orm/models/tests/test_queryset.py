@@ -205,3 +205,14 @@ class TestExecute:
         ok_(qs.exists())
         eq_(qs.count(), 2)
         eq_(list(qs), [x1, x2])
+
+    def test_result_cache(self):
+        x = X()
+        qs = QuerySet(X)
+        qs._result_cache = [x]
+        qs._execute = Mock(side_effect=AssertionError)
+        ok_(qs.exists())
+        eq_(qs.count(), 1)
+        eq_(len(qs), 1)
+        eq_(list(qs.all()), [x])
+        eq_(qs.filter(a=1)._result_cache, None)
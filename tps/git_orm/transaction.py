@@ -56,6 +56,13 @@ class Transaction(object):
 
         self.has_changes = False
         self.messages = []
+        self._commit_callbacks = []
+
+    def on_commit(self, func):
+        """
+        Registers func to be called with the id of the new commit once the transaction is committed.
+        """
+        self._commit_callbacks.append(func)
 
     def get_memory_tree(self, path):
         memory_tree = self.memory_tree
@@ -226,12 +233,26 @@ class Transaction(object):
         if not author_signature:
             author_signature = sig
         ref = get_branch_reference(self.branch)
-        return self.repo.create_commit(
+        commit_oid = self.repo.create_commit(
             ref, author_signature, sig, message, tree_id, parents, 'utf-8')
+        # The transaction goes on from the new commit, so objects saved in it now refer to that commit
+        self.parents = [commit_oid]
+        self.memory_tree = MemoryTree(self.repo[commit_oid].tree, {}, {})
+        self.has_changes = False
+        self.messages = []
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for func in callbacks:
+            func(commit_oid)
+        return commit_oid
 
     def rollback(self):
-        self.memory_tree = {}
+        tree = []
+        if self.parents:
+            tree = self.repo[self.parents[0]].tree
+        self.memory_tree = MemoryTree(tree, {}, {})
+        self.has_changes = False
         self.messages = []
+        self._commit_callbacks = []
 
 
 _transaction = None
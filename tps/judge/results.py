@@ -22,6 +22,8 @@ class EvaluationResult(object):
             execution_time=None,  # in seconds
             execution_memory=None,  # in MB
             message="",
+            problem_missing=False,
+            testcase_missing=False,
     ):
         self.success = success
         self.output_file = output_file
@@ -29,3 +31,7 @@ class EvaluationResult(object):
         self.execution_time = execution_time
         self.execution_memory = execution_memory
         self.verdict = verdict
+        # Set on failed results when the judge no longer has the problem or the testcase,
+        # in which case they should be initialized in the judge again.
+        self.problem_missing = problem_missing
+        self.testcase_missing = testcase_missing or problem_missing
@@ -1,5 +1,9 @@
 class TaskType(object):
 
+    # Whether generate_outputs evaluates runs concurrently, so that all runs
+    # of an invocation should be handed to it at once rather than one by one.
+    evaluates_concurrently = False
+
     def __init__(self, judge):
         self.judge = judge
 
@@ -14,9 +18,9 @@ class TaskType(object):
     ):
         """
         Initializes a new problem in the judge or updates an exisiting one.
-        problem_code (str): A string to reference this problem in the judge. This should be a unique string.
-        In case a problem with the same name have already been initialized,
-        ths judge will have to update (or simply delete and recreate) that problem.
+        problem_code (str): A string to reference this problem in the judge. This should be a unique string
+        identifying the arguments below: in case a problem with the same code has already been initialized,
+        the judge may reuse that problem as is.
         code_name (str): The name for submitted solution files.
         task_type_parameters(str): A json encoded dictionary containing task type parameters
         helpers ([(str, FileModel)]): a list of files that are required when judging submissions
@@ -36,7 +40,8 @@ class TaskType(object):
         problem_code (str): code used to reference the problem.
         The problem should be previously initialized by calling initialize_problem
         testcase_code (str): Name of the testcase. This value should be unique
-        among testcases of this problem.
+        among testcases of this problem and identify its input, since a testcase
+        with the same code that has already been added may be reused.
         input_file (FileModel)
         :return (bool, str|None): returns a tuple, the first element is True if the
         testcase was added successfully, and False otherwise.
@@ -60,6 +65,46 @@ class TaskType(object):
         """
         raise NotImplementedError
 
+    def generate_outputs(self, problem_code, runs, on_results):
+        """
+        Runs several solutions on test-cases of a problem.
+        runs ([(key, str, str, (str, FileModel))]): each run is a tuple of the form
+        (key, testcase_code, language, solution_file), the last three being the same as generate_output
+        on_results (callable): called with lists of tuples (key, EvaluationResult) as runs finish
+        """
+        for key, testcase_code, language, solution_file in runs:
+            on_results([(key, self.generate_output(problem_code, testcase_code, language, solution_file))])
+
+    def submit_run(self, problem_code, testcase_code, language, solution_file):
+        """
+        Starts running a solution on the given test-case without waiting for its result.
+        The arguments are the same as generate_output.
+        Judges that can not run solutions asynchronously simply evaluate the solution.
+
+        :return (str|None, EvaluationResult|None): a tuple, the first element is a handle
+        to be passed to collect_results if the run is pending in the judge. Otherwise the
+        second element is the result of the run. If the problem or the testcase no longer exists
+        in the judge, the result is failed and has problem_missing or testcase_missing set.
+        """
+        return None, self.generate_output(problem_code, testcase_code, language, solution_file)
+
+    def collect_results(self, problem_code, handles):
+        """
+        Checks the runs started by submit_run, without waiting for them.
+        handles ([str]): the handles returned by submit_run
+
+        :return {str: EvaluationResult}: the results of the finished runs keyed by their handles.
+        Pending runs are left out.
+        """
+        raise NotImplementedError
+
+    def get_poll_interval(self, attempt):
+        """
+        Returns how many seconds to wait before the given (zero-based) attempt of
+        collecting the result of a run, or None if the judge should no longer be waited for.
+        """
+        raise NotImplementedError
+
     def get_parameters_form(self):
         """
 
@@ -14,6 +14,20 @@ JUDGE_HANDLERS = {
         }
     }
 }
+
+The connection to CMS can be tuned by the following optional parameters:
+connect_timeout and read_timeout (in seconds), retries and backoff_factor
+for idempotent requests, pool_size (the number of kept-alive connections)
+and health_check_ttl (how long, in seconds, the availability of CMS is cached).
+
+Results of runs are polled for with an exponential backoff, starting from
+poll_initial_interval seconds and growing by poll_backoff up to poll_max_interval.
+A run is reported as failed if it takes more than poll_timeout seconds.
+All runs of an invocation are evaluated together, keeping at most
+max_in_flight of them pending in CMS at a time.
+Tasks and testcases known to exist in CMS are not uploaded again
+for known_objects_ttl seconds, unless CMS reports them missing when running
+a solution, in which case they are uploaded again.
 """
 
 
@@ -22,11 +36,14 @@ from .batch import Batch
 from .communication import Communication
 from .output_only import OutputOnly
 from .two_steps import TwoSteps
+from .client import get_client
 import os
 
 
 class CMS(Judge):
-    def __init__(self, api_address):
+    def __init__(self, api_address, poll_initial_interval=0.25, poll_backoff=1.5,
+                 poll_max_interval=5, poll_timeout=3600, max_in_flight=32,
+                 known_objects_ttl=24 * 3600, **client_options):
         self.task_types = {
             "Batch": Batch,
             "Communication": Communication,
@@ -34,6 +51,14 @@ class CMS(Judge):
             "TwoSteps": TwoSteps
         }
         self.api_address = api_address
+        client_options.setdefault('pool_size', max_in_flight)
+        self.client = get_client(api_address, **client_options)
+        self.poll_initial_interval = poll_initial_interval
+        self.poll_backoff = poll_backoff
+        self.poll_max_interval = poll_max_interval
+        self.poll_timeout = poll_timeout
+        self.max_in_flight = max_in_flight
+        self.known_objects_ttl = known_objects_ttl
 
     def get_task_types(self):
         return ["Batch", "Communication", "OutputOnly", "TwoSteps"]
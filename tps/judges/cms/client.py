@@ -0,0 +1,167 @@
+# coding=utf-8
+import json
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CMSClient", "CMSClientError", "get_client"]
+
+
+# Requests which can safely be sent again after the server has (possibly) seen them.
+# Connection failures are retried for every method since nothing has reached the server.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS"])
+RETRY_STATUSES = frozenset([502, 503, 504])
+
+
+class CMSClientError(Exception):
+
+    def __init__(self, message, status_code=None):
+        super(CMSClientError, self).__init__(message)
+        self.status_code = status_code
+
+
+def _create_retry(retries, backoff_factor):
+    options = dict(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    try:
+        return Retry(allowed_methods=IDEMPOTENT_METHODS, **options)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **options)
+
+
+class CMSClient(object):
+    """
+    A client of the CMS API keeping a pool of persistent connections.
+    Idempotent requests are retried with an exponential backoff, and the
+    availability of the server is only checked once per health_check_ttl seconds.
+    """
+
+    def __init__(self, api_address, connect_timeout=5, read_timeout=60,
+                 retries=3, backoff_factor=0.5, pool_size=10, health_check_ttl=30):
+        self.api_address = api_address
+        self.timeout = (connect_timeout, read_timeout)
+        self.health_check_ttl = health_check_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=_create_retry(retries, backoff_factor),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._available = None
+        self._checked_at = None
+        self._batch_results_supported = True
+        self._lock = threading.Lock()
+
+    def _set_available(self, available):
+        with self._lock:
+            self._available = available
+            self._checked_at = time.monotonic()
+
+    def is_available(self):
+        with self._lock:
+            if self._checked_at is not None and \
+                    time.monotonic() - self._checked_at < self.health_check_ttl:
+                return self._available
+        try:
+            self.session.get(self.api_address, timeout=self.timeout)
+        except requests.RequestException:
+            self._set_available(False)
+        else:
+            self._set_available(True)
+        return self._available
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request to the given path of the API and returns its decoded JSON body.
+        Raises CMSClientError if the server can not be reached or does not answer properly.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, self.api_address + path, **kwargs)
+        except requests.ConnectionError as e:
+            logger.warning("Could not connect to CMS: {}".format(e))
+            self._set_available(False)
+            raise CMSClientError("No connection to CMS")
+        except requests.RequestException as e:
+            raise CMSClientError(str(e))
+        self._set_available(True)
+
+        if response.status_code != 200:
+            raise CMSClientError("%d Error" % response.status_code, status_code=response.status_code)
+        try:
+            return response.json()
+        except ValueError:
+            raise CMSClientError("Invalid response from CMS")
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, data=None, **kwargs):
+        return self.request("POST", path, data=data, **kwargs)
+
+    def get_result(self, problem_code, submission_id):
+        return self.get('task/{}/test/{}/result'.format(problem_code, submission_id))
+
+    def get_results(self, problem_code, submission_ids):
+        """
+        Returns the responses of the result queries of the given submissions, keyed by their ids.
+        A single batch request is sent if the server supports it, otherwise they are queried one by one.
+        Any failure of the batch request is taken as the server not supporting it.
+        """
+        submission_ids = [str(submission_id) for submission_id in submission_ids]
+        if self._batch_results_supported and len(submission_ids) > 1:
+            try:
+                response = self.post('task/{}/tests/results'.format(problem_code),
+                                     data={'ids': json.dumps(submission_ids)})
+                if response['status'] is False:
+                    raise CMSClientError(response['message'])
+            except CMSClientError as e:
+                logger.info("CMS batch result query failed ({}), falling back to single queries".format(e))
+                self._batch_results_supported = False
+            else:
+                return {
+                    submission_id: response['message'][submission_id]
+                    for submission_id in submission_ids
+                    if submission_id in response['message']
+                }
+        return {
+            submission_id: self.get_result(problem_code, submission_id)
+            for submission_id in submission_ids
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_address, **options):
+    """
+    Returns the client of the given address, so that judges created for
+    different requests in the same process share its connection pool.
+    """
+    key = (api_address, tuple(sorted(options.items())))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = CMSClient(api_address, **options)
+        return _clients[key]
@@ -1,15 +1,18 @@
 # coding=utf-8
+import hashlib
 import os
 import re
+import uuid
 
 from judge.tasktype import TaskType
 import json
 import base64
-import requests
 import time
 from judge.results import EvaluationResult, JudgeVerdict
 from file_repository.models import FileModel
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from .client import CMSClientError
 import logging
 
 
@@ -38,7 +41,7 @@ def get_judge_verdict_from_cms(status, compiled, output):
     return True, JudgeVerdict.ok
 
 
-def create_evaluation_result(failed=False, evalres=None, message=''):
+def create_evaluation_result(failed=False, evalres=None, message='', **missing):
     if failed:
         return EvaluationResult(
             success=False,
@@ -46,7 +49,8 @@ def create_evaluation_result(failed=False, evalres=None, message=''):
             execution_time=0,
             execution_memory=0,
             verdict=JudgeVerdict.judge_failed,
-            message=message
+            message=message,
+            **missing
         )
 
     success, verdict = \
@@ -72,22 +76,61 @@ def create_evaluation_result(failed=False, evalres=None, message=''):
     )
 
 
+MISSING_MESSAGE = re.compile(r"(not found|does not exist|doesn't exist|no such)", re.IGNORECASE)
+
+
+def get_missing_objects(message, status_code=None):
+    """
+    Tells whether a failed run was refused because CMS no longer has its task or testcase,
+    as (problem_missing, testcase_missing). A missing task is assumed when it is not clear which one.
+    """
+    if status_code != 404 and not MISSING_MESSAGE.search(message):
+        return None
+    testcase_missing = 'testcase' in message.lower()
+    return not testcase_missing, True
+
+
 def _should_continue(evalres):
     return evalres['result'] is False or \
            not evalres['compiled'] or \
            (evalres['compiled'] == "Compilation succeeded" and evalres['evalres'] is None)
 
 
-def test_connection(api_address):
-    try:
-        requests.get(api_address)
-    except Exception:
-        return False
-    return True
-
-
 class CMSTaskType(TaskType):
 
+    evaluates_concurrently = True
+
+    @property
+    def client(self):
+        return self.judge.client
+
+    # Problem and testcase codes identify their content (see ProblemCommit.judge_digest),
+    # so an object that already exists in CMS is identical and can be reused.
+    # The ones known to exist are remembered so that they are not even uploaded again.
+    # Testcases are remembered along with the token of their task, so that forgetting
+    # a task (e.g. when CMS no longer has it) forgets its testcases as well.
+    def _get_known_key(self, *codes):
+        return "cms_known_{}".format(hashlib.sha1(
+            "\n".join((self.judge.api_address, ) + codes).encode("utf-8")
+        ).hexdigest())
+
+    def _is_known(self, problem_code, testcase_code=None):
+        token = cache.get(self._get_known_key(problem_code))
+        if token is None or testcase_code is None:
+            return token is not None
+        return cache.get(self._get_known_key(problem_code, testcase_code)) == token
+
+    def _remember(self, problem_code, testcase_code=None):
+        if testcase_code is None:
+            cache.set(self._get_known_key(problem_code), uuid.uuid4().hex, self.judge.known_objects_ttl)
+            return
+        token = cache.get(self._get_known_key(problem_code))
+        if token is not None:
+            cache.set(self._get_known_key(problem_code, testcase_code), token, self.judge.known_objects_ttl)
+
+    def _forget(self, *codes):
+        cache.delete(self._get_known_key(*codes))
+
     def init_problem(
             self,
             problem_code,
@@ -101,10 +144,12 @@ class CMSTaskType(TaskType):
         """See TaskType.initialize_problem
            task_type is a string containing the name of the task type
         """
-        if not test_connection(self.judge.api_address):
-            return False, 'No connection to CMS'
-
         problem_code = str(problem_code)
+        if self._is_known(problem_code):
+            return True, 'The task already exists'
+
+        if not self.client.is_available():
+            return False, 'No connection to CMS'
 
         managers = dict()
         for name, filemodel in helpers:
@@ -129,37 +174,28 @@ class CMSTaskType(TaskType):
                    'submission_format': '["{}.%l"]'.format(code_name)}
         payload.update(tt_params)
 
-        response = requests.post(self.judge.api_address + 'tasks/add',
-                                 data=payload)
-        if response.status_code != 200:
-            return False, "%d Error" % response.status_code
-        result = json.loads(response.text)
+        try:
+            result = self.client.post('tasks/add', data=payload)
+        except CMSClientError as e:
+            return False, str(e)
 
         if result['status'] is False and result['message'] == \
                 'A problem with this name already exists':
-            logger.warning('Task with this name found. Deleting it now...')
-            response = requests.get(self.judge.api_address + 'task/'
-                                    + problem_code + '/remove')
-            if response.status_code != 200:
-                return False, "%d Error while deleting" % response.status_code
-            result = json.loads(response.text)
-            if result['status'] is False:
-                return False, result['message']
-
-            response = requests.post(self.judge.api_address + 'tasks/add',
-                                     data=payload)
-            if response.status_code != 200:
-                return False, "%d Error" % response.status_code
-            result = json.loads(response.text)
+            logger.info('Task {} already exists. Reusing it'.format(problem_code))
+            result = {'status': True, 'message': 'The task already exists'}
 
+        if result['status']:
+            self._remember(problem_code)
         return result['status'], result['message']
 
     def add_testcase(self, problem_code, testcase_code, input_file):
-        if not test_connection(self.judge.api_address):
-            return False, 'No connection to CMS'
-
         # testcase code name should not contain sapces
         testcase_code = problem_code + '_' + testcase_code.replace(' ', '_')
+        if self._is_known(problem_code, testcase_code):
+            return True, 'The testcase already exists'
+
+        if not self.client.is_available():
+            return False, 'No connection to CMS'
 
         input_encoded = FileModel_to_base64(input_file)
         output_encoded = base64.b64encode(b'').decode('utf-8')
@@ -167,41 +203,26 @@ class CMSTaskType(TaskType):
                    'input': input_encoded,
                    'output': output_encoded}
 
-        response = requests.post(self.judge.api_address + 'task/'
-                                 + problem_code + '/testcases/add',
-                                 data=payload)
-        if response.status_code != 200:
-            return False, "%d Error" % response.status_code
-        result = json.loads(response.text)
+        try:
+            result = self.client.post('task/' + problem_code + '/testcases/add', data=payload)
+        except CMSClientError as e:
+            return False, str(e)
 
         if result['status'] is False and result['message'] == \
                 'A testcase with this code already exists':
-            logger.warning('Testcase with this name found. Deleting it now...')
-            response = requests.get(self.judge.api_address + 'task/'
-                                    + problem_code + '/testcase/'
-                                    + testcase_code + '/delete')
-            if response.status_code != 200:
-                return False, "%d Error while deleting" % response.status_code
-            result = json.loads(response.text)
-            if result['status'] is False:
-                return False, result['message']
-
-            response = requests.post(self.judge.api_address + 'task/'
-                                     + problem_code + '/testcases/add',
-                                     data=payload)
-            if response.status_code != 200:
-                return False, "%d Error" % response.status_code
-            result = json.loads(response.text)
+            logger.info('Testcase {} already exists. Reusing it'.format(testcase_code))
+            result = {'status': True, 'message': 'The testcase already exists'}
 
+        if result['status']:
+            self._remember(problem_code, testcase_code)
         return result['status'], result['message']
 
-    def generate_output(self, problem_code, testcase_code, language,
-                        solution_file):
+    def submit_run(self, problem_code, testcase_code, language, solution_file):
         if language is None:
             language = self.judge.detect_language(solution_file[0])
 
         if language == 'text':
-            return EvaluationResult(
+            return None, EvaluationResult(
                 success=True,
                 output_file=solution_file[1],
                 execution_time=0,
@@ -210,9 +231,9 @@ class CMSTaskType(TaskType):
                 message='The output is the input!',
             )
 
-        if not test_connection(self.judge.api_address):
-            return create_evaluation_result(failed=True,
-                                            message='No connection to CMS')
+        if not self.client.is_available():
+            return None, create_evaluation_result(failed=True,
+                                                  message='No connection to CMS')
 
         # testcase code name should not contain sapces
         testcase_code = problem_code + '_' + testcase_code.replace(' ', '_')
@@ -223,32 +244,68 @@ class CMSTaskType(TaskType):
 
         payload = {'files': files_json,
                    'language': language}
-        response = requests.post(self.judge.api_address + 'task/'
-                                 + problem_code + '/testcase/'
-                                 + testcase_code + '/run', data=payload)
-        if response.status_code != 200:
-            return create_evaluation_result(failed=True,
-                                            message='%d Error' % response.status_code)
-        result = json.loads(response.text)
+        try:
+            result = self.client.post('task/' + problem_code + '/testcase/'
+                                      + testcase_code + '/run', data=payload)
+        except CMSClientError as e:
+            return None, self._create_failed_result(problem_code, testcase_code, str(e), e.status_code)
         if result['status'] is False:
-            return create_evaluation_result(failed=True, message=result['message'])
-        else:
-            submission_id = str(result['message'])
-
-        while True:
-            time.sleep(5)
-            response = requests.get(self.judge.api_address + 'task/'
-                                    + problem_code + '/test/' + submission_id
-                                    + '/result')
-            if response.status_code != 200:
-                return create_evaluation_result(failed=True,
-                                                message='%d Error' % response.status_code)
-            result = json.loads(response.text)
+            return None, self._create_failed_result(problem_code, testcase_code, result['message'])
+        return str(result['message']), None
+
+    def _create_failed_result(self, problem_code, testcase_code, message, status_code=None):
+        missing = get_missing_objects(message, status_code)
+        if missing is None:
+            return create_evaluation_result(failed=True, message=message)
+        problem_missing, testcase_missing = missing
+        logger.warning('CMS is missing {}: {}'.format(problem_code if problem_missing else testcase_code, message))
+        if problem_missing:
+            self._forget(problem_code)
+        self._forget(problem_code, testcase_code)
+        return create_evaluation_result(failed=True, message=message,
+                                        problem_missing=problem_missing, testcase_missing=testcase_missing)
+
+    def collect_results(self, problem_code, handles):
+        try:
+            results = self.client.get_results(problem_code, handles)
+        except CMSClientError as e:
+            # The runs may still finish, they are failed by the caller once they time out
+            logger.warning("Could not collect results from CMS: {}".format(e))
+            return {}
+
+        evaluation_results = {}
+        for handle, result in results.items():
             if not result['status']:
-                return create_evaluation_result(failed=True, message=result['message'])
-            evalres = json.loads(result['message'])
-            if _should_continue(evalres):
+                evaluation_results[handle] = create_evaluation_result(failed=True, message=result['message'])
                 continue
-            break
+            evalres = json.loads(result['message'])
+            if not _should_continue(evalres):
+                evaluation_results[handle] = create_evaluation_result(evalres=evalres)
+        return evaluation_results
+
+    def get_poll_interval(self, attempt):
+        waited = 0
+        interval = self.judge.poll_initial_interval
+        for __ in range(attempt):
+            waited += interval
+            interval = min(interval * self.judge.poll_backoff, self.judge.poll_max_interval)
+        if self.judge.poll_timeout is not None and waited + interval > self.judge.poll_timeout:
+            return None
+        return interval
+
+    def generate_outputs(self, problem_code, runs, on_results):
+        from .driver import CMSEvaluationDriver
+        CMSEvaluationDriver(self, problem_code, self.judge.max_in_flight).run(runs, on_results)
 
-        return create_evaluation_result(evalres=evalres)
+    def generate_output(self, problem_code, testcase_code, language,
+                        solution_file):
+        handle, evaluation_result = self.submit_run(problem_code, testcase_code, language, solution_file)
+        attempt = 0
+        while evaluation_result is None:
+            interval = self.get_poll_interval(attempt)
+            if interval is None:
+                return create_evaluation_result(failed=True, message='Timed out waiting for CMS')
+            time.sleep(interval)
+            evaluation_result = self.collect_results(problem_code, [handle]).get(handle)
+            attempt += 1
+        return evaluation_result
@@ -0,0 +1,115 @@
+# coding=utf-8
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from .cmstasktype import create_evaluation_result
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CMSEvaluationDriver"]
+
+
+class CMSEvaluationDriver(object):
+    """
+    Evaluates many runs of a problem concurrently. Runs are submitted to CMS
+    as long as fewer than max_in_flight of them are pending, and the pending
+    ones are collected together with a single (batch) result query per round.
+    The blocking HTTP requests go through the pooled client in a thread pool.
+    The results are reported, in order, by a separate thread, so slow result
+    handlers never block the event loop from submitting and collecting runs.
+    """
+
+    def __init__(self, task_type, problem_code, max_in_flight):
+        self.task_type = task_type
+        self.problem_code = problem_code
+        self.max_in_flight = max_in_flight
+
+    def run(self, runs, on_results):
+        """
+        runs ([(key, testcase_code, language, solution_file)]): the runs to evaluate
+        on_results (callable): called with lists of (key, EvaluationResult) as runs finish
+        """
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        results_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            loop.run_until_complete(self._evaluate(loop, executor, results_executor, list(runs), on_results))
+        finally:
+            executor.shutdown(wait=True)
+            # The reporting thread has its own database connection
+            results_executor.submit(connections.close_all)
+            results_executor.shutdown(wait=True)
+            loop.close()
+
+    async def _evaluate(self, loop, executor, results_executor, runs, on_results):
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        pending = {}
+        finished_submitting = asyncio.Event()
+        reports = []
+
+        def report(finished):
+            reports.append(loop.run_in_executor(results_executor, on_results, finished))
+
+        async def submit(key, testcase_code, language, solution_file):
+            await semaphore.acquire()
+            try:
+                handle, result = await loop.run_in_executor(
+                    executor, self.task_type.submit_run,
+                    self.problem_code, testcase_code, language, solution_file,
+                )
+            except Exception as e:
+                logger.error(e, exc_info=True)
+                semaphore.release()
+                report([(key, create_evaluation_result(failed=True, message=str(e)))])
+                return
+            if result is None:
+                pending[handle] = (key, time.monotonic())
+            else:
+                semaphore.release()
+                report([(key, result)])
+
+        async def submit_all():
+            await asyncio.gather(*[submit(*run) for run in runs])
+            finished_submitting.set()
+
+        async def collect():
+            attempt = 0
+            while not finished_submitting.is_set() or pending:
+                await asyncio.sleep(self._get_interval(attempt))
+                if not pending:
+                    continue
+                handles = list(pending)
+                results = await loop.run_in_executor(
+                    executor, self.task_type.collect_results, self.problem_code, handles,
+                )
+                finished = []
+                now = time.monotonic()
+                for handle in handles:
+                    key, submitted_at = pending[handle]
+                    if handle in results:
+                        finished.append((key, results[handle]))
+                    elif self._timed_out(now - submitted_at):
+                        finished.append((key, create_evaluation_result(
+                            failed=True, message='Timed out waiting for CMS')))
+                    else:
+                        continue
+                    del pending[handle]
+                    semaphore.release()
+                attempt = 0 if finished else attempt + 1
+                if finished:
+                    report(finished)
+
+        await asyncio.gather(submit_all(), collect())
+        await asyncio.gather(*reports)
+
+    def _get_interval(self, attempt):
+        judge = self.task_type.judge
+        return min(judge.poll_initial_interval * judge.poll_backoff ** attempt, judge.poll_max_interval)
+
+    def _timed_out(self, waited):
+        poll_timeout = self.task_type.judge.poll_timeout
+        return poll_timeout is not None and waited > poll_timeout
@@ -0,0 +1,298 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import mock
+from django.test import SimpleTestCase, override_settings
+
+from judge.results import JudgeVerdict
+from . import CMS
+from .client import CMSClient, CMSClientError
+
+
+class StubCMSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status, body):
+        self.server.requests.append((self.command, self.path, self.client_address[1]))
+        content = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        responses = self.server.responses.get(self.path)
+        if responses:
+            status, body = responses.pop(0)
+        else:
+            status, body = 200, json.dumps({"status": True, "message": self.path})
+        self._respond(status, body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubCMSServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubCMSTestMixin(object):
+
+    def setUp(self):
+        self.server = StubCMSServer(("127.0.0.1", 0), StubCMSHandler)
+        self.server.requests = []
+        self.server.responses = {}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = CMSClient(
+            "http://127.0.0.1:{}/".format(self.server.server_port),
+            retries=2, backoff_factor=0, health_check_ttl=60,
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_responses(self, path, *responses):
+        self.server.responses[path] = [(200, json.dumps(response)) for response in responses]
+
+
+class CMSClientTest(StubCMSTestMixin, SimpleTestCase):
+
+    def test_reuses_connection(self):
+        self.assertEqual(self.client.get("a")["message"], "/a")
+        self.assertEqual(self.client.post("b", data={"x": 1})["message"], "/b")
+        ports = set(port for method, path, port in self.server.requests)
+        self.assertEqual(len(ports), 1)
+
+    def test_retries_idempotent_requests(self):
+        self.server.responses["/flaky"] = [(503, "{}"), (200, json.dumps({"status": True, "message": "ok"}))]
+        self.assertEqual(self.client.get("flaky")["message"], "ok")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_does_not_retry_posts(self):
+        self.server.responses["/run"] = [(503, "{}"), (200, "{}")]
+        with self.assertRaisesRegex(CMSClientError, "503 Error"):
+            self.client.post("run")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_caches_health_check(self):
+        self.assertTrue(self.client.is_available())
+        self.assertTrue(self.client.is_available())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_unavailable_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+        client = CMSClient(self.client.api_address, retries=0, connect_timeout=1)
+        self.assertFalse(client.is_available())
+        with self.assertRaisesRegex(CMSClientError, "No connection"):
+            client.get("a")
+
+    def test_batch_results(self):
+        self.set_responses("/task/p/tests/results", {"status": True, "message": {
+            "1": {"status": True, "message": "a"},
+            "2": {"status": True, "message": "b"},
+        }})
+        results = self.client.get_results("p", [1, 2])
+        self.assertEqual(results["1"]["message"], "a")
+        self.assertEqual(results["2"]["message"], "b")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_batch_results_fallback(self):
+        self.server.responses["/task/p/tests/results"] = [(404, "{}")]
+        results = self.client.get_results("p", [1, 2])
+        self.assertEqual(results["1"]["message"], "/task/p/test/1/result")
+        self.assertEqual(len(self.server.requests), 3)
+        self.client.get_results("p", [1, 2])
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_batch_results_fallback_on_any_error(self):
+        self.set_responses("/task/p/tests/results", {"status": False, "message": "unknown"})
+        results = self.client.get_results("p", [1, 2])
+        self.assertEqual(results["2"]["message"], "/task/p/test/2/result")
+        self.assertFalse(self.client._batch_results_supported)
+
+
+class CMSTaskTypeTest(StubCMSTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super(CMSTaskTypeTest, self).setUp()
+        self.judge = CMS(self.client.api_address, poll_initial_interval=0.01, poll_backoff=2,
+                         poll_max_interval=0.05, poll_timeout=1)
+        self.task_type = self.judge.get_task_type("Batch")
+        self.solution_file = ("sol.cpp", mock.Mock(**{"file.read.return_value": b"int main() {}"}))
+
+    def get_evalres(self, evalres):
+        return {"status": True, "message": json.dumps(dict({
+            "result": True, "compiled": "Compilation succeeded", "evalres": None,
+            "output": None, "memory": 0, "time": 0.1, "message": "",
+        }, **evalres))}
+
+    def test_poll_interval(self):
+        intervals = [self.task_type.get_poll_interval(attempt) for attempt in range(4)]
+        self.assertEqual(intervals, [0.01, 0.02, 0.04, 0.05])
+        self.assertIsNone(self.task_type.get_poll_interval(100))
+
+    def test_generate_output_polls_adaptively(self):
+        self.set_responses("/task/p/testcase/p_t/run", {"status": True, "message": 7})
+        self.set_responses(
+            "/task/p/test/7/result",
+            self.get_evalres({}),
+            self.get_evalres({}),
+            self.get_evalres({"evalres": "Execution failed because the return code was nonzero"}),
+        )
+        start = time.monotonic()
+        result = self.task_type.generate_output("p", "t", None, self.solution_file)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(result.verdict, JudgeVerdict.runtime_error)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_submit_run_does_not_wait(self):
+        self.set_responses("/task/p/testcase/p_t/run", {"status": True, "message": 7})
+        self.set_responses("/task/p/test/7/result", self.get_evalres({}))
+        handle, result = self.task_type.submit_run("p", "t", None, self.solution_file)
+        self.assertEqual(handle, "7")
+        self.assertIsNone(result)
+        self.assertEqual(self.task_type.collect_results("p", [handle]), {})
+
+    def test_generate_output_times_out(self):
+        self.judge.poll_timeout = 0.05
+        self.set_responses("/task/p/testcase/p_t/run", {"status": True, "message": 7})
+        self.set_responses("/task/p/test/7/result", *[self.get_evalres({})] * 10)
+        result = self.task_type.generate_output("p", "t", None, self.solution_file)
+        self.assertEqual(result.verdict, JudgeVerdict.judge_failed)
+
+    def test_collect_results_keeps_runs_pending_on_errors(self):
+        self.server.responses["/task/p/test/7/result"] = [(500, "{}")] * 10
+        self.assertEqual(self.task_type.collect_results("p", ["7"]), {})
+
+    def test_generate_outputs_limits_runs_in_flight(self):
+        self.judge.max_in_flight = 2
+        self.server.responses["/task/p/tests/results"] = [(404, "{}")]
+        for i in range(5):
+            self.set_responses("/task/p/testcase/p_t{}/run".format(i), {"status": True, "message": i})
+            self.set_responses(
+                "/task/p/test/{}/result".format(i),
+                self.get_evalres({}),
+                self.get_evalres({"evalres": "Execution timed out"}),
+            )
+
+        in_flight = set()
+        max_in_flight = [0]
+        submit_run = self.task_type.submit_run
+
+        def tracked_submit_run(*args):
+            handle, result = submit_run(*args)
+            in_flight.add(handle)
+            max_in_flight[0] = max(max_in_flight[0], len(in_flight))
+            return handle, result
+
+        collect_results = self.task_type.collect_results
+
+        def tracked_collect_results(*args):
+            results = collect_results(*args)
+            in_flight.difference_update(results)
+            return results
+
+        finished = []
+        reporting_threads = set()
+
+        def on_results(results):
+            reporting_threads.add(threading.current_thread())
+            for key, result in results:
+                finished.append((key, result.verdict))
+
+        runs = [(i, "t{}".format(i), None, self.solution_file) for i in range(5)]
+        with mock.patch.object(self.task_type, "submit_run", new=tracked_submit_run), \
+                mock.patch.object(self.task_type, "collect_results", new=tracked_collect_results):
+            self.task_type.generate_outputs("p", runs, on_results)
+
+        self.assertEqual(sorted(finished), [(i, JudgeVerdict.time_limit_exceeded) for i in range(5)])
+        self.assertLessEqual(max_in_flight[0], 2)
+        self.assertEqual(len(reporting_threads), 1)
+        self.assertNotIn(threading.current_thread(), reporting_threads)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CMSInitializationTest(StubCMSTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super(CMSInitializationTest, self).setUp()
+        self.task_type = CMS(self.client.api_address).get_task_type("Batch")
+        self.helper = mock.Mock(**{"file.read.return_value": b"grader"})
+
+    def initialize(self):
+        return self.task_type.initialize_problem("p", "sol", None, [("grader.cpp", self.helper)], 1, 256)
+
+    def test_existing_task_is_reused(self):
+        self.set_responses("/tasks/add", {"status": False, "message": "A problem with this name already exists"})
+        self.assertEqual(self.initialize(), (True, "The task already exists"))
+        paths = [path for method, path, port in self.server.requests]
+        self.assertNotIn("/task/p/remove", paths)
+
+    def test_known_task_is_not_uploaded(self):
+        self.set_responses("/tasks/add", {"status": True, "message": "ok"})
+        self.assertEqual(self.initialize(), (True, "ok"))
+        requests = len(self.server.requests)
+        self.assertEqual(self.initialize(), (True, "The task already exists"))
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_known_testcase_is_not_uploaded(self):
+        self.initialize()
+        self.set_responses("/task/p/testcases/add", {
+            "status": False, "message": "A testcase with this code already exists",
+        })
+        self.assertTrue(self.task_type.add_testcase("p", "t 1", self.helper)[0])
+        requests = len(self.server.requests)
+        self.assertTrue(self.task_type.add_testcase("p", "t 1", self.helper)[0])
+        self.assertEqual(len(self.server.requests), requests)
+
+    def submit_run(self):
+        return self.task_type.submit_run("p", "t 1", "C++11 / g++", ("sol.cpp", self.helper))
+
+    def count_uploads(self, path):
+        return sum(1 for method, request_path, port in self.server.requests if request_path == path)
+
+    def test_missing_testcase_is_uploaded_again(self):
+        self.initialize()
+        self.task_type.add_testcase("p", "t 1", self.helper)
+        self.set_responses("/task/p/testcase/p_t_1/run", {"status": False, "message": "Testcase not found"})
+        handle, result = self.submit_run()
+        self.assertTrue(result.testcase_missing)
+        self.assertFalse(result.problem_missing)
+        self.initialize()
+        self.task_type.add_testcase("p", "t 1", self.helper)
+        self.assertEqual(self.count_uploads("/tasks/add"), 1)
+        self.assertEqual(self.count_uploads("/task/p/testcases/add"), 2)
+
+    def test_missing_task_is_uploaded_again_with_its_testcases(self):
+        self.initialize()
+        self.task_type.add_testcase("p", "t 1", self.helper)
+        self.server.responses["/task/p/testcase/p_t_1/run"] = [(404, json.dumps({}))]
+        handle, result = self.submit_run()
+        self.assertEqual(result.verdict, JudgeVerdict.judge_failed)
+        self.assertTrue(result.problem_missing)
+        self.assertTrue(result.testcase_missing)
+        self.initialize()
+        self.task_type.add_testcase("p", "t 1", self.helper)
+        self.assertEqual(self.count_uploads("/tasks/add"), 2)
+        self.assertEqual(self.count_uploads("/task/p/testcases/add"), 2)
+
+    def test_other_failures_keep_uploads_known(self):
+        self.initialize()
+        self.set_responses("/task/p/testcase/p_t_1/run", {"status": False, "message": "Compilation queue full"})
+        handle, result = self.submit_run()
+        self.assertFalse(result.problem_missing)
+        self.initialize()
+        self.assertEqual(self.count_uploads("/tasks/add"), 1)
@@ -1,4 +1,6 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.template.defaultfilters import filesizeformat
 
 from problems.models.problem_data import ProblemData
 from .models import *
@@ -36,3 +38,57 @@ def grant_default_access_to_all(modeladmin, request, queryset):
 @admin.register(ProblemUserRole)
 class ProblemUserRoleAdmin(admin.ModelAdmin):
     actions = [grant_default_access_to_all]
+
+
+def evict_selected_entries(modeladmin, request, queryset):
+    count = queryset.count()
+    modeladmin.model.evict(queryset)
+    modeladmin.message_user(request, "Evicted {} entries.".format(count))
+evict_selected_entries.short_description = "Evict selected entries"
+
+
+def evict_least_recently_used_entries(modeladmin, request, queryset):
+    max_size = settings.GENERATION_CACHE_MAX_SIZE
+    if max_size is None:
+        modeladmin.message_user(request, "GENERATION_CACHE_MAX_SIZE is not set.", level=messages.WARNING)
+        return
+    modeladmin.model.evict_least_recently_used(max_size)
+    modeladmin.message_user(request, "Cache size is now {}.".format(filesizeformat(modeladmin.model.total_size())))
+evict_least_recently_used_entries.short_description = "Evict least recently used entries beyond the size limit"
+
+
+class GenerationCacheAdmin(admin.ModelAdmin):
+    list_display = ['key', 'file_hash', 'size', 'hits', 'created_at', 'last_used_at']
+    list_filter = ['last_used_at']
+    search_fields = ['key', 'file_hash']
+    ordering = ['-last_used_at']
+    readonly_fields = ['key', 'file', 'file_hash', 'file_size', 'hits', 'created_at', 'last_used_at']
+    actions = [evict_selected_entries, evict_least_recently_used_entries]
+
+    def size(self, obj):
+        return filesizeformat(obj.file_size)
+    size.admin_order_field = 'file_size'
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        max_size = settings.GENERATION_CACHE_MAX_SIZE
+        extra_context['title'] = "{} ({} of {})".format(
+            self.model._meta.verbose_name_plural.capitalize(),
+            filesizeformat(self.model.total_size()),
+            "unlimited" if max_size is None else filesizeformat(max_size),
+        )
+        return super(GenerationCacheAdmin, self).changelist_view(request, extra_context)
+
+
+@admin.register(GeneratedInput)
+class GeneratedInputAdmin(GenerationCacheAdmin):
+    list_display = GenerationCacheAdmin.list_display + ['arguments']
+    readonly_fields = GenerationCacheAdmin.readonly_fields + ['generator_hash', 'arguments']
+
+
+@admin.register(GeneratedOutput)
+class GeneratedOutputAdmin(GenerationCacheAdmin):
+    readonly_fields = GenerationCacheAdmin.readonly_fields + ['solution_hash', 'input_hash']
@@ -6,13 +6,25 @@ from problems.models import ExportPackage
 class ExportForm(forms.ModelForm):
     class Meta:
         model = ExportPackage
-        fields = ('exporter', 'export_format',)
+        fields = ('exporter', 'export_format', 'base_package',)
 
     def __init__(self, *args, **kwargs):
         self.problem = kwargs.pop('problem')
         self.revision = kwargs.pop('revision')
         self.creator = kwargs.pop('user')
         super(ExportForm, self).__init__(*args, **kwargs)
+        base_packages = ExportPackage.objects.filter(
+            problem=self.problem,
+            creation_successful=True,
+            manifest__isnull=False,
+        )
+        if self.is_bound:
+            # A delta is only meaningful against a package with the same layout
+            base_packages = base_packages.filter(
+                exporter=self.data.get(self.add_prefix('exporter')),
+                export_format=self.data.get(self.add_prefix('export_format')),
+            )
+        self.fields['base_package'].queryset = base_packages
 
     def save(self, **kwargs):
         export_package = super(ExportForm, self).save(commit=False)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_repository', '0007_filesystemmodel_gitbinaryfile_gitfile'),
+        ('problems', '0106_auto_20170722_1459'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedInput',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True, verbose_name='key')),
+                ('file_hash', models.CharField(db_index=True, editable=False, max_length=40, verbose_name='file hash')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='last used at')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='hits')),
+                ('generator_hash', models.CharField(max_length=40, verbose_name='generator hash')),
+                ('arguments', models.TextField(verbose_name='arguments')),
+                ('file', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='file_repository.FileModel', verbose_name='file')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
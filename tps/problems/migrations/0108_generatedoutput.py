@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_repository', '0007_filesystemmodel_gitbinaryfile_gitfile'),
+        ('problems', '0107_generatedinput'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedOutput',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True, verbose_name='key')),
+                ('file_hash', models.CharField(db_index=True, editable=False, max_length=40, verbose_name='file hash')),
+                ('file_size', models.BigIntegerField(default=0, editable=False, verbose_name='file size')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='last used at')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='hits')),
+                ('solution_hash', models.CharField(max_length=40, verbose_name='solution hash')),
+                ('input_hash', models.CharField(max_length=40, verbose_name='input hash')),
+                ('file', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='file_repository.FileModel', verbose_name='file')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='generatedinput',
+            name='file_size',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='file size'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:57
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0108_generatedoutput'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportpackage',
+            name='base_package',
+            field=models.ForeignKey(blank=True, help_text='Only include the files that changed since this package', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='problems.ExportPackage', verbose_name='base package'),
+        ),
+        migrations.AddField(
+            model_name='exportpackage',
+            name='manifest',
+            field=models.TextField(editable=False, null=True, verbose_name='manifest'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 11:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0109_exportpackage_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportpackage',
+            name='waiting_for_testcases',
+            field=models.BooleanField(default=False, editable=False, verbose_name='waiting for testcases'),
+        ),
+    ]
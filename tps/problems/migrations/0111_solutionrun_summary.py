@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 12:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0110_exportpackage_waiting_for_testcases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='solutionrun',
+            name='done_results',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='done results'),
+        ),
+        migrations.AddField(
+            model_name='solutionrun',
+            name='summary',
+            field=models.TextField(editable=False, null=True, verbose_name='summary'),
+        ),
+        migrations.AddField(
+            model_name='solutionrun',
+            name='total_results',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='total results'),
+        ),
+    ]
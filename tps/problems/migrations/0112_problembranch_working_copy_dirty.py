@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-19 13:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def mark_existing_working_copies(apps, schema_editor):
+    # Whether they changed is unknown, so they are assumed to be changed
+    ProblemBranch = apps.get_model("problems", "ProblemBranch")
+    ProblemBranch.objects.filter(working_copy__isnull=False).update(working_copy_dirty=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0111_solutionrun_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problembranch',
+            name='working_copy_dirty',
+            field=models.BooleanField(default=False, editable=False, verbose_name='working copy changed'),
+        ),
+        migrations.RunPython(mark_existing_working_copies, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from problems.models.discussion import *
 from problems.models.file import *
 from problems.models.solution import *
 from problems.models.solution_run import *
+from problems.models.generation_cache import *
 from problems.models.testdata import *
 from problems.models.validator import *
 from problems.models.checker import *
@@ -1,10 +1,14 @@
+import json
 import logging
 
+from celery.result import AsyncResult
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
 from file_repository.models import FileModel
 from problems.models.fields import DBToGitReadOnlyForeignKey
+from problems.models.problem import GenerationStatus
 from tasks.tasks import CeleryTask
 from trader import get_exporter
 
@@ -35,19 +39,64 @@ class ExportPackage(models.Model):
 
     creation_task_id = models.CharField(verbose_name=_("creation task id"), max_length=128, null=True)
     creation_successful = models.NullBooleanField(verbose_name=_("creation success"))
+    # Set while the package waits for the tests of its commit to be generated.
+    # The generation task starts the creation when it finishes.
+    waiting_for_testcases = models.BooleanField(verbose_name=_("waiting for testcases"), default=False,
+                                                editable=False)
+
+    base_package = models.ForeignKey("self", verbose_name=_("base package"), null=True, blank=True,
+                                     related_name='+', on_delete=models.SET_NULL,
+                                     help_text=_("Only include the files that changed since this package"))
+    # Maps each file of the archive to the sha1 of its content
+    manifest = models.TextField(verbose_name=_("manifest"), null=True, editable=False)
 
     class Meta:
         ordering = ('-creation_date', )
 
+    def __str__(self):
+        return "{} ({}, {}, {})".format(self.pk, self.commit_id[:8], self.exporter, self.export_format)
+
+    @property
+    def is_delta(self):
+        return self.base_package_id is not None
+
+    def get_base_manifest(self):
+        if self.base_package is None or self.base_package.manifest is None:
+            return None
+        return json.loads(self.base_package.manifest)
+
+    def find_identical_package(self):
+        """
+        Returns a successfully created package of the same commit, exporter and format, if any.
+        """
+        if self.is_delta:
+            return None
+        return ExportPackage.objects.filter(
+            problem_id=self.problem_id,
+            commit_id=self.commit_id,
+            exporter=self.exporter,
+            export_format=self.export_format,
+            base_package__isnull=True,
+            creation_successful=True,
+            archive__isnull=False,
+        ).exclude(pk=self.pk).first()
+
     def _create_archive(self):
         exporter_class = get_exporter(self.exporter)
+        base_manifest = self.get_base_manifest()
+        if base_manifest is not None:
+            name = "{}_delta".format(self.revision.problem_data.code_name)
+        else:
+            name = self.revision.problem_data.code_name
         with exporter_class(self.revision) as exporter_obj:
             try:
                 exporter_obj.do_export()
                 self.archive = exporter_obj.extract_archive_to_storage(
-                    self.revision.problem_data.code_name,
-                    format=self.export_format
+                    name,
+                    format=self.export_format,
+                    base_manifest=base_manifest,
                 )
+                self.manifest = json.dumps(exporter_obj.manifest)
             except Exception as e:
                 logger.error(e, exc_info=True)
                 self.creation_successful = False
@@ -56,30 +105,120 @@ class ExportPackage(models.Model):
             self.save()
 
     def create_archive(self):
+        if self.waiting_for_testcases:
+            # The generation may have finished or died since the package started waiting
+            self.wait_for_testcases()
+            return
         if not self.being_created:
+            if self.archive is None:
+                identical_package = self.find_identical_package()
+                if identical_package is not None:
+                    self.archive = identical_package.archive
+                    self.manifest = identical_package.manifest
+                    self.creation_successful = True
+                    self.creation_task_id = None
+                    self.save()
+                    return
             self.creation_successful = None
+            if not self.testcases_ready():
+                self.wait_for_testcases()
+                return
+            self.waiting_for_testcases = False
             self.creation_task_id = ExportPackageCreationTask().delay(self).id
             self.save()
 
+    def _get_generation_status(self):
+        revision = self.revision
+        return type(revision).objects.with_transaction(revision._transaction).get(pk=revision.pk).generation_status
+
+    def testcases_ready(self):
+        """
+        Returns True if the tests of the commit have been generated, whether successfully or not.
+        """
+        return self._get_generation_status() in (
+            GenerationStatus.GenerationSuccessful,
+            GenerationStatus.GenerationFailed,
+        )
+
+    def _generation_task_died(self):
+        """
+        Returns True if the tests of the commit are neither generated nor being generated,
+        e.g. when the generation task failed or was lost before finishing.
+        """
+        revision = self.revision
+        if revision.generation_task_id is None:
+            task_finished = True
+        else:
+            result = AsyncResult(revision.generation_task_id)
+            task_finished = result.failed() or result.successful()
+        # The status is read after the task state, so a task finishing in between is not a failure
+        return task_finished and not self.testcases_ready()
+
+    def wait_for_testcases(self):
+        """
+        Makes the package wait for the generation task of its commit, which resumes the creation
+        when it finishes. The generation is (re)started if it is not running.
+        """
+        revision = self.revision
+        if self._get_generation_status() == GenerationStatus.NotGenerated or self._generation_task_died():
+            if self._claim_generation(revision.generation_task_id):
+                revision.generate_testcases()
+        logger.info("Export {} waits until the tests of {} are generated".format(self.pk, self.commit_id))
+        ExportPackage.objects.filter(pk=self.pk).update(
+            waiting_for_testcases=True, creation_task_id=None, creation_successful=None,
+        )
+        self.waiting_for_testcases = True
+        self.creation_task_id = None
+        self.creation_successful = None
+        # The generation task may have finished before the flag was set, without resuming the package
+        if self.testcases_ready():
+            self.resume_creation()
+
+    def _claim_generation(self, previous_task_id):
+        """
+        Returns True for only one of the packages replacing the generation task previous_task_id
+        (None if the tests were never generated), so that the generation is started once.
+        The status of the commit is stored in git, so the claim is made by adding a cache key.
+        """
+        return cache.add(
+            "problem_{}_{}_generation_after_{}".format(self.problem_id, self.commit_id, previous_task_id),
+            True, timeout=getattr(settings, "EXPORT_GENERATION_CLAIM_TIMEOUT", 60 * 60),
+        )
+
+    def resume_creation(self):
+        """
+        Starts the creation of a package waiting for its tests, unless another caller already did.
+        """
+        claimed = ExportPackage.objects.filter(pk=self.pk, waiting_for_testcases=True).update(
+            waiting_for_testcases=False,
+        )
+        if not claimed:
+            return
+        self.waiting_for_testcases = False
+        self.creation_task_id = ExportPackageCreationTask().delay(self).id
+        ExportPackage.objects.filter(pk=self.pk).update(creation_task_id=self.creation_task_id)
+
     @property
     def is_ready(self):
         return self.creation_successful
 
     @property
     def being_created(self):
-        return self.creation_successful is None and self.creation_task_id is not None
+        return self.creation_successful is None and \
+               (self.creation_task_id is not None or self.waiting_for_testcases)
 
 
 class ExportPackageCreationTask(CeleryTask):
 
+    queue = 'export'
+
     def validate_dependencies(self, request):
-        result = True
-        for testcase in request.revision.testcase_set.all():
-            if not testcase.testcase_generation_completed():
-                logger.info("Waiting until testcase {} is generated".format(str(testcase)))
-                testcase.generate()
-                result = None
-        return result
+        # The package is normally only queued once its tests are ready,
+        # otherwise it waits for the generation task instead of polling.
+        if not request.testcases_ready():
+            request.wait_for_testcases()
+            return False
+        return True
 
     def execute(self, request):
         request._create_archive()
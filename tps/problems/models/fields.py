@@ -1,4 +1,6 @@
+import copy
 import json
+from collections import defaultdict
 
 import six
 from django import forms
@@ -13,6 +15,24 @@ from git_orm.models.fields import ReverseForeignKeyDescriptor, create_many_to_ma
 from git_orm.transaction import Transaction
 
 
+def _get_revision(instance, problem_field_name, commit_id_field_name):
+    return getattr(instance, problem_field_name).repository_path, getattr(instance, commit_id_field_name)
+
+
+def _load_revision_objects(model, revision_pks):
+    """
+    Loads the objects of a git model with a single query per revision.
+    revision_pks maps (repository_path, commit_id) pairs to the primary keys needed from them.
+    Returns the transaction and the loaded objects of each revision.
+    """
+    loaded = {}
+    for revision, pks in revision_pks.items():
+        repository_path, commit_id = revision
+        git_transaction = Transaction(repository_path=repository_path, commit_id=commit_id)
+        objects = model.objects.with_transaction(git_transaction).filter(pk__in=tuple(pks))
+        loaded[revision] = git_transaction, list(objects)
+    return loaded
+
 
 def create_git_related_manager(superclass, field):
     """
@@ -68,15 +88,12 @@ def create_git_related_manager(superclass, field):
 
             query = {
                 '%s__pk' % self.problem_field_name: self.problem.pk,
-                '%s__in' % self.commit_id_field_name: set(obj._get_pk_val() for obj in instances)
+                '%s__in' % self.commit_id_field_name: set(str(obj._transaction.parents[0]) for obj in instances)
             }
 
-            # We (possibly) need to convert object IDs to the type of the
-            # instances' PK in order to match up instances:
-            object_id_converter = instances[0]._meta.pk.to_python
             return (queryset.filter(**query),
-                    lambda relobj: object_id_converter(getattr(relobj, self.object_id_field_name)),
-                    lambda obj: obj._get_pk_val(),
+                    lambda relobj: getattr(relobj, self.commit_id_field_name),
+                    lambda obj: str(obj._transaction.parents[0]),
                     False,
                     self.prefetch_cache_name)
 
@@ -250,6 +267,42 @@ class DBToGitForeignKeyDescriptor(object):
     def get_cache_name(self):
         return '_cache_%s' % self.field.attname
 
+    def is_cached(self, instance):
+        return hasattr(instance, self.get_cache_name())
+
+    def get_prefetch_queryset(self, instances, queryset=None):
+        """
+        Loads the related objects of all the instances with one query per revision,
+        so that prefetch_related works for this field.
+        """
+        if queryset is not None:
+            raise ValueError("Custom queryset can't be used for this lookup.")
+        to_python = self.field.target._meta.pk.to_python
+        revision_pks = defaultdict(set)
+        for instance in instances:
+            pk = getattr(instance, self.field.attname, self.field.get_default())
+            if pk is not None:
+                revision = _get_revision(instance, self.problem_field_name, self.commit_id_field_name)
+                revision_pks[revision].add(to_python(pk))
+        objects = []
+        revisions = {}
+        loaded = _load_revision_objects(self.field.target, revision_pks)
+        for revision, (git_transaction, revision_objects) in loaded.items():
+            revisions[git_transaction] = revision
+            objects.extend(revision_objects)
+
+        def instance_attr(instance):
+            pk = getattr(instance, self.field.attname, self.field.get_default())
+            if pk is None:
+                return None
+            return _get_revision(instance, self.problem_field_name, self.commit_id_field_name), to_python(pk)
+
+        return (objects,
+                lambda obj: (revisions[obj._transaction], obj.pk),
+                instance_attr,
+                True,
+                self.get_cache_name())
+
     def __get__(self, instance, owner):
         if instance is None:
             return self
@@ -360,9 +413,9 @@ class ReadOnlyGitToGitForeignKey(GitToGitForeignKey):
         setattr(cls, self.attname, ReadOnlyDescriptor(self.attname, self.get_default()))
 
 
-def create_db_to_git_many_to_many_manager(problem_field, commit_field, *args, **kwargs):
+def create_db_to_git_many_to_many_manager(problem_field, commit_field, model, field, reverse):
 
-    cls = create_many_to_many_manager(*args, **kwargs)
+    cls = create_many_to_many_manager(model, field, reverse)
 
     class ManyToManyManager(cls):
         @cached_property
@@ -374,6 +427,65 @@ def create_db_to_git_many_to_many_manager(problem_field, commit_field, *args, **
                 commit_id=commit_id
             )
 
+        def get_queryset(self):
+            try:
+                return self.instance._prefetched_objects_cache[field.attname]
+            except (AttributeError, KeyError):
+                return super(ManyToManyManager, self).get_queryset()
+
+        def get_prefetch_queryset(self, instances, queryset=None):
+            """
+            Loads the related objects of all the instances with one query per revision.
+            Like the many-to-many managers of Django, a separate copy of an object is
+            returned for each instance it is related to, marked with the pk of the instance.
+            """
+            if queryset is not None:
+                raise ValueError("Custom queryset can't be used for this lookup.")
+            to_python = self.model._meta.pk.to_python
+            revision_pks = defaultdict(set)
+            for instance in instances:
+                revision = _get_revision(instance, problem_field, commit_field)
+                revision_pks[revision].update(to_python(pk) for pk in getattr(instance, field.attname).pk_list)
+            loaded = _load_revision_objects(self.model, revision_pks)
+
+            related_objects = []
+            for instance in instances:
+                manager = getattr(instance, field.attname)
+                revision = _get_revision(instance, problem_field, commit_field)
+                git_transaction, revision_objects = loaded[revision]
+                # Avoids opening another transaction when the prefetched queryset is created
+                manager.transaction = git_transaction
+                pks = set(to_python(pk) for pk in manager.pk_list)
+                for obj in revision_objects:
+                    if obj.pk in pks:
+                        obj = copy.copy(obj)
+                        obj._prefetch_related_val = instance.pk
+                        related_objects.append(obj)
+
+            return (related_objects,
+                    lambda obj: obj._prefetch_related_val,
+                    lambda instance: instance.pk,
+                    False,
+                    field.attname)
+
+        def _remove_prefetched_objects(self):
+            try:
+                self.instance._prefetched_objects_cache.pop(field.attname)
+            except (AttributeError, KeyError):
+                pass
+
+        def add(self, value):
+            self._remove_prefetched_objects()
+            super(ManyToManyManager, self).add(value)
+
+        def remove(self, value):
+            self._remove_prefetched_objects()
+            super(ManyToManyManager, self).remove(value)
+
+        def clear(self):
+            self._remove_prefetched_objects()
+            super(ManyToManyManager, self).clear()
+
     return ManyToManyManager
 
 
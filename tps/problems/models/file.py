@@ -24,7 +24,7 @@ from runner import get_compilation_commands
 from runner.actions.action import ActionDescription
 from runner.actions.compile_source import compile_source
 from runner.sandbox.sandbox import SandboxInterfaceException
-from tasks.tasks import CeleryTask
+from tasks.tasks import CeleryTask, PRIORITY_HIGH
 import os
 from git_orm import models as git_models
 
@@ -216,6 +216,9 @@ class SourceFile(ResourceBase):
 
 class CompilationTask(CeleryTask):
 
+    queue = 'compile'
+    priority = PRIORITY_HIGH
+
     def execute(self, source_file):
         try:
             source_file._compile()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models
+from django.db.models import Min, Sum
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from file_repository.models import FileModel
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["GeneratedInput", "GeneratedOutput"]
+
+
+def get_cache_key(*parts):
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def copy_file_model(file_model, description=""):
+    file_model.file.open("rb")
+    try:
+        return FileModel.objects.create(
+            file=File(file_model.file, name=file_model.name),
+            name=file_model.name,
+            description=description,
+        )
+    finally:
+        file_model.file.close()
+
+
+class GenerationCacheEntry(models.Model):
+    """
+    A file produced by a deterministic generation step (running a generator or
+    a model solution), stored under a key describing everything the result depends on.
+    Entries own their files: callers always receive copies, so that entries can be
+    evicted without affecting testcases. Entries having the same content share a file.
+    Once the files of a cache exceed GENERATION_CACHE_MAX_SIZE bytes, the least
+    recently used entries are evicted.
+    """
+    key = models.CharField(max_length=40, unique=True, verbose_name=_("key"))
+    file = models.ForeignKey(FileModel, verbose_name=_("file"), related_name="+", editable=False)
+    file_hash = models.CharField(max_length=40, db_index=True, verbose_name=_("file hash"), editable=False)
+    file_size = models.BigIntegerField(default=0, verbose_name=_("file size"), editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("created at"))
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_("last used at"))
+    hits = models.PositiveIntegerField(default=0, verbose_name=_("hits"))
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def lookup(cls, key):
+        """
+        Returns a copy of the file stored under the given key, or None in case of a miss.
+        """
+        entry = cls.objects.filter(key=key).select_related("file").first()
+        if entry is None:
+            return None
+        try:
+            file_model = copy_file_model(entry.file, description="Copied from {} {}".format(cls.__name__, key))
+        except (IOError, OSError) as e:
+            logger.warning("Dropping {} {} with missing file: {}".format(cls.__name__, key, e))
+            entry.delete()
+            return None
+        cls.objects.filter(pk=entry.pk).update(hits=models.F("hits") + 1, last_used_at=timezone.now())
+        return file_model
+
+    @classmethod
+    def store(cls, key, file_model, **kwargs):
+        file_hash = file_model.get_file_hash()
+        same_content = cls.objects.filter(file_hash=file_hash).select_related("file").first()
+        if same_content is not None:
+            cached_file = same_content.file
+        else:
+            cached_file = copy_file_model(file_model, description="{} {}".format(cls.__name__, key))
+        entry, created = cls.objects.update_or_create(
+            key=key,
+            defaults=dict(file=cached_file, file_hash=file_hash, file_size=cached_file.file.size, **kwargs)
+        )
+        max_size = getattr(settings, "GENERATION_CACHE_MAX_SIZE", None)
+        if max_size is not None:
+            cls.evict_least_recently_used(max_size)
+        return entry
+
+    @classmethod
+    def total_size(cls):
+        """
+        Returns the size of the files stored by the cache, counting shared files once.
+        """
+        # Entries sharing a file have the same size, so only the first entry of each file is summed
+        first_entries = cls.objects.order_by().values("file_id").annotate(first_entry=Min("pk"))
+        return cls.objects.filter(pk__in=first_entries.values("first_entry")).aggregate(
+            size=Sum("file_size"))["size"] or 0
+
+    @classmethod
+    def evict(cls, entries):
+        """
+        Removes the given entries along with the files no other entry uses.
+        """
+        file_ids = set(entries.values_list("file_id", flat=True))
+        entries.delete()
+        orphan_files = FileModel.objects.filter(pk__in=file_ids).exclude(
+            pk__in=cls.objects.values("file_id")
+        )
+        for file_model in orphan_files:
+            file_model.file.delete(save=False)
+            file_model.delete()
+
+    @classmethod
+    def evict_least_recently_used(cls, max_size):
+        size = cls.total_size()
+        if size <= max_size:
+            return
+        entries = list(cls.objects.order_by("last_used_at").values_list("pk", "file_id", "file_size"))
+        # A shared file is only freed along with the last entry using it
+        remaining_entries = Counter(file_id for entry_id, file_id, file_size in entries)
+        evicted = []
+        for entry_id, file_id, file_size in entries:
+            if size <= max_size:
+                break
+            evicted.append(entry_id)
+            remaining_entries[file_id] -= 1
+            if remaining_entries[file_id] == 0:
+                size -= file_size
+        logger.info("Evicting {} entries from {}".format(len(evicted), cls.__name__))
+        cls.evict(cls.objects.filter(pk__in=evicted))
+
+
+class GeneratedInput(GenerationCacheEntry):
+    """
+    Inputs produced by generators, keyed by the digest of the compiled
+    generator, its language and the normalized generation arguments.
+    """
+    generator_hash = models.CharField(max_length=40, verbose_name=_("generator hash"))
+    arguments = models.TextField(verbose_name=_("arguments"))
+
+    @staticmethod
+    def get_key(generator_hash, language, arguments):
+        return get_cache_key("input", generator_hash, language, arguments)
+
+
+class GeneratedOutput(GenerationCacheEntry):
+    """
+    Outputs produced by model solutions, keyed by the judge and everything it
+    needs to compute them: the solution, graders, language, input and limits.
+    """
+    solution_hash = models.CharField(max_length=40, verbose_name=_("solution hash"))
+    input_hash = models.CharField(max_length=40, verbose_name=_("input hash"))
+
+    @staticmethod
+    def get_key(solution_hash, grader_hashes, language, input_hash, time_limit, memory_limit,
+                task_type=None, task_type_parameters=None, judge=None):
+        return get_cache_key(
+            "output", solution_hash, sorted(grader_hashes), language, input_hash,
+            time_limit, memory_limit, task_type, task_type_parameters, judge
+        )
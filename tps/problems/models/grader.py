@@ -10,6 +10,7 @@ from problems.models.fields import ReadOnlyGitToGitForeignKey
 from problems.models.file import FileNameValidator, get_valid_name
 from problems.models.generic import RecursiveDirectoryModel, ManuallyPopulatedModel
 from problems.models.problem import ProblemCommit
+from problems.models.version_control import get_value_fingerprint
 
 __all__ = ["Grader"]
 
@@ -59,6 +60,12 @@ class Grader(RecursiveDirectoryModel, ManuallyPopulatedModel):
         data["code"] = self.code.get_value_as_string()
         return data
 
+    def get_fingerprint(self):
+        return get_value_fingerprint({
+            "language": self.language,
+            "code": self.code.get_fingerprint(),
+        })
+
     def get_language_representation(self):
         if self.language is None:
             return "Auto-detect"
@@ -6,6 +6,7 @@ import logging
 import os
 import shutil
 import tempfile
+from collections import OrderedDict
 from enum import Enum
 
 import subprocess
@@ -17,7 +18,8 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from pygit2 import Oid
 
@@ -27,8 +29,10 @@ from file_repository.models import FileModel
 from git_orm.transaction import Transaction
 from judge import Judge
 from problems.models.fields import ReadOnlyGitToGitForeignKey
+from problems.models.generation_cache import get_cache_key
 from problems.models.generic import FileSystemPopulatedModel
-from tasks.tasks import CeleryTask
+from problems.models.version_control import get_value_fingerprint
+from tasks.tasks import CeleryTask, PRIORITY_LOW
 
 
 
@@ -175,6 +179,8 @@ class ProblemBranch(models.Model):
     problem = models.ForeignKey(Problem, verbose_name=_("problem"), db_index=True, related_name="+")
     head = models.ForeignKey("ProblemRevision", verbose_name=_("head"), related_name='+', on_delete=models.PROTECT)
     working_copy = models.OneToOneField("ProblemRevision", verbose_name=_("working copy"), related_name='+', null=True, on_delete=models.SET_NULL)
+    # Set when an object of the working copy is saved or deleted, see mark_working_copy_dirty
+    working_copy_dirty = models.BooleanField(verbose_name=_("working copy changed"), default=False, editable=False)
 
     class Meta:
         unique_together = (("name", "problem"), )
@@ -191,6 +197,7 @@ class ProblemBranch(models.Model):
 
     def discard_working_copy(self, commit=True):
         self.working_copy = None
+        self.working_copy_dirty = False
         if commit:
             self.save()
 
@@ -201,6 +208,7 @@ class ProblemBranch(models.Model):
         self.working_copy = self.head.clone()
         self.working_copy.author = user
         self.working_copy.save()
+        self.working_copy_dirty = False
         self.save()
         return self.working_copy
 
@@ -249,6 +257,7 @@ class ProblemBranch(models.Model):
         if not another_revision.committed():
             raise AssertionError("Impossible to merge with an uncommitted revision")
         self.working_copy = self.head.merge(another_revision)
+        self.working_copy_dirty = True
         self.save()
 
     def working_copy_has_changed(self):
@@ -256,7 +265,16 @@ class ProblemBranch(models.Model):
             return False
         if self.working_copy.has_conflicts():
             return True
-        return len(self.head.find_differed_pairs(self.working_copy)) > 0
+        return self.working_copy_dirty
+
+    @staticmethod
+    def mark_working_copy_dirty(revision_id):
+        """
+        Marks the branches whose working copy is the given revision as changed.
+        Called when an object of the revision is saved or deleted.
+        """
+        ProblemBranch.objects.filter(working_copy_id=revision_id, working_copy_dirty=False) \
+            .update(working_copy_dirty=True)
 
 
 class ProblemJudgeInitialization(CeleryTask):
@@ -266,6 +284,10 @@ class ProblemJudgeInitialization(CeleryTask):
 
 
 class CommitVerify(CeleryTask):
+
+    queue = 'verify'
+    priority = PRIORITY_LOW
+
     def validate_dependencies(self, *args, **kwargs):
         return True
 
@@ -326,7 +348,28 @@ class CommitVerify(CeleryTask):
             logger.error(e, exc_info=e)
 
 
+def _get_hashing_copy(digests):
+    """
+    Returns a copy function for shutil.copytree storing the SHA1 of each copied file
+    in `digests`, keyed by its destination path.
+    """
+    def copy(src, dst):
+        digest = hashlib.sha1()
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+            for chunk in iter(lambda: src_file.read(1 << 20), b""):
+                digest.update(chunk)
+                dst_file.write(chunk)
+        shutil.copystat(src, dst)
+        digests[os.path.abspath(dst)] = digest.hexdigest()
+        return dst
+    return copy
+
+
 class CommitTestcaseGenerate(CeleryTask):
+
+    queue = 'generate'
+    priority = PRIORITY_LOW
+
     def validate_dependencies(self, *args, **kwargs):
         return True
 
@@ -365,13 +408,19 @@ class CommitTestcaseGenerate(CeleryTask):
                 tests_dst = os.path.join(out_dir, 'tests')
                 if os.path.exists(tests_dst):
                     shutil.rmtree(tests_dst)
-                shutil.copytree(tests_src, tests_dst)
+                digests = {}
+                shutil.copytree(tests_src, tests_dst, copy_function=_get_hashing_copy(digests))
             except Exception as e:
                 with open(err_file, "a") as err_desc:
                     err_desc.write(str(e))
                 revision.generation_status = GenerationStatus.GenerationFailed
             else:
                 revision.generation_status = GenerationStatus.GenerationSuccessful
+                # The testcases still work without the digests, by reading their files
+                try:
+                    self.store_digests(revision, digests)
+                except Exception as e:
+                    logger.error(e, exc_info=e)
             try:
                 logs_src = os.path.join(tempdir, 'logs')
                 logs_dst = os.path.join(out_dir, 'tps_gen_logs')
@@ -394,6 +443,24 @@ class CommitTestcaseGenerate(CeleryTask):
         except Exception as e:
             logger.error(e, exc_info=e)
 
+    @staticmethod
+    def store_digests(revision, digests):
+        """
+        Stores the digests of the inputs and outputs, computed while copying them, in their testcases.
+        """
+        for testcase in revision.testcase_set.all():
+            testcase.input_digest = digests.get(os.path.abspath(testcase.get__input_uploaded_file_id))
+            testcase.output_digest = digests.get(os.path.abspath(testcase.get__output_uploaded_file_id))
+            testcase.save()
+
+    def execute_child_tasks(self, repo_dir, commit_id, out_dir):
+        from problems.models.export import ExportPackage
+        waiting_packages = ExportPackage.objects.filter(
+            problem__repository_path=repo_dir, commit_id=commit_id, waiting_for_testcases=True,
+        )
+        for export_package in waiting_packages:
+            export_package.resume_creation()
+
 
 class TaskStateEnum(Enum):
 
@@ -494,7 +561,24 @@ class ProblemCommit(FileSystemPopulatedModel):
             return self._get_judge_code()
 
     def _get_judge_code(self):
-        return "%s_%s" % (self.problem.pk, self.commit_id)
+        return "%s_%s" % (self.problem.pk, self.judge_digest[:16])
+
+    @cached_property
+    def judge_digest(self):
+        """
+        A digest of everything the problem is initialized in the judge with. Commits not
+        changing any of them (e.g. only editing the statement) share the problem in the judge.
+        """
+        problem_data = self.problem_data
+        return get_cache_key(
+            "judge",
+            problem_data.task_type,
+            problem_data.task_type_parameters,
+            problem_data.name,
+            problem_data.time_limit,
+            problem_data.memory_limit,
+            sorted((grader.name, grader.code.get_file_hash()) for grader in self.grader_set.all()),
+        )
 
     def _initialize_in_judge(self):
         if self.judge_initialization_successful:  # Optimization
@@ -564,9 +648,14 @@ class ProblemCommit(FileSystemPopulatedModel):
         self.save()
 
     def invalidate_judge_initialization(self):
+        """
+        Makes the problem be initialized in the judge again, along with its testcases.
+        """
         self.judge_initialization_task_id = None
         self.judge_initialization_successful = None
         self.save()
+        for testcase in self.testcase_set.all():
+            testcase.invalidate_judge_initialization()
 
     def judge_initialization_completed(self):
         return self.judge_initialization_successful is not None
@@ -588,6 +677,9 @@ class ProblemRevision(models.Model):
     judge_initialization_successful = models.NullBooleanField(verbose_name=_("initialization success"), default=None)
     judge_initialization_message = models.CharField(verbose_name=_("initialization message"), max_length=256)
 
+    # The objects of a problem are now stored in its git repository and related to ProblemCommit,
+    # which merges them with git (see Transaction.merge). These managers only exist for the
+    # database revisions, so the matching and merging below is not used for ProblemCommit.
     USER_REVISION_OBJECTS = [
         "solution_set", "validator_set", "checker_set", "inputgenerator_set", "grader_set",
         "resource_set", "subtasks", "testcase_set",
@@ -655,6 +747,7 @@ class ProblemRevision(models.Model):
         self.commit_message = message
         self.revision_id = hashlib.sha1((str(self.id) + settings.SECRET_KEY).encode("utf-8")).hexdigest()
         self.save()
+        ProblemBranch.objects.filter(working_copy=self).update(working_copy_dirty=False)
 
     def committed(self):
         return self.revision_id is not None
@@ -666,6 +759,31 @@ class ProblemRevision(models.Model):
     def editable(self, user):
         return not self.committed() and self.author == user
 
+    @staticmethod
+    def get_fingerprint_cache_key(revision_id):
+        return "problem_revision_{}_fingerprint".format(revision_id)
+
+    def get_fingerprint(self):
+        """
+        Returns a digest of all the objects of the revision.
+        Only the fingerprints of committed revisions are cached, since their objects never change.
+        """
+        if not self.committed():
+            return self._compute_fingerprint()
+        cache_key = self.get_fingerprint_cache_key(self.pk)
+        fingerprint = cache.get(cache_key)
+        if fingerprint is None:
+            fingerprint = self._compute_fingerprint()
+            cache.set(cache_key, fingerprint,
+                      timeout=getattr(settings, "REVISION_FINGERPRINT_CACHE_TIMEOUT", 24 * 60 * 60))
+        return fingerprint
+
+    def _compute_fingerprint(self):
+        return get_value_fingerprint(sorted(
+            [str(key), obj.get_fingerprint() if obj is not None else None]
+            for key, obj in self._get_matching_objects().items()
+        ))
+
     def save(self, *args, **kwargs):
         self.depth = 1
         super(ProblemRevision, self).save(*args, **kwargs)
@@ -678,37 +796,47 @@ class ProblemRevision(models.Model):
         self.commit_message = ""
 
     def clone(self, cloned_instances=None, replace_objects=None):
+        return self._clone(cloned_instances=cloned_instances, replace_objects=replace_objects)[self]
+
+    def _clone(self, cloned_instances=None, replace_objects=None):
+        """
+        Clones the revision and returns the map from the cloned (or ignored) objects to their clones.
+        """
         from problems.models import CloneableMixin
         if not cloned_instances:
             cloned_instances = {}
         if not replace_objects:
             replace_objects = {}
         ignored_instances = cloned_instances.copy()
-        if self not in cloned_instances:
-            cloned_instances[self] = CloneableMixin.clone_model(self, cloned_instances)
-        cloned_instances[self].parent_revisions.add(self)
-        for queryset in self.USER_REVISION_OBJECTS:
-            cloned_instances = CloneableMixin.clone_queryset(getattr(self, queryset),
-                                                             cloned_instances=cloned_instances,
-                                                             replace_objects=replace_objects)
-        for solution in self.solution_set.all():
-            for verdict in solution.subtask_verdicts.all():
-                verdict.clone(
-                    cloned_instances=cloned_instances,
-                    replace_objects=replace_objects
-                )
-        cloned_instances = self.problem_data.clone(
-            cloned_instances=cloned_instances,
-            replace_objects=replace_objects
-        )
+        with transaction.atomic():
+            if self not in cloned_instances:
+                cloned_instances[self] = CloneableMixin.clone_model(self, cloned_instances)
+            cloned_instances[self].parent_revisions.add(self)
+            for queryset in self.USER_REVISION_OBJECTS:
+                cloned_instances = CloneableMixin.clone_queryset(getattr(self, queryset),
+                                                                 cloned_instances=cloned_instances,
+                                                                 replace_objects=replace_objects)
+            cloned_instances = CloneableMixin.clone_objects(
+                [
+                    verdict
+                    for solution in self.solution_set.prefetch_related("subtask_verdicts")
+                    for verdict in solution.subtask_verdicts.all()
+                ],
+                cloned_instances=cloned_instances,
+                replace_objects=replace_objects
+            )
+            cloned_instances = self.problem_data.clone(
+                cloned_instances=cloned_instances,
+                replace_objects=replace_objects
+            )
 
-        self.problem_data.clone_relations(cloned_instances=cloned_instances, ignored_instances=ignored_instances)
-        for queryset in self.USER_REVISION_OBJECTS:
-            CloneableMixin.clone_queryset_relations(getattr(self, queryset),
-                                                    cloned_instances=cloned_instances,
-                                                    ignored_instances=ignored_instances)
+            self.problem_data.clone_relations(cloned_instances=cloned_instances, ignored_instances=ignored_instances)
+            for queryset in self.USER_REVISION_OBJECTS:
+                CloneableMixin.clone_queryset_relations(getattr(self, queryset),
+                                                        cloned_instances=cloned_instances,
+                                                        ignored_instances=ignored_instances)
 
-        return cloned_instances[self]
+        return cloned_instances
 
     def child_of(self, revision):
         return self.find_merge_base(revision) == revision
@@ -727,45 +855,85 @@ class ProblemRevision(models.Model):
         else:
             return False
 
+    @classmethod
+    def _get_ancestry(cls, *revisions):
+        """
+        Returns a dict mapping the pk of every ancestor of the given revisions
+        (including themselves) to the pks of its parents, fetched in a single query.
+        """
+        through = cls.parent_revisions.through
+        table = through._meta.db_table
+        child_column = through._meta.get_field("from_problemrevision").column
+        parent_column = through._meta.get_field("to_problemrevision").column
+        pks = [revision.pk for revision in revisions]
+        query = (
+            "WITH RECURSIVE ancestors(id) AS ("
+            "SELECT {seeds} "
+            "UNION SELECT edge.{parent} FROM {table} edge INNER JOIN ancestors ON edge.{child} = ancestors.id"
+            ") "
+            "SELECT ancestors.id, edge.{parent} FROM ancestors "
+            "LEFT OUTER JOIN {table} edge ON edge.{child} = ancestors.id"
+        ).format(
+            seeds=" UNION SELECT ".join(["%s"] * len(pks)),
+            table=connection.ops.quote_name(table),
+            child=connection.ops.quote_name(child_column),
+            parent=connection.ops.quote_name(parent_column),
+        )
+        ancestry = {}
+        with connection.cursor() as cursor:
+            cursor.execute(query, pks)
+            for child_pk, parent_pk in cursor.fetchall():
+                parents = ancestry.setdefault(child_pk, [])
+                if parent_pk is not None:
+                    parents.append(parent_pk)
+        return ancestry
+
     def find_merge_base(self, another_revision):
+        ancestry = self._get_ancestry(self, another_revision)
         priority_queue = []
-        revision_a = self
-        revision_b = another_revision
-        heapq.heappush(priority_queue, (-revision_a.pk, revision_a))
-        heapq.heappush(priority_queue, (-revision_b.pk, revision_b))
+        heapq.heappush(priority_queue, -self.pk)
+        heapq.heappush(priority_queue, -another_revision.pk)
         marks = {}
         # Updating mark in the following way to handle
         # the case where both revision are the same
-        marks[revision_a.pk] = marks[revision_b.pk] = 0
-        marks[revision_a.pk] |= 1
-        marks[revision_b.pk] |= 2
+        marks[self.pk] = marks[another_revision.pk] = 0
+        marks[self.pk] |= 1
+        marks[another_revision.pk] |= 2
         while len(priority_queue) > 0:
-            revision = heapq.heappop(priority_queue)[1]
-            if marks[revision.pk] == 3:
-                return revision
-            for parent_revision in revision.parent_revisions.all():
-                if parent_revision.pk not in marks:
-                    marks[parent_revision.pk] = 0
-                    heapq.heappush(priority_queue, (-parent_revision.pk, parent_revision))
-                marks[parent_revision.pk] |= marks[revision.pk]
+            revision_pk = -heapq.heappop(priority_queue)
+            if marks[revision_pk] == 3:
+                if revision_pk == self.pk:
+                    return self
+                if revision_pk == another_revision.pk:
+                    return another_revision
+                return ProblemRevision.objects.get(pk=revision_pk)
+            for parent_pk in ancestry[revision_pk]:
+                if parent_pk not in marks:
+                    marks[parent_pk] = 0
+                    heapq.heappush(priority_queue, -parent_pk)
+                marks[parent_pk] |= marks[revision_pk]
         return None
 
     def path_to_parent(self, another_revision):
+        ancestry = self._get_ancestry(self)
+        another_pk = another_revision.pk if another_revision is not None else None
         priority_queue = []
-        parents = []
-        marks = []
-        heapq.heappush(priority_queue, (-self.pk, self))
-        marks.append(self.pk)
+        path = []
+        marks = set()
+        heapq.heappush(priority_queue, -self.pk)
+        marks.add(self.pk)
         while len(priority_queue) > 0:
-            revision = heapq.heappop(priority_queue)[1]
-            if revision == another_revision:
+            revision_pk = -heapq.heappop(priority_queue)
+            if revision_pk == another_pk:
                 break
-            for parent_revision in revision.parent_revisions.all():
-                if parent_revision.pk not in marks:
-                    marks.append(parent_revision.pk)
-                    heapq.heappush(priority_queue, (-parent_revision.pk, parent_revision))
-            parents.append(revision)
-        return parents
+            for parent_pk in ancestry[revision_pk]:
+                if parent_pk not in marks:
+                    marks.add(parent_pk)
+                    heapq.heappush(priority_queue, -parent_pk)
+            path.append(revision_pk)
+        revisions = ProblemRevision.objects.in_bulk(path)
+        revisions[self.pk] = self
+        return [revisions[pk] for pk in path]
 
     def find_matching_pairs(self, another_revision):
         res = [(self.problem_data, another_revision.problem_data)]
@@ -780,6 +948,24 @@ class ProblemRevision(models.Model):
                     res.append((None, verdict))
         return res
 
+    def _get_matching_objects(self):
+        """
+        Returns all the objects of the revision keyed by the values they are matched with,
+        loading each collection once.
+        """
+        def get_key(obj):
+            return tuple(obj.pk if field == "pk" else getattr(obj, field) for field in obj.get_matching_fields())
+
+        objects = OrderedDict()
+        objects[("problem_data", )] = self.problem_data
+        for attr in self.USER_REVISION_OBJECTS:
+            for obj in getattr(self, attr).all():
+                objects[(attr, get_key(obj))] = obj
+        for solution in self.solution_set.prefetch_related("subtask_verdicts__subtask"):
+            for verdict in solution.subtask_verdicts.all():
+                objects[("verdict", get_key(solution), get_key(verdict.subtask))] = verdict
+        return objects
+
     def find_differed_pairs(self, another_revision):
         result = []
         for base_object, new_object in self.find_matching_pairs(another_revision):
@@ -794,81 +980,82 @@ class ProblemRevision(models.Model):
             raise AssertionError("Commit changes before merge")
 
         merge_base = self.find_merge_base(another_revision)
-        base_current = merge_base.find_matching_pairs(self) if merge_base is not None else {}
-        base_other = merge_base.find_matching_pairs(another_revision) if merge_base is not None else {}
-        current_other = self.find_matching_pairs(another_revision)
-        base_current_dict = {a: b for a, b in base_current if a is not None}
-        current_base_dict = {b: a for a, b in base_current if b is not None}
-        base_other_dict = {a: b for a, b in base_other if a is not None}
-        other_base_dict = {b: a for a, b in base_other if b is not None}
+        base_objects = merge_base._get_matching_objects() if merge_base is not None else {}
+        current_objects = self._get_matching_objects()
+        other_objects = another_revision._get_matching_objects()
 
         matched_triples = []
-        for a, b in base_current_dict.items():
-            matched_triples.append((a, b, base_other_dict.get(a, None)))
-        for a, b in current_other:
-            if current_base_dict.get(a, None) is None and other_base_dict.get(b, None) is None:
-                matched_triples.append((None, a, b))
+        for key in base_objects:
+            matched_triples.append((base_objects[key], current_objects.get(key), other_objects.get(key)))
+        for key in OrderedDict.fromkeys(list(current_objects) + list(other_objects)):
+            if key not in base_objects:
+                matched_triples.append((None, current_objects.get(key), other_objects.get(key)))
+
+        fingerprints = {}
+
+        def differ(version_a, version_b):
+            if version_a is None or version_b is None:
+                return (version_a is None) != (version_b is None)
+            for version in (version_a, version_b):
+                if version not in fingerprints:
+                    fingerprints[version] = version.get_fingerprint()
+            return fingerprints[version_a] != fingerprints[version_b]
 
         ours_ignored = {}
         theirs_ignored = {}
         conflicts = []
-
-        new_revision = self.clone()
-        merge = Merge.objects.create(merged_revision=new_revision,
-                                     our_revision=self,
-                                     their_revision=another_revision,
-                                     base_revision=merge_base)
-        current_new = self.find_matching_pairs(new_revision)
-        current_new_dict = {a: b for a, b in current_new if a is not None}
-
+        removed_objects = []
         remove_matches = []
 
-        for base, ours, theirs in matched_triples:
-            not_none_object = next(a for a in [base, ours, theirs] if a is not None)
-            base_ours = not_none_object.differ(base, ours)
-            base_theirs = not_none_object.differ(base, theirs)
-            ours_theirs = not_none_object.differ(ours, theirs)
-
-            if ours_theirs:
-                if base_ours:
-                    if base_theirs:
-                        conflicts.append((ours, theirs))
-                    if theirs is not None:
-                        if ours is None:
-                            remove_matches.append(theirs)
-                        else:
-                            theirs_ignored[theirs] = current_new_dict[ours]
+        with transaction.atomic():
+            current_new_dict = self._clone()
+            new_revision = current_new_dict[self]
+            merge = Merge.objects.create(merged_revision=new_revision,
+                                         our_revision=self,
+                                         their_revision=another_revision,
+                                         base_revision=merge_base)
+
+            for base, ours, theirs in matched_triples:
+                base_ours = differ(base, ours)
+                base_theirs = differ(base, theirs)
+                ours_theirs = differ(ours, theirs)
+
+                if ours_theirs:
+                    if base_ours:
+                        if base_theirs:
+                            conflicts.append((ours, theirs))
+                        if theirs is not None:
+                            if ours is None:
+                                remove_matches.append(theirs)
+                            else:
+                                theirs_ignored[theirs] = current_new_dict[ours]
+                    else:
+                        if ours is not None:
+                            if theirs is None:
+                                removed_objects.append(current_new_dict[ours])
+                            else:
+                                ours_ignored[theirs] = current_new_dict[ours]
                 else:
                     if ours is not None:
-                        if theirs is None:
-                            current_new_dict[ours].delete()
-                        else:
-                            ours_ignored[theirs] = current_new_dict[ours]
-            else:
-                if ours is not None:
-                    theirs_ignored[theirs] = current_new_dict[ours]
-
-        theirs_ignored[another_revision] = new_revision
-
-        another_revision.clone(cloned_instances=theirs_ignored, replace_objects=ours_ignored)
-        theirs_match = another_revision.find_matching_pairs(new_revision)
-        theirs_match_dict = {a: b for a, b in theirs_match if a is not None}
-        for obj in remove_matches:
-            try:
-                theirs_match_dict[obj].delete()
-            except ObjectDoesNotExist as e:
-                pass
-            except Exception as e:
-                logger.error(e, e)
-
-        for ours, theirs in conflicts:
-            if ours is None:
-                current = None
-            else:
-                current = current_new_dict[ours]
-            Conflict.objects.create(merge=merge, ours=ours, theirs=theirs, current=current)
-        new_revision.parent_revisions = [self, another_revision]
-        new_revision.save()
+                        theirs_ignored[theirs] = current_new_dict[ours]
+
+            theirs_ignored[another_revision] = new_revision
+
+            theirs_new_dict = another_revision._clone(cloned_instances=theirs_ignored, replace_objects=ours_ignored)
+            removed_objects.extend(theirs_new_dict[obj] for obj in remove_matches if obj in theirs_new_dict)
+            removed_pks = OrderedDict()
+            for obj in removed_objects:
+                removed_pks.setdefault(type(obj), []).append(obj.pk)
+            for model, pks in removed_pks.items():
+                model.objects.filter(pk__in=pks).delete()
+
+            Conflict.objects.bulk_create([
+                Conflict(merge=merge, ours=ours, theirs=theirs,
+                         current=current_new_dict[ours] if ours is not None else None)
+                for ours, theirs in conflicts
+            ])
+            new_revision.parent_revisions = [self, another_revision]
+            new_revision.save()
         return new_revision
 
 
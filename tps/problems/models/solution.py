@@ -13,7 +13,7 @@ from problems.models.file import FileNameValidator, get_valid_name
 from problems.models.generic import JSONModel
 from problems.models.problem import ProblemCommit
 from problems.models.testdata import Subtask
-from problems.models.version_control import MatchableMixin
+from problems.models.version_control import MatchableMixin, get_value_fingerprint
 
 from git_orm import models as git_models
 
@@ -66,6 +66,14 @@ class Solution(JSONModel):
         }
         return data
 
+    def get_fingerprint(self):
+        return get_value_fingerprint({
+            "name": self.name,
+            "language": self.language,
+            "verdict": str(self.verdict),
+            "code": self.code.get_fingerprint(),
+        })
+
     def get_language_representation(self):
         if self.language is None:
             return "Auto-detect"
@@ -2,6 +2,7 @@
 import logging
 import json
 import os
+from collections import OrderedDict
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -13,17 +14,19 @@ from django.utils.translation import ugettext_lazy as _
 from core.fields import EnumField
 from judge.results import JudgeVerdict
 from problems.models.enums import SolutionVerdict, SolutionRunVerdict
-from tasks.tasks import CeleryTask
+from tasks.tasks import CeleryTask, PRIORITY_HIGH
 from file_repository.models import FileModel
 from judge import Judge
 from problems.models import Solution, RevisionObject, SolutionSubtaskExpectedVerdict
-from problems.models.testdata import TestCase
+from problems.models.testdata import Subtask, TestCase
 from problems.utils.run_checker import run_checker
+from problems.utils.invocation_events import publish_result
 
 from .fields import DBToGitForeignKey, DBToGitManyToManyField, DBToGitReadOnlyForeignKey
 from django.core.cache import cache
 
-__all__ = ["SolutionRun", "SolutionRunResult", "SolutionRunExecutionTask", "SolutionRunStartTask"]
+__all__ = ["SolutionRun", "SolutionRunResult", "SolutionRunExecutionTask", "SolutionRunStartTask",
+           "SolutionRunCollectTask", "SolutionRunBatchExecutionTask"]
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +40,9 @@ def validate_nonzero_executions(value):
 
 class SolutionRunStartTask(CeleryTask):
 
+    queue = 'evaluate'
+    priority = PRIORITY_HIGH
+
     def execute(self, run):
         try:
             run._run()
@@ -60,6 +66,9 @@ class SolutionRun(RevisionObject):
     creator = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_("creator"))
     task_id = models.CharField(verbose_name=_("task id"), max_length=128, null=True)
     repeat_executions = models.PositiveIntegerField(verbose_name=("number of executions"), default=1, validators=[validate_nonzero_executions])
+    total_results = models.PositiveIntegerField(verbose_name=_("total results"), default=0, editable=False)
+    done_results = models.PositiveIntegerField(verbose_name=_("done results"), default=0, editable=False)
+    summary = models.TextField(verbose_name=_("summary"), null=True, editable=False)
 
     class Meta:
         ordering = ("-creation_date", )
@@ -69,12 +78,54 @@ class SolutionRun(RevisionObject):
         self.invalidate_cache()
         self.validate()
         testcases = [t.pk for t in self.testcases.all()]
-        for solution in self.solutions.all():
-            for testcase in testcases:
-                result = SolutionRunResult(solution_run=self, solution_id=solution.pk, testcase_id=testcase)
+        results = [
+            SolutionRunResult(solution_run=self, solution_id=solution.pk, testcase_id=testcase)
+            for solution in self.solutions.all()
+            for testcase in testcases
+        ]
+        SolutionRun.objects.filter(pk=self.pk).update(summary=None, total_results=len(results), done_results=0)
+        self.summary, self.total_results, self.done_results = None, len(results), 0
+        if self.problem.get_task_type().evaluates_concurrently:
+            SolutionRunResult.objects.bulk_create(results)
+            SolutionRunBatchExecutionTask().delay(self)
+        else:
+            for result in results:
                 result.save()
                 result.run()
 
+    def _evaluate_results(self):
+        """
+        Hands all the pending results to the judge at once. Results are saved
+        in one transaction per batch reported by the judge.
+        """
+        problem = self.problem
+        task_type = problem.get_task_type()
+        results = {}
+        runs = []
+        pending_results = self.results.filter(verdict=SolutionRunVerdict.judging)
+        for result in pending_results.prefetch_related("testcase", "solution"):
+            testcase_code = result._get_testcase_code()
+            if testcase_code is None:
+                continue
+            results[result.pk] = result
+            runs.append((result.pk, testcase_code, result.solution.language, result._get_solution_file()))
+
+        def save_results(finished):
+            # The checker and the repeated executions run before the transaction,
+            # so that it only holds the database writes.
+            for pk, evaluation_result in finished:
+                results[pk]._prepare_completion(evaluation_result)
+            with transaction.atomic():
+                for pk, __ in finished:
+                    # The summary is updated once for the batch, instead of by the signal of each result
+                    results[pk].skip_signals = True
+                    results[pk]._save_completion()
+            self.record_results([
+                results[pk] for pk, __ in finished if results[pk].verdict != SolutionRunVerdict.judging
+            ])
+
+        task_type.generate_outputs(problem.get_judge_code(), runs, save_results)
+
     def run(self):
         if self.task_id is None:
             self.task_id = SolutionRunStartTask().delay(self).id
@@ -84,6 +135,10 @@ class SolutionRun(RevisionObject):
     def get_matching_fields():
         return ["pk"]
 
+    @staticmethod
+    def get_fingerprint_fields():
+        return ["solutions", "testcases"]
+
     def get_value_as_dict(self):
         data = {
             "solutions": [str(solution) for solution in self.solutions.all()],
@@ -115,7 +170,7 @@ class SolutionRun(RevisionObject):
         val = cache.get(cache_key)
         if val is not None:
             return val
-        results = self.results.filter(solution=solution)
+        results = self.results.filter(solution=solution).prefetch_related("solution", "testcase")
         verdict_happend = False
         only_dont_care_happend = True
         for result in results:
@@ -127,6 +182,124 @@ class SolutionRun(RevisionObject):
         cache.set(cache_key, is_valid)
         return is_valid
 
+    def get_progress(self):
+        """
+        Returns the number of finished results, the total number of results and the finished percentage.
+        """
+        if self.total_results == 0:
+            return self.done_results, self.total_results, 100
+        return self.done_results, self.total_results, (self.done_results * 100) // self.total_results
+
+    def get_summary(self):
+        """
+        Returns the summary of the results, as maintained by record_result.
+        It is built from the results the first time it is needed.
+        """
+        if self.summary is None:
+            summary = self._build_summary()
+            with transaction.atomic():
+                locked = SolutionRun.objects.select_for_update().get(pk=self.pk)
+                if locked.summary is None:
+                    locked._save_summary(summary)
+            self.summary, self.done_results, self.total_results = \
+                locked.summary, locked.done_results, locked.total_results
+        return json.loads(self.summary)
+
+    def record_result(self, result):
+        self.record_results([result])
+
+    def record_results(self, results):
+        """
+        Updates the summary with the given (finished) results. Only the cells of the
+        results and the aggregates of their solutions are recomputed.
+        Everything read from the repository is read before locking the solution run,
+        and the subtasks of the testcases are taken from the stored summary.
+        """
+        if not results:
+            return
+        summary = SolutionRun.objects.filter(pk=self.pk).values_list("summary", flat=True).get()
+        if summary is None:
+            # The built summary already contains the saved results
+            built_summary = self._build_summary()
+            cells = []
+        else:
+            built_summary = None
+            testcase_subtasks = json.loads(summary)["testcase_subtasks"]
+            cells = [
+                (result, result.get_summary_cell([
+                    Subtask(name=subtask_pk) for subtask_pk in testcase_subtasks.get(str(result.testcase_id), [])
+                ]))
+                for result in results
+            ]
+
+        with transaction.atomic():
+            locked = SolutionRun.objects.select_for_update().get(pk=self.pk)
+            if locked.summary is None or built_summary is not None:
+                summary = built_summary if built_summary is not None else locked._build_summary()
+            else:
+                summary = json.loads(locked.summary)
+                for result, cell in cells:
+                    summary["cells"].setdefault(str(result.testcase_id), {})[str(result.solution_id)] = cell
+                for solution_pk in OrderedDict((str(result.solution_id), None) for result in results):
+                    _aggregate_solution_summary(summary, solution_pk)
+            locked._save_summary(summary)
+            published = [
+                (result.testcase_id, result.solution_id, summary["cells"][str(result.testcase_id)][str(result.solution_id)])
+                for result in results
+            ]
+            transaction.on_commit(
+                lambda: [publish_result(locked, *result) for result in published]
+            )
+        self.summary, self.done_results, self.total_results = \
+            locked.summary, locked.done_results, locked.total_results
+
+    def _build_summary(self):
+        testcases = list(self.testcases.all())
+        solutions = list(self.solutions.all())
+        subtasks = list(self.problem.subtasks.all())
+        testcases_pk = set(testcase.pk for testcase in testcases)
+
+        subtask_testcases = {}
+        testcase_subtasks = {testcase.pk: [] for testcase in testcases}
+        for subtask in subtasks:
+            subtask_testcases[subtask.pk] = [t.pk for t in subtask.testcases.all() if t.pk in testcases_pk]
+            for testcase_pk in subtask_testcases[subtask.pk]:
+                testcase_subtasks[testcase_pk].append(subtask)
+
+        cells = {str(testcase.pk): {} for testcase in testcases}
+        for result in self.results.prefetch_related("solution", "testcase"):
+            if str(result.testcase_id) in cells:
+                cells[str(result.testcase_id)][str(result.solution_id)] = \
+                    result.get_summary_cell(testcase_subtasks[result.testcase_id])
+
+        summary = {
+            "testcases": [[str(testcase.pk), str(testcase)] for testcase in testcases],
+            "solutions": [[str(solution.pk), str(solution)] for solution in solutions],
+            "subtasks": [[str(subtask.pk), str(subtask)] for subtask in subtasks],
+            "testcase_subtasks": {
+                str(testcase_pk): [str(subtask.pk) for subtask in testcase_subtasks[testcase_pk]]
+                for testcase_pk in testcase_subtasks
+            },
+            "subtask_testcases": {
+                str(subtask_pk): [str(testcase_pk) for testcase_pk in subtask_testcases[subtask_pk]]
+                for subtask_pk in subtask_testcases
+            },
+            "cells": cells,
+            "aggregates": {},
+        }
+        for solution_pk, __ in summary["solutions"]:
+            _aggregate_solution_summary(summary, solution_pk)
+        return summary
+
+    def _save_summary(self, summary):
+        self.summary = json.dumps(summary)
+        cells = [cell for testcase_cells in summary["cells"].values() for cell in testcase_cells.values()]
+        self.done_results = sum(1 for cell in cells if not cell["judging"])
+        self.total_results = max(self.total_results, len(cells))
+        SolutionRun.objects.filter(pk=self.pk).update(
+            summary=self.summary, done_results=self.done_results, total_results=self.total_results
+        )
+
     def started(self):
         return self.results.all().count() == self.solutions.all().count() * self.testcases.all().count()
 
@@ -146,11 +319,54 @@ class SolutionRun(RevisionObject):
         return solution_run
 
 
+def _aggregate_solution_summary(summary, solution_pk):
+    """
+    Recomputes the row of maximums, the validation and the subtask
+    results of a solution from the cells of the summary.
+    """
+    cells = [
+        summary["cells"][testcase_pk][solution_pk]
+        for testcase_pk, __ in summary["testcases"]
+        if solution_pk in summary["cells"].get(testcase_pk, {})
+    ]
+    subtasks = {}
+    for subtask_pk, __ in summary["subtasks"]:
+        verdicts = OrderedDict()
+        min_score = None
+        verdict_happened = False
+        only_dont_care_happened = True
+        for testcase_pk in summary["subtask_testcases"][subtask_pk]:
+            cell = summary["cells"].get(testcase_pk, {}).get(solution_pk)
+            if cell is None:
+                continue
+            if cell["score"] is not None:
+                min_score = cell["score"] if min_score is None else min(min_score, cell["score"])
+            verdicts[cell["verdict"]] = verdicts.get(cell["verdict"], 0) + 1
+            strict_valid, valid = cell["subtasks"][subtask_pk]
+            if strict_valid:
+                verdict_happened = True
+            elif not valid:
+                only_dont_care_happened = False
+        subtasks[subtask_pk] = {
+            "verdicts": list(verdicts.items()),
+            "valid": verdict_happened and only_dont_care_happened,
+            "min_score": min_score,
+        }
+
+    summary["aggregates"][solution_pk] = {
+        "max_time": max([cell["max_time"] for cell in cells if cell["max_time"] is not None] + [0]),
+        "max_memory": max([cell["memory"] for cell in cells if cell["memory"] is not None] + [0]),
+        "max_timing_error": max([cell["timing_error"] for cell in cells if cell["timing_error"] is not None] + [0]),
+        "valid": any(cell["strict_valid"] for cell in cells) and all(cell["valid"] for cell in cells),
+        "subtasks": subtasks,
+    }
+
+
 # TODO: This should be removed. exceptions should be handled explicitly
 def report_failed_on_exception(func):
     def wrapper(self, *args, **kwargs):
         try:
-            func(self, *args, **kwargs)
+            return func(self, *args, **kwargs)
         except Exception as e:
             self.verdict = SolutionRunVerdict.judge_failed
             self.execution_message = str(e)
@@ -165,59 +381,95 @@ def report_failed_on_exception(func):
     return wrapper
 
 
-class SolutionRunExecutionTask(CeleryTask):
-
-    queue = 'invoke'
-
-    def validate_dependencies(self, run):
-        result = True
-        if run.testcase.testcase_generation_completed():
-            if not run.testcase.output_file_generated():
-                run.verdict = SolutionRunVerdict.invalid_testcase
-                run.execution_message = "Testcase generation failed"
+def validate_run_dependencies(run):
+    result = True
+    if run.testcase.testcase_generation_completed():
+        if not run.testcase.output_file_generated():
+            run.verdict = SolutionRunVerdict.invalid_testcase
+            run.execution_message = "Testcase generation failed"
+            run.save()
+            return False
+    else:
+        logger.info("Waiting until testcase {} is generated".format(str(run.testcase)))
+        run.testcase.generate()
+        result = None
+
+    if (not run.testcase.problem.judge_initialization_completed()) or \
+            (not run.testcase.problem.judge_initialization_successful):
+        logger.info("Waiting until problem {} is initialized in judge".format(str(run.testcase.problem)))
+        run.testcase.problem.initialize_in_judge()
+        result = None
+
+    if (not run.testcase.judge_initialization_completed()) or \
+            (not run.testcase.judge_initialization_successful):
+        logger.info("Waiting until testcase {} is initialized in judge".format(str(run.testcase)))
+        run.testcase.initialize_in_judge()
+        result = None
+
+    checker = run.testcase.problem.problem_data.checker
+    if checker is None:
+        run.verdict = SolutionRunVerdict.checker_failed
+        run.execution_message = "Checker not found"
+        run.save()
+        return False
+    else:
+        if checker.compilation_finished:
+            if not checker.compilation_successful():
+                run.verdict = SolutionRunVerdict.checker_failed
+                run.execution_message = "Checker didn't compile. Log:{}".format(checker.last_compile_log)
                 run.save()
                 return False
         else:
-            logger.info("Waiting until testcase {} is generated".format(str(run.testcase)))
-            run.testcase.generate()
+            logger.info("Waiting until checker is compiled".format(str(run.testcase)))
+            checker.compile()
             result = None
 
-        if (not run.testcase.problem.judge_initialization_completed()) or \
-                (not run.testcase.problem.judge_initialization_successful):
-            logger.info("Waiting until problem {} is initialized in judge".format(str(run.testcase.problem)))
-            run.testcase.problem.initialize_in_judge()
-            result = None
+    return result
 
-        if (not run.testcase.judge_initialization_completed()) or \
-                (not run.testcase.judge_initialization_successful):
-            logger.info("Waiting until testcase {} is initialized in judge".format(str(run.testcase)))
-            run.testcase.initialize_in_judge()
-            result = None
 
-        checker = run.testcase.problem.problem_data.checker
-        if checker is None:
-            run.verdict = SolutionRunVerdict.checker_failed
-            run.execution_message = "Checker not found"
-            run.save()
-            return False
-        else:
-            if checker.compilation_finished:
-                if not checker.compilation_successful():
-                    run.verdict = SolutionRunVerdict.checker_failed
-                    run.execution_message = "Checker didn't compile. Log:{}".format(checker.last_compile_log)
-                    run.save()
-                    return False
-            else:
-                logger.info("Waiting until checker is compiled".format(str(run.testcase)))
-                checker.compile()
-                result = None
+class SolutionRunExecutionTask(CeleryTask):
 
-        return result
+    queue = 'evaluate'
+
+    def validate_dependencies(self, run):
+        return validate_run_dependencies(run)
 
     def execute(self, run):
         run._run()
 
 
+class SolutionRunCollectTask(CeleryTask):
+    """
+    Waits for a run pending in the judge without holding a worker:
+    each execution checks the judge once and re-enqueues itself with a longer countdown.
+    """
+
+    queue = 'evaluate'
+
+    def execute(self, run, handle, attempt):
+        run._collect(handle, attempt)
+
+
+class SolutionRunBatchExecutionTask(CeleryTask):
+    """
+    Evaluates all the results of a solution run together,
+    for judges that evaluate runs concurrently.
+    """
+
+    queue = 'evaluate'
+
+    def validate_dependencies(self, solution_run):
+        result = True
+        pending_results = solution_run.results.filter(verdict=SolutionRunVerdict.judging)
+        for run in pending_results.prefetch_related("testcase"):
+            if validate_run_dependencies(run) is None:
+                result = None
+        return result
+
+    def execute(self, solution_run):
+        solution_run._evaluate_results()
+
+
 class SolutionRunResult(models.Model):
     _VERDICTS = [(x.name, x.value) for x in list(SolutionRunVerdict)]
 
@@ -230,6 +482,9 @@ class SolutionRunResult(models.Model):
                                  problem_field_name="base_problem",
                                  verbose_name=_("testcase"), editable=False)
 
+    # Carried in task payloads, so that they can be read without loading the result
+    task_payload_fields = ("solution_run_id", "solution_id", "testcase_id")
+
     class Meta:
         unique_together = ("solution_run", "solution", "testcase")
 
@@ -269,12 +524,12 @@ class SolutionRunResult(models.Model):
     )
 
     @report_failed_on_exception
-    def _run(self):
-        problem = self.solution_run.problem
+    def _get_testcase_code(self):
+        """
+        Returns the judge code of the testcase, or None (after storing the reason)
+        if the solution can not be run on it.
+        """
         testcase = self.testcase
-        # FIXME: Handle the case in which the judge code can't be acquired
-        problem_code = problem.get_judge_code()
-
         input_file = testcase.input_file
         if not input_file:
             self.verdict = SolutionRunVerdict.invalid_testcase
@@ -296,20 +551,85 @@ class SolutionRunResult(models.Model):
             self.execution_message = _("Testcase couldn't be generated")
             self.save()
             return
+        return testcase_code
+
+    @report_failed_on_exception
+    def _run(self):
+        problem = self.solution_run.problem
+        # FIXME: Handle the case in which the judge code can't be acquired
+        problem_code = problem.get_judge_code()
+        testcase_code = self._get_testcase_code()
+        if testcase_code is None:
+            return
 
         task_type = problem.get_task_type()
 
-        evaluation_result = task_type.generate_output(
+        handle, evaluation_result = task_type.submit_run(
             problem_code,
             testcase_code,
             self.solution.language,
-            (
-                problem.problem_data.code_name +
-                os.path.splitext(self.solution.name)[1],
-                self.solution.code
-            )
-            ,
+            self._get_solution_file(),
+        )
+        if evaluation_result is None:
+            self._schedule_collect(task_type, handle, 0)
+        else:
+            self._apply_evaluation_result(evaluation_result)
+
+    def _get_solution_file(self):
+        return (
+            self.solution_run.problem.problem_data.code_name +
+            os.path.splitext(self.solution.name)[1],
+            self.solution.code
         )
+
+    def _schedule_collect(self, task_type, handle, attempt):
+        countdown = task_type.get_poll_interval(attempt)
+        if countdown is None:
+            self.verdict = SolutionRunVerdict.judge_failed
+            self.execution_message = _("Timed out waiting for the judge")
+            self.save()
+            return
+        SolutionRunCollectTask().apply_async(args=(self, handle, attempt), countdown=countdown)
+
+    @report_failed_on_exception
+    def _collect(self, handle, attempt):
+        problem = self.solution_run.problem
+        task_type = problem.get_task_type()
+        evaluation_result = task_type.collect_results(problem.get_judge_code(), [handle]).get(handle)
+        if evaluation_result is None:
+            self._schedule_collect(task_type, handle, attempt + 1)
+        else:
+            self._apply_evaluation_result(evaluation_result)
+
+    def _prepare_completion(self, evaluation_result):
+        """
+        Checks the evaluation result without saving it, see _save_completion.
+        """
+        try:
+            self._check_evaluation_result(evaluation_result)
+        except Exception as e:
+            self.verdict = SolutionRunVerdict.judge_failed
+            self.execution_message = str(e)
+            logger.error(e, exc_info=True)
+
+    @report_failed_on_exception
+    def _save_completion(self):
+        self.save()
+
+    def _apply_evaluation_result(self, evaluation_result):
+        self._check_evaluation_result(evaluation_result)
+        self.save()
+
+    def _check_evaluation_result(self, evaluation_result):
+        # The run fails, but the next one initializes the missing objects in the judge again
+        self.testcase.invalidate_missing_in_judge(evaluation_result)
+        problem = self.solution_run.problem
+        task_type = problem.get_task_type()
+        problem_code = problem.get_judge_code()
+        testcase_code = self.testcase.get_judge_code()
+        input_file = self.testcase.input_file
+        output_file = self.testcase.output_file
+
         self.solution_output, solution_execution_success, \
         self.solution_execution_time, self.solution_memory_usage, \
         solution_verdict, solution_execution_message = \
@@ -357,12 +677,7 @@ class SolutionRunResult(models.Model):
                         problem_code,
                         testcase_code,
                         self.solution.language,
-                        (
-                            problem.problem_data.code_name +
-                            os.path.splitext(self.solution.name)[1],
-                            self.solution.code
-                        )
-                        ,
+                        self._get_solution_file(),
                     )
                     time = repeated_er.execution_time
                     if time is not None:
@@ -386,8 +701,6 @@ class SolutionRunResult(models.Model):
             self.execution_message = solution_execution_message
             self.score = 0
 
-        self.save()
-
     def timing_error(self):
         if self.solution_max_execution_time and self.solution_min_execution_time:
             return self.solution_max_execution_time - self.solution_min_execution_time
@@ -430,6 +743,44 @@ class SolutionRunResult(models.Model):
         cache.set(cache_key, flag)
         return flag
 
+    def get_summary_cell(self, subtasks):
+        """
+        Returns what the summary of the solution run keeps about this result.
+        subtasks: the subtasks containing the testcase
+        """
+        failed_subtasks = []
+        if not self.validate():
+            failed_subtasks.append((None, self.solution.verdict.short_name))
+        for subtask in subtasks:
+            if not self.validate(subtasks=[subtask]):
+                try:
+                    short_name = self.solution.subtask_verdicts[subtask.name].short_name
+                except KeyError:
+                    short_name = self.solution.verdict.short_name
+                failed_subtasks.append((str(subtask), short_name))
+        if self.solution_max_execution_time is not None:
+            max_time = self.solution_max_execution_time
+        else:
+            max_time = self.solution_execution_time
+        return {
+            "id": self.pk,
+            "judging": self.verdict == SolutionRunVerdict.judging,
+            "verdict": self.get_short_name_for_verdict(),
+            "score": self.score,
+            "execution_time": self.solution_execution_time,
+            "max_time": max_time,
+            "memory": self.solution_memory_usage,
+            "timing_error": self.timing_error(),
+            "valid": self.validate(),
+            "strict_valid": self.validate(strict=True),
+            "failed_subtasks": failed_subtasks,
+            "subtasks": {
+                str(subtask.pk): (self.validate(subtasks=[subtask], strict=True),
+                                  self.validate(subtasks=[subtask], strict=False))
+                for subtask in subtasks
+            },
+        }
+
     def validate_for_verdict(self, verdict):
         judge_verdict = self.verdict
         if verdict in [SolutionVerdict.correct, SolutionVerdict.model_solution]:
@@ -4,7 +4,9 @@ import logging
 import os
 import shlex
 import django
+from celery import group
 from celery.exceptions import Retry
+from celery.utils import uuid
 
 from celery.result import AsyncResult
 from django.conf import settings
@@ -21,11 +23,13 @@ from judge.results import JudgeVerdict
 from problems.models import RevisionObject, SourceFile, ProblemCommit
 from problems.models.validator import Validator
 from problems.models.fields import ReadOnlyGitToGitForeignKey
+from problems.models.generation_cache import GeneratedInput, GeneratedOutput
 from problems.models.generic import ManuallyPopulatedModel, FileSystemPopulatedModel, JSONModel
+from problems.models.version_control import get_value_fingerprint
 from runner import get_execution_command
 from runner.actions.action import ActionDescription
 from runner.actions.execute_with_input import execute_with_input
-from tasks.tasks import CeleryTask
+from tasks.tasks import CeleryTask, PRIORITY_HIGH
 
 from git_orm import models as git_models, GitError
 
@@ -43,8 +47,14 @@ class InputGenerator(SourceFile):
         storage_name = "gen"
 
     @staticmethod
-    def text_data_validator(problem, text):
+    def get_subtasks_by_name(problem):
+        return {subtask.name: subtask for subtask in problem.subtasks.all()}
+
+    @staticmethod
+    def text_data_validator(problem, text, subtasks_by_name=None):
         names = set()
+        if subtasks_by_name is None:
+            subtasks_by_name = InputGenerator.get_subtasks_by_name(problem)
 
         def line_valid(line_id, line):
             line = line.strip()
@@ -77,7 +87,7 @@ class InputGenerator(SourceFile):
 
             for subtask_index in range(test_name_separator_index + 3, len(line_split), 2):
                 subtask_name = line_split[subtask_index]
-                if not problem.subtasks.filter(name=subtask_name).exists():
+                if subtask_name not in subtasks_by_name:
                     raise ValidationError({
                         'text_data': ValidationError(_("in line #%(line)s, subtask %(subtask)s doesn't exist."),
                                                      code='invalid',
@@ -87,9 +97,9 @@ class InputGenerator(SourceFile):
         for i, line in enumerate(text.split("\n"), start=1):
             line_valid(i, line)
 
-    def clean(self):
+    def clean(self, subtasks_by_name=None):
         try:
-            InputGenerator.text_data_validator(self.problem, self.text_data)
+            InputGenerator.text_data_validator(self.problem, self.text_data, subtasks_by_name)
         except ValidationError as v:
             raise v
         except Exception as e:
@@ -98,7 +108,7 @@ class InputGenerator(SourceFile):
             })
 
     @classmethod
-    def get_generation_parameters_from_script_line(cls, problem, input_line):
+    def get_generation_parameters_from_script_line(cls, problem, input_line, subtasks_by_name=None):
         line_split = shlex.split(input_line)
         data = dict()
 
@@ -110,10 +120,13 @@ class InputGenerator(SourceFile):
             line_split[subtask_index] for subtask_index in
             range(test_name_separator_index + 3, len(line_split), 2)
             ]
-        data["subtasks"] = [
-            problem.subtasks.get(name=name)
-            for name in subtask_names
-            ]
+        if subtasks_by_name is None:
+            data["subtasks"] = [
+                problem.subtasks.get(name=name)
+                for name in subtask_names
+                ]
+        else:
+            data["subtasks"] = [subtasks_by_name[name] for name in subtask_names]
 
         data["_input_generation_parameters"] = " ".join(
             shlex.quote(line) for line in line_split[0:test_name_separator_index]
@@ -121,8 +134,8 @@ class InputGenerator(SourceFile):
 
         return data
 
-    def _create_test(self, command):
-        data = self.get_generation_parameters_from_script_line(self.problem, command)
+    def _create_test(self, data):
+        data = dict(data)
         subtasks = data.pop("subtasks")
 
         test_case = TestCase(
@@ -132,31 +145,45 @@ class InputGenerator(SourceFile):
             input_static=False,
             output_static=False,
             **data)
+        test_case._transaction = self._transaction
 
         test_case.save()
         test_case.subtasks.add(*subtasks)
+        return test_case
 
     def delete_testcases(self):
         TestCase.objects.filter(generator=self).delete()
 
-    def generate_testcases(self):
+    def generate_testcases(self, subtasks_by_name=None):
+        """
+        Creates the testcases described by the script within the generator's transaction.
+        Their inputs are not generated yet, see TestCase.generate_batch.
+        """
         self.delete_testcases()
+        if subtasks_by_name is None:
+            subtasks_by_name = self.get_subtasks_by_name(self.problem)
 
+        # The name of a testcase is its primary key, so a clashing testcase would be overwritten
+        names = set(TestCase.objects.with_transaction(self._transaction).values_list("pk", flat=True))
+        testcases_data = []
         for command in self.text_data.split("\n"):
             command = command.strip()
             if command:
-                try:
-                    self._create_test(command)
-                except django.db.utils.IntegrityError as e:
-                    data = self.get_generation_parameters_from_script_line(self.problem, command)
+                data = self.get_generation_parameters_from_script_line(self.problem, command, subtasks_by_name)
+                if data['name'] in names:
                     raise ValidationError({
                         'text_data': ValidationError(_("A testcase with name {} already exist!".format(data['name'])))
                     })
+                names.add(data['name'])
+                testcases_data.append(data)
+
+        return [self._create_test(data) for data in testcases_data]
 
     def enable(self):
         try:
-            self.clean()
-            self.generate_testcases()
+            subtasks_by_name = self.get_subtasks_by_name(self.problem)
+            self.clean(subtasks_by_name)
+            testcases = self.generate_testcases(subtasks_by_name)
         except ValidationError as e:
             self.disable()
             raise e
@@ -166,6 +193,8 @@ class InputGenerator(SourceFile):
 
         self.is_enabled = True
         self.save()
+        # The testcases only exist in the commit of the transaction, so the tasks can't load them before
+        self._transaction.on_commit(lambda commit_id: TestCase.generate_batch(testcases))
         return False
 
     def disable(self):
@@ -180,6 +209,13 @@ class InputGenerator(SourceFile):
             "enabled": str(self.is_enabled),
         }
 
+    def get_fingerprint(self):
+        return get_value_fingerprint({
+            "code": self.file.get_fingerprint(),
+            "data": self.text_data,
+            "enabled": str(self.is_enabled),
+        })
+
     @classmethod
     def _get_existing_primary_keys(cls, transaction):
         ls = super(InputGenerator, cls)._get_existing_primary_keys(transaction)
@@ -198,6 +234,10 @@ class InputGenerator(SourceFile):
 
 
 class TestCaseInputGeneration(CeleryTask):
+
+    queue = 'generate'
+    priority = PRIORITY_HIGH
+
     def validate_dependencies(self, testcase):
         if not testcase.input_static:
             if testcase._input_generator.compilation_finished:
@@ -225,6 +265,10 @@ class TestCaseInputGeneration(CeleryTask):
 
 
 class TestCaseOutputGeneration(CeleryTask):
+
+    queue = 'generate'
+    priority = PRIORITY_HIGH
+
     def validate_dependencies(self, testcase):
         if testcase.judge_initialization_completed():
             if not testcase.judge_initialization_successful:
@@ -346,6 +390,10 @@ class TestCase(FileSystemPopulatedModel):
     judge_initialization_successful = models.NullBooleanField(verbose_name=_("initialization finished"), default=None)
     judge_initialization_message = models.CharField(verbose_name=_("initialization message"), max_length=256)
 
+    # The SHA1 of the input and output, stored when the testcases are generated (see CommitTestcaseGenerate)
+    input_digest = models.CharField(verbose_name=_("input digest"), max_length=40, null=True)
+    output_digest = models.CharField(verbose_name=_("output digest"), max_length=40, null=True)
+
     _subtasks = GitToGitManyToManyField("Subtask", verbose_name=_("subtasks"), related_name="+", blank=True)
 
     class Meta:
@@ -438,7 +486,7 @@ class TestCase(FileSystemPopulatedModel):
                 self.judge_initialization_successful, self.judge_initialization_message = \
                     self.problem.get_task_type().add_testcase(
                         problem_code=self.problem.get_judge_code(),
-                        testcase_code=self.name,
+                        testcase_code=self._get_judge_code(),
                         input_file=self.input_file,
                     )
                 self.judge_initialization_task_id = None
@@ -451,11 +499,48 @@ class TestCase(FileSystemPopulatedModel):
     def judge_initialization_completed(self):
         return self.judge_initialization_successful is not None
 
+    def invalidate_judge_initialization(self):
+        self.judge_initialization_successful = None
+        self.judge_initialization_task_id = None
+        self.save()
+
+    def invalidate_missing_in_judge(self, evaluation_result):
+        """
+        Makes the problem or the testcase be initialized in the judge again if the judge
+        reported it missing while running a solution. Returns whether any of them was missing.
+        """
+        if evaluation_result.problem_missing:
+            problem = self.problem
+            # Runs of a whole batch may report the same problem
+            if problem.judge_initialization_completed():
+                problem.invalidate_judge_initialization()
+        elif evaluation_result.testcase_missing:
+            if self.judge_initialization_completed():
+                self.invalidate_judge_initialization()
+        else:
+            return False
+        return True
+
     def get_judge_code(self):
         if not self.judge_initialization_successful:
             return None
         else:
-            return str(self.name)
+            return self._get_judge_code()
+
+    def _get_judge_code(self):
+        # The input is part of the code, so that a testcase added to the judge by
+        # another commit sharing the problem is only reused if it is the same.
+        return "{}_{}".format(self.name, self.input_hash[:12])
+
+    @cached_property
+    def input_hash(self):
+        # Testcases generated before the digest was stored fall back to reading the input
+        return self.input_digest or self.input_file.get_file_hash()
+
+    @cached_property
+    def output_hash(self):
+        # Testcases generated before the digest was stored fall back to reading the output
+        return self.output_digest or self.output_file.get_fingerprint()
 
     @property
     def input_generation_command(self):
@@ -480,6 +565,13 @@ class TestCase(FileSystemPopulatedModel):
             data["generator"] = self.generator.name
         return data
 
+    def get_fingerprint(self):
+        return get_value_fingerprint({
+            "input": self.input_hash if self.input_static else self.input_generation_command,
+            "output": self.output_hash if self.output_static else str(self.solution),
+            "generator": self.generator.name if self.generator else None,
+        })
+
     def clean(self):
         if self._input_uploaded_file is None and self._input_generator_name is None:
             raise ValidationError("Either a static input or a generator must be set")
@@ -553,6 +645,24 @@ class TestCase(FileSystemPopulatedModel):
                 self.save()
                 return
 
+            arguments = json.dumps(shlex.split(self._input_generation_parameters))
+            try:
+                generator_hash = generator_compiled.get_file_hash()
+            except (IOError, OSError) as e:
+                logger.warning("Couldn't hash the compiled generator of {}: {}".format(str(self), e))
+                cache_key = None
+            else:
+                cache_key = GeneratedInput.get_key(
+                    generator_hash, self._input_generator.source_language, arguments
+                )
+                cached_input = GeneratedInput.lookup(cache_key)
+                if cached_input is not None:
+                    self._input_generated_file = cached_input
+                    self.input_generation_log = "Generation successful. Used the cached input {}.".format(cache_key)
+                    self.input_generation_successful = True
+                    self.save()
+                    return
+
             action = ActionDescription(
                 commands=[generation_command],
                 executables=[("generator", generator_compiled)],
@@ -581,6 +691,14 @@ class TestCase(FileSystemPopulatedModel):
                 self._input_generated_file = outputs[stdout_redirect]
                 self.input_generation_log = "Generation successful."
                 self.input_generation_successful = True
+                if cache_key is not None:
+                    try:
+                        GeneratedInput.store(
+                            cache_key, self._input_generated_file,
+                            generator_hash=generator_hash, arguments=arguments
+                        )
+                    except Exception as e:
+                        logger.error("Couldn't cache the input of {}".format(str(self)), exc_info=e)
         self.save()
 
     @property
@@ -647,12 +765,25 @@ class TestCase(FileSystemPopulatedModel):
                         "Generation failed. Solution language is not supported by the judge"
                     self.output_generation_successful = False
                 else:
+                    cache_key, solution_hash, input_hash = self._get_output_cache_key(solution)
+                    cached_output = GeneratedOutput.lookup(cache_key) if cache_key is not None else None
+                    if cached_output is not None:
+                        self.output_generation_log = "Generation successful. Used the cached output {}.".format(
+                            cache_key
+                        )
+                        self.output_generation_successful = True
+                        self._output_generated_file = cached_output
+                        self.save()
+                        return
                     evaluation_result = task_type.generate_output(
                         problem_code=problem_code,
                         testcase_code=testcase_code,
                         language=solution.language,
                         solution_file=(solution.name, solution.code),
                     )
+                    if self.invalidate_missing_in_judge(evaluation_result):
+                        # Generated once the testcase is initialized in the judge again
+                        raise Retry()
                     if not evaluation_result.success:
                         self.output_generation_log = \
                             "Generation failed. Judge couldn't execute the solution. Details: {}".format(
@@ -669,13 +800,72 @@ class TestCase(FileSystemPopulatedModel):
                         self.output_generation_log = "Generation successful"
                         self.output_generation_successful = True
                         self._output_generated_file = evaluation_result.output_file
+                        if cache_key is not None:
+                            try:
+                                GeneratedOutput.store(
+                                    cache_key, self._output_generated_file,
+                                    solution_hash=solution_hash,
+                                    input_hash=input_hash,
+                                )
+                            except Exception as e:
+                                logger.error("Couldn't cache the output of {}".format(str(self)), exc_info=e)
         self.save()
 
+    def _get_output_cache_key(self, solution):
+        """
+        Returns the key of the output in the output cache along with the hashes of
+        the solution and the input. The key is None if any of the files can't be read.
+        """
+        problem_data = self.problem.problem_data
+        try:
+            solution_hash = solution.code.get_file_hash()
+            input_hash = self.input_hash
+            cache_key = GeneratedOutput.get_key(
+                solution_hash=solution_hash,
+                grader_hashes=[
+                    (grader.name, grader.code.get_file_hash()) for grader in self.problem.grader_set.all()
+                ],
+                language=solution.language,
+                input_hash=input_hash,
+                time_limit=problem_data.time_limit,
+                memory_limit=problem_data.memory_limit,
+                task_type=problem_data.task_type,
+                task_type_parameters=problem_data.task_type_parameters,
+                judge=[settings.JUDGE_DEFAULT_NAME, settings.JUDGE_HANDLERS[settings.JUDGE_DEFAULT_NAME]["class"]],
+            )
+        except (IOError, OSError) as e:
+            logger.warning("Couldn't compute the output cache key of {}: {}".format(str(self), e))
+            return None, None, None
+        return cache_key, solution_hash, input_hash
+
     def generate(self):
         if not self.generation_started():
             self.input_generation_task_id = TestCaseInputGeneration().delay(self).id
             self.save()
 
+    @classmethod
+    def generate_batch(cls, testcases):
+        """
+        Starts the input generation of all given testcases as a single group of tasks.
+        The generators are compiled beforehand so that the tasks don't wait for each other.
+        """
+        testcases = [testcase for testcase in testcases if not testcase.generation_started()]
+        generators = {}
+        for testcase in testcases:
+            if not testcase.input_static and testcase._input_generator_name not in generators:
+                generators[testcase._input_generator_name] = testcase._input_generator
+        for generator in generators.values():
+            if generator is not None and not generator.compilation_finished:
+                generator.compile()
+
+        signatures = []
+        for testcase in testcases:
+            testcase.input_generation_task_id = uuid()
+            testcase.save()
+            signatures.append(TestCaseInputGeneration().s(testcase).set(task_id=testcase.input_generation_task_id))
+        if signatures:
+            group(signatures).apply_async()
+
     @property
     def output_file(self):
         """
@@ -17,6 +17,8 @@ logger = logging.getLogger(__name__)
 
 class ValidatorResultComputationTask(CeleryTask):
 
+    queue = 'verify'
+
     def validate_dependencies(self, validator_result):
         verdict = True
         if validator_result.validator.compilation_finished:
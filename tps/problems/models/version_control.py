@@ -1,17 +1,36 @@
+import copy
 from abc import ABCMeta, abstractmethod
 from collections import OrderedDict
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import Max
+from django.db.models.base import ModelState
 from django.core import serializers
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
+import hashlib
 import json
 
-__all__ = ["RevisionObject", "Merge", "Conflict", "CloneableMixin"]
+__all__ = ["RevisionObject", "Merge", "Conflict", "CloneableMixin", "get_value_fingerprint"]
+
+
+def get_value_fingerprint(value):
+    """
+    Returns a digest of a json serializable value, not depending on the order of dict keys.
+    """
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _get_field_fingerprint(obj, field):
+    value = field.value_from_object(obj)
+    if hasattr(value, "pk_list"):
+        # Many to many fields to git objects keep the primary keys of the objects
+        return sorted(str(pk) for pk in value.pk_list)
+    return field.value_to_string(obj)
 
 
 class RevisionObjectQuerySet(models.QuerySet):
@@ -77,13 +96,74 @@ class RevisionObjectManager(models.Manager):
     use_for_related_fields = True
 
 
+def _can_bulk_clone(model):
+    """
+    Objects of a model can be cloned with a single bulk insert only if their ids are
+    assigned by the database and nothing is skipped by not saving them one by one.
+    RevisionObject.save only marks the working copy changed, which is done once for the insert.
+    """
+    return (
+        isinstance(model._meta.pk, models.AutoField) and
+        model.clone is CloneableMixin.clone and
+        model.save in (models.Model.save, RevisionObject.save) and
+        not pre_save.has_listeners(model) and
+        not post_save.has_listeners(model)
+    )
+
+
+def _bulk_insert(model, objects):
+    """
+    Inserts the objects with one bulk_create and sets their primary keys.
+    Databases which don't return the ids of the inserted rows give them increasing ids,
+    so they are read back in one query.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(objects)
+        return
+    last_pk = model.objects.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+    model.objects.bulk_create(objects)
+    pks = list(model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:len(objects)])
+    if len(pks) != len(objects):
+        raise DatabaseError("{} objects were inserted, but {} were found".format(len(objects), len(pks)))
+    for obj, pk in zip(objects, pks):
+        obj.pk = pk
+        obj._state.adding = False
+        obj._state.db = model.objects.db
+
+
 class CloneableMixin(object):
     @staticmethod
-    def clone_queryset(queryset, cloned_instances, replace_objects=None):
-        for obj in queryset.all():
-            cloned_instances = obj.clone(cloned_instances=cloned_instances, replace_objects=replace_objects)
+    def clone_objects(objects, cloned_instances, replace_objects=None):
+        """
+        Clones the given objects (which are not cloned yet), inserting the new objects
+        of each model with one bulk_create when possible.
+        """
+        if not replace_objects:
+            replace_objects = {}
+        bulk_objects = OrderedDict()
+        with transaction.atomic():
+            for obj in objects:
+                if obj in cloned_instances:
+                    continue
+                model = type(obj)
+                if obj in replace_objects or not _can_bulk_clone(model):
+                    cloned_instances = obj.clone(cloned_instances=cloned_instances, replace_objects=replace_objects)
+                    continue
+                new_object = CloneableMixin.copy_model(obj, cloned_instances)
+                bulk_objects.setdefault(model, []).append(new_object)
+                cloned_instances[obj] = new_object
+            for model, new_objects in bulk_objects.items():
+                _bulk_insert(model, new_objects)
+                if model.save is RevisionObject.save:
+                    revisions = OrderedDict((getattr(obj, "problem_id", None), obj) for obj in new_objects)
+                    for new_object in revisions.values():
+                        new_object._mark_working_copy_dirty()
         return cloned_instances
 
+    @staticmethod
+    def clone_queryset(queryset, cloned_instances, replace_objects=None):
+        return CloneableMixin.clone_objects(queryset.all(), cloned_instances, replace_objects)
+
     @staticmethod
     def clone_queryset_relations(queryset, cloned_instances, ignored_instances):
         for obj in queryset.all():
@@ -106,10 +186,32 @@ class CloneableMixin(object):
         pass
 
     @staticmethod
-    def clone_model(obj, cloned_instances, previous_object=None):
-        new_object = type(obj).objects.get(pk=obj.pk)
-        new_object.pk = None if previous_object is None else previous_object.pk
+    def copy_model(obj, cloned_instances):
+        """
+        Returns an unsaved copy of obj, cleaned for being a clone.
+        The fields are copied from obj, so it isn't fetched again. Mutable values
+        and many to many managers are copied as well, so the clone never changes obj.
+        """
+        new_object = copy.copy(obj)
+        new_object._state = ModelState()
+        new_object._state.db = obj._state.db
+        for key, value in obj.__dict__.items():
+            if hasattr(value, "pk_list") and getattr(value, "instance", None) is obj:
+                manager = type(value)(new_object)
+                manager.pk_list = list(value.pk_list)
+                new_object.__dict__[key] = manager
+            elif isinstance(value, (list, dict, set)):
+                new_object.__dict__[key] = copy.copy(value)
+        new_object.__dict__.pop("_prefetched_objects_cache", None)
+        new_object.pk = None
         new_object._clean_for_clone(cloned_instances=cloned_instances)
+        return new_object
+
+    @staticmethod
+    def clone_model(obj, cloned_instances, previous_object=None):
+        new_object = CloneableMixin.copy_model(obj, cloned_instances)
+        if previous_object is not None:
+            new_object.pk = previous_object.pk
         new_object.save(force_update=(previous_object is not None))
         return new_object
 
@@ -131,8 +233,31 @@ class MatchableMixin(object):
     def get_value_as_dict(self):
         raise NotImplementedError
 
+    @staticmethod
+    def get_fingerprint_fields():
+        """
+        Returns the names of the fields making the value of the object,
+        or None for all of its fields except the primary key and the problem.
+        """
+        return None
+
+    def get_fingerprint(self):
+        """
+        Returns a digest of the value of the object, equal for objects with equal values.
+        It is computed from the fields of the model, related objects are represented by their primary keys.
+        Objects holding files should override it to use the digests of the files
+        instead of reading them.
+        """
+        fields = self.get_fingerprint_fields()
+        return get_value_fingerprint({
+            field.name: _get_field_fingerprint(self, field)
+            for field in self._meta.concrete_fields
+            if (field.name in fields if fields is not None else
+                not field.primary_key and field.name != "problem")
+        })
+
     def diverged_from(self, other_object):
-        return self.get_value_as_dict() != other_object.get_value_as_dict()
+        return self.get_fingerprint() != other_object.get_fingerprint()
 
     @staticmethod
     def differ(version_a, version_b):
@@ -154,6 +279,23 @@ class RevisionObject(models.Model, MatchableMixin, CloneableMixin, metaclass=Abs
         super(RevisionObject, self)._clean_for_clone(cloned_instances)
         self.problem = cloned_instances[self.problem]
 
+    def _mark_working_copy_dirty(self):
+        # Only objects stored in a (working copy) revision change it,
+        # the ones referring to a git commit (e.g. solution runs) don't
+        field = self._meta.get_field("problem")
+        if isinstance(field, models.ForeignKey) and field.related_model._meta.label == "problems.ProblemRevision":
+            from problems.models import ProblemBranch
+            ProblemBranch.mark_working_copy_dirty(self.problem_id)
+
+    def save(self, *args, **kwargs):
+        super(RevisionObject, self).save(*args, **kwargs)
+        self._mark_working_copy_dirty()
+
+    def delete(self, *args, **kwargs):
+        result = super(RevisionObject, self).delete(*args, **kwargs)
+        self._mark_working_copy_dirty()
+        return result
+
     @abstractmethod
     def get_value_as_dict(self):
         return get_model_as_dict(self, excluded_fields=["problem"])
@@ -183,7 +325,7 @@ class RevisionObject(models.Model, MatchableMixin, CloneableMixin, metaclass=Abs
         return True
 
     def diverged_from(self, other_object):
-        return self.get_value_as_dict() != other_object.get_value_as_dict()
+        return self.get_fingerprint() != other_object.get_fingerprint()
 
     class Meta:
         abstract = True
@@ -2,6 +2,8 @@ from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
 from problems.models import *
+from problems.models.enums import SolutionRunVerdict
+from problems.utils.revision_errors import invalidate_problem_errors
 
 import logging
 
@@ -74,3 +76,19 @@ def invalidate_problem_initialization(sender, instance, **kwargs):
 def delete_working_copy_on_branch_delete(sender, instance, **kwargs):
     if instance.has_working_copy():
         instance.working_copy.delete()
+
+
+@receiver(post_save, sender=SolutionRunResult, dispatch_uid="update_solution_run_summary")
+@skip_signal_if_required
+def update_solution_run_summary(sender, instance, **kwargs):
+    if instance.verdict != SolutionRunVerdict.judging:
+        instance.solution_run.record_result(instance)
+
+
+@receiver(post_save, sender=Discussion, dispatch_uid="invalidate_problem_errors_discussion")
+@receiver(post_delete, sender=Discussion, dispatch_uid="invalidate_problem_errors_discussion_delete")
+@receiver(post_save, sender=MergeRequest, dispatch_uid="invalidate_problem_errors_merge_request")
+@receiver(post_delete, sender=MergeRequest, dispatch_uid="invalidate_problem_errors_merge_request_delete")
+@skip_signal_if_required
+def invalidate_problem_errors_on_change(sender, instance, **kwargs):
+    invalidate_problem_errors(instance.problem_id)
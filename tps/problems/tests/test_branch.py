@@ -0,0 +1,43 @@
+import mock
+from django.test import TestCase
+from model_mommy import mommy
+
+from problems.models import Problem, ProblemBranch, ProblemRevision, RevisionObject, SolutionRun
+
+
+class WorkingCopyDirtyTests(TestCase):
+
+    def setUp(self):
+        problem = mommy.make(Problem)
+        self.head = mommy.make(ProblemRevision, problem=problem, revision_id="head")
+        self.working_copy = mommy.make(ProblemRevision, problem=problem, revision_id=None)
+        self.branch = mommy.make(ProblemBranch, problem=problem, head=self.head, working_copy=self.working_copy)
+        patcher = mock.patch.object(ProblemRevision, "get_fingerprint", side_effect=AssertionError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reload(self):
+        return ProblemBranch.objects.get(pk=self.branch.pk)
+
+    def test_unchanged_working_copy(self):
+        self.assertFalse(self.branch.working_copy_has_changed())
+
+    def test_saved_objects_mark_the_working_copy(self):
+        obj = mock.Mock(problem_id=self.working_copy.pk)
+        obj._meta.get_field.return_value = ProblemBranch._meta.get_field("head")
+        RevisionObject._mark_working_copy_dirty(obj)
+        self.assertTrue(self.reload().working_copy_has_changed())
+
+    def test_objects_of_commits_do_not_mark_working_copies(self):
+        with mock.patch.object(ProblemBranch, "mark_working_copy_dirty") as mark:
+            RevisionObject._mark_working_copy_dirty(SolutionRun())
+        self.assertFalse(mark.called)
+
+    def test_commit_and_discard_clear_the_mark(self):
+        ProblemBranch.mark_working_copy_dirty(self.working_copy.pk)
+        self.working_copy.commit("changes")
+        self.assertFalse(self.reload().working_copy_dirty)
+        ProblemBranch.mark_working_copy_dirty(self.working_copy.pk)
+        branch = self.reload()
+        branch.discard_working_copy()
+        self.assertFalse(self.reload().working_copy_dirty)
@@ -0,0 +1,41 @@
+import mock
+from django.test import TestCase
+from model_mommy import mommy
+
+from problems.models import CloneableMixin, SolutionRun, SolutionSubtaskExpectedVerdict
+from problems.models.enums import SolutionVerdict
+
+
+class CloneTests(TestCase):
+
+    def setUp(self):
+        # The solution and subtask of the verdicts are no longer database fields
+        patcher = mock.patch.object(SolutionSubtaskExpectedVerdict, "_clean_for_clone")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_verdicts(self, count):
+        return [mommy.make(SolutionSubtaskExpectedVerdict, verdict=SolutionVerdict.correct) for _ in range(count)]
+
+    def test_objects_are_inserted_in_bulk(self):
+        verdicts = self.make_verdicts(5)
+        # A savepoint, the last id, the insert, the new ids and the savepoint release
+        with self.assertNumQueries(5):
+            cloned_instances = CloneableMixin.clone_objects(verdicts, cloned_instances={})
+        clones = [cloned_instances[verdict] for verdict in verdicts]
+        self.assertEqual(len({clone.pk for clone in clones} | {verdict.pk for verdict in verdicts}), 10)
+        self.assertEqual(
+            list(SolutionSubtaskExpectedVerdict.objects.filter(pk__in=[clone.pk for clone in clones]).order_by("pk")),
+            sorted(clones, key=lambda clone: clone.pk)
+        )
+        self.assertFalse(any(clone._state.adding for clone in clones))
+
+    def test_copy_does_not_share_many_to_many_managers(self):
+        run = SolutionRun()
+        run.testcases.add("a")
+        with mock.patch.object(SolutionRun, "_clean_for_clone"):
+            copy = CloneableMixin.copy_model(run, cloned_instances={})
+        copy.testcases.add("b")
+        self.assertEqual(run.testcases.pk_list, ["a"])
+        self.assertEqual(copy.testcases.pk_list, ["a", "b"])
+        self.assertIs(copy.testcases.instance, copy)
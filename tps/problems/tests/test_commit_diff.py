@@ -0,0 +1,53 @@
+import shutil
+import tempfile
+
+import mock
+import pygit2
+from django.test import SimpleTestCase, override_settings
+
+from problems.utils import commit_diff
+from problems.utils.commit_diff import get_diff_files, get_file_patches
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   DIFF_MAX_FILE_SIZE=100)
+class CommitDiffTests(SimpleTestCase):
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.repo = pygit2.init_repository(path, bare=True)
+        self.theirs_id = self.commit({"small": b"a\nb\n", "large": b"x" * 50, "binary": b"\0\1"}, [])
+        self.ours_id = self.commit({"small": b"a\nc\n", "large": b"y" * 500, "binary": b"\0\2"}, [self.theirs_id])
+
+    def commit(self, files, parents):
+        builder = self.repo.TreeBuilder()
+        for name, content in files.items():
+            builder.insert(name, self.repo.create_blob(content), pygit2.GIT_FILEMODE_BLOB)
+        signature = pygit2.Signature("author", "author@example.com")
+        return str(self.repo.create_commit(None, signature, signature, "commit", builder.write(),
+                                           [pygit2.Oid(hex=parent) for parent in parents]))
+
+    def test_files(self):
+        files = {file["path"]: file for file in get_diff_files(self.repo, self.theirs_id, self.ours_id)}
+        self.assertEqual(sorted(files), ["binary", "large", "small"])
+        self.assertEqual((files["large"]["old_size"], files["large"]["new_size"]), (50, 500))
+        self.assertTrue(files["large"]["too_large"])
+        self.assertFalse(files["small"]["too_large"])
+
+    def test_patches(self):
+        files = get_diff_files(self.repo, self.theirs_id, self.ours_id)
+        patches = dict(zip([file["path"] for file in files],
+                           get_file_patches(self.repo, self.theirs_id, self.ours_id, files)))
+        self.assertIsNone(patches["large"])
+        self.assertTrue(patches["binary"]["binary"])
+        self.assertEqual((patches["small"]["additions"], patches["small"]["deletions"]), (1, 1))
+        self.assertIn("+c", patches["small"]["text"])
+
+    def test_patches_are_cached(self):
+        files = get_diff_files(self.repo, self.theirs_id, self.ours_id)
+        get_file_patches(self.repo, self.theirs_id, self.ours_id, files)
+        with mock.patch.object(commit_diff, "cache", wraps=commit_diff.cache) as cache:
+            patches = get_file_patches(self.repo, self.theirs_id, self.ours_id, files)
+            self.assertFalse(cache.set.called)
+        self.assertEqual(len([patch for patch in patches if patch is not None]), 2)
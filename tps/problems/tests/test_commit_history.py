@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+
+import pygit2
+from django.test import SimpleTestCase, override_settings
+
+from git_orm.transaction import Transaction
+from problems.utils.commit_history import get_history_page, get_commit_stats
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CommitHistoryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        repo = pygit2.init_repository(self.path, bare=True)
+        signature = pygit2.Signature("author", "author@example.com", 1500000000, 0)
+        self.commit_ids = []
+        parents = []
+        for i in range(5):
+            builder = repo.TreeBuilder()
+            builder.insert("file", repo.create_blob("line\n" * (i + 1)), pygit2.GIT_FILEMODE_BLOB)
+            commit_id = repo.create_commit(
+                "refs/heads/master", signature, signature, "commit {}".format(i), builder.write(), parents)
+            self.commit_ids.append(str(commit_id))
+            parents = [commit_id]
+        self.transaction = Transaction(repository_path=self.path, commit_id=self.commit_ids[-1])
+
+    def test_pages(self):
+        commits, next_start = get_history_page(self.transaction, page_size=2)
+        self.assertEqual([commit["message"] for commit in commits], ["commit 4", "commit 3"])
+        self.assertEqual(next_start, self.commit_ids[2])
+        self.assertEqual(commits[0]["parents"], [self.commit_ids[3]])
+
+        commits, next_start = get_history_page(self.transaction, start=next_start, page_size=2)
+        self.assertEqual([commit["id"] for commit in commits], [self.commit_ids[2], self.commit_ids[1]])
+
+        commits, next_start = get_history_page(self.transaction, start=next_start, page_size=2)
+        self.assertEqual([commit["id"] for commit in commits], [self.commit_ids[0]])
+        self.assertIsNone(next_start)
+
+    def test_start_not_in_history(self):
+        transaction = Transaction(repository_path=self.path, commit_id=self.commit_ids[1])
+        for start in [self.commit_ids[3], "0" * 40, "invalid"]:
+            with self.assertRaises(KeyError):
+                get_history_page(transaction, start=start)
+        commits, _ = get_history_page(transaction, start=self.commit_ids[1])
+        self.assertEqual([commit["id"] for commit in commits], [self.commit_ids[1], self.commit_ids[0]])
+
+    def test_stats(self):
+        commits, _ = get_history_page(self.transaction, page_size=5)
+        repo = self.transaction.repo
+        self.assertEqual(get_commit_stats(repo, commits[0]),
+                         {"files_changed": 1, "insertions": 1, "deletions": 0})
+        self.assertEqual(get_commit_stats(repo, commits[-1]),
+                         {"files_changed": 1, "insertions": 1, "deletions": 0})
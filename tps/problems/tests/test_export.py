@@ -0,0 +1,119 @@
+import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from model_mommy import mommy
+
+from problems.forms.export import ExportForm
+from problems.models import Problem, ExportPackage
+from problems.models.problem import CommitTestcaseGenerate, GenerationStatus
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ExportPackageWaitTests(TestCase):
+
+    def setUp(self):
+        self.problem = mommy.make(Problem, repository_path="/repo")
+        self.package = self.make_package(self.problem)
+        self.revision = mock.Mock(generation_task_id="generation")
+        patchers = [
+            mock.patch.object(ExportPackage, "revision", new_callable=mock.PropertyMock,
+                              return_value=self.revision),
+            mock.patch("problems.models.export.ExportPackageCreationTask"),
+            mock.patch("problems.models.export.AsyncResult"),
+        ]
+        self.creation_task = patchers[1].start().return_value
+        self.creation_task.delay.return_value.id = "creation"
+        self.task_result = patchers[2].start().return_value
+        self.task_result.failed.return_value = False
+        self.task_result.successful.return_value = False
+        patchers[0].start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        cache.clear()
+
+    @staticmethod
+    def make_package(problem):
+        return mommy.make(ExportPackage, problem=problem, creator=problem.creator, commit_id="c")
+
+    def set_generation_status(self, *statuses):
+        patcher = mock.patch.object(ExportPackage, "_get_generation_status", side_effect=statuses)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_waits_for_generation(self):
+        self.set_generation_status(GenerationStatus.Generating, GenerationStatus.Generating)
+        self.package.wait_for_testcases()
+        package = ExportPackage.objects.get(pk=self.package.pk)
+        self.assertTrue(package.waiting_for_testcases)
+        self.assertTrue(package.being_created)
+        self.assertFalse(self.creation_task.delay.called)
+        self.assertFalse(self.revision.generate_testcases.called)
+
+    def test_generation_finishing_before_waiting_starts_creation(self):
+        self.set_generation_status(GenerationStatus.Generating, GenerationStatus.GenerationSuccessful)
+        self.package.wait_for_testcases()
+        package = ExportPackage.objects.get(pk=self.package.pk)
+        self.assertFalse(package.waiting_for_testcases)
+        self.assertEqual(package.creation_task_id, "creation")
+        self.assertEqual(self.creation_task.delay.call_count, 1)
+
+    def test_creation_is_resumed_once(self):
+        ExportPackage.objects.filter(pk=self.package.pk).update(waiting_for_testcases=True)
+        self.package.resume_creation()
+        ExportPackage.objects.get(pk=self.package.pk).resume_creation()
+        self.assertEqual(self.creation_task.delay.call_count, 1)
+
+    def test_dead_generation_is_restarted(self):
+        self.task_result.failed.return_value = True
+        self.set_generation_status(*[GenerationStatus.Generating] * 3)
+        self.package.wait_for_testcases()
+        self.assertEqual(self.revision.generate_testcases.call_count, 1)
+        self.assertTrue(ExportPackage.objects.get(pk=self.package.pk).waiting_for_testcases)
+
+    def test_generation_is_started_once(self):
+        self.set_generation_status(*[GenerationStatus.NotGenerated] * 4)
+        self.revision.generation_task_id = None
+        self.package.wait_for_testcases()
+        self.make_package(self.problem).wait_for_testcases()
+        self.assertEqual(self.revision.generate_testcases.call_count, 1)
+        self.assertEqual(ExportPackage.objects.filter(waiting_for_testcases=True).count(), 2)
+
+    def test_dead_generation_is_restarted_once(self):
+        self.task_result.failed.return_value = True
+        self.set_generation_status(*[GenerationStatus.Generating] * 9)
+        self.package.wait_for_testcases()
+        self.make_package(self.problem).wait_for_testcases()
+        self.assertEqual(self.revision.generate_testcases.call_count, 1)
+        self.revision.generation_task_id = "generation2"
+        self.make_package(self.problem).wait_for_testcases()
+        self.assertEqual(self.revision.generate_testcases.call_count, 2)
+
+    def test_generation_resumes_packages_of_its_problem(self):
+        other_package = self.make_package(mommy.make(Problem, repository_path="/other"))
+        ExportPackage.objects.update(waiting_for_testcases=True)
+        CommitTestcaseGenerate().execute_child_tasks("/repo", "c", "/out")
+        self.assertFalse(ExportPackage.objects.get(pk=self.package.pk).waiting_for_testcases)
+        self.assertTrue(ExportPackage.objects.get(pk=other_package.pk).waiting_for_testcases)
+        self.assertEqual(self.creation_task.delay.call_count, 1)
+
+
+class ExportFormTests(TestCase):
+
+    def setUp(self):
+        self.problem = mommy.make(Problem)
+        self.base_package = mommy.make(ExportPackage, problem=self.problem, creator=self.problem.creator,
+                                       exporter="json_file", export_format="zip",
+                                       creation_successful=True, manifest="{}")
+
+    def make_form(self, export_format):
+        return ExportForm({
+            "exporter": "json_file",
+            "export_format": export_format,
+            "base_package": self.base_package.pk,
+        }, problem=self.problem, revision=mock.Mock(), user=self.problem.creator)
+
+    def test_base_package_has_the_same_format(self):
+        self.assertTrue(self.make_form("zip").is_valid())
+        form = self.make_form("tar")
+        self.assertFalse(form.is_valid())
+        self.assertIn("base_package", form.errors)
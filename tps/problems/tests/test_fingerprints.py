@@ -0,0 +1,110 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import mock
+import pygit2
+from django.test import SimpleTestCase, TestCase, override_settings
+from model_mommy import mommy
+
+from problems.models import Problem, ProblemRevision, SolutionSubtaskExpectedVerdict, TestCase as TestCaseModel
+from problems.models import problem as problem_models
+from problems.models.enums import SolutionVerdict
+from problems.models.problem import CommitTestcaseGenerate
+from problems.models.solution import SolutionFile
+from problems.models.version_control import get_value_fingerprint
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_git_file_fingerprint_is_blob_id(self):
+        self.assertEqual(SolutionFile(name="a.cpp", content="int main() {}\n").get_fingerprint(),
+                         str(pygit2.hash(b"int main() {}\n")))
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(get_value_fingerprint(OrderedDict([("a", "1"), ("b", "2")])),
+                         get_value_fingerprint(OrderedDict([("b", "2"), ("a", "1")])))
+        self.assertNotEqual(get_value_fingerprint({"a": "1", "b": "2"}), get_value_fingerprint({"a": "1", "b": "3"}))
+
+    def test_default_fingerprint_reads_the_fields(self):
+        first = SolutionSubtaskExpectedVerdict(pk=1, verdict=SolutionVerdict.correct)
+        second = SolutionSubtaskExpectedVerdict(pk=2, verdict=SolutionVerdict.correct)
+        with mock.patch.object(SolutionSubtaskExpectedVerdict, "get_value_as_dict") as get_value_as_dict:
+            self.assertFalse(first.diverged_from(second))
+            second.verdict = SolutionVerdict.incorrect
+            self.assertTrue(first.diverged_from(second))
+        self.assertFalse(get_value_as_dict.called)
+
+
+class InputDigestTests(SimpleTestCase):
+
+    def test_generation_stores_digests(self):
+        src, dst = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, src)
+        self.addCleanup(shutil.rmtree, dst)
+        for name, content in [("t.in", b"1 2\n"), ("t.out", b"3\n")]:
+            with open(os.path.join(src, name), "wb") as f:
+                f.write(content)
+        testcase = mock.Mock(get__input_uploaded_file_id=os.path.join(dst, "tests", "t.in"),
+                             get__output_uploaded_file_id=os.path.join(dst, "tests", "t.out"))
+        revision = mock.Mock(**{"testcase_set.all.return_value": [testcase]})
+        digests = {}
+        shutil.copytree(src, os.path.join(dst, "tests"), copy_function=problem_models._get_hashing_copy(digests))
+        CommitTestcaseGenerate.store_digests(revision, digests)
+        self.assertEqual(testcase.input_digest, hashlib.sha1(b"1 2\n").hexdigest())
+        self.assertEqual(testcase.output_digest, hashlib.sha1(b"3\n").hexdigest())
+        self.assertTrue(testcase.save.called)
+        with open(os.path.join(dst, "tests", "t.in"), "rb") as f:
+            self.assertEqual(f.read(), b"1 2\n")
+
+    def test_failing_to_store_digests_does_not_fail_the_generation(self):
+        out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, out_dir)
+        revision = mock.Mock()
+        with mock.patch.object(problem_models, "Transaction"), \
+                mock.patch.object(problem_models.ProblemCommit, "objects") as objects, \
+                mock.patch.object(problem_models.os, "system"), \
+                mock.patch.object(problem_models.subprocess, "call", return_value=0), \
+                mock.patch.object(problem_models.shutil, "copytree"), \
+                mock.patch.object(CommitTestcaseGenerate, "store_digests", side_effect=IOError), \
+                mock.patch.object(problem_models.logger, "error") as log_error:
+            objects.with_transaction.return_value.get.return_value = revision
+            CommitTestcaseGenerate().execute("repo", "c", out_dir)
+        self.assertEqual(revision.generation_status, problem_models.GenerationStatus.GenerationSuccessful)
+        self.assertTrue(log_error.called)
+
+    def test_fingerprint_uses_the_stored_digests(self):
+        testcase = TestCaseModel(name="t", input_digest="a" * 40, output_digest="b" * 40)
+        with mock.patch.object(TestCaseModel, "input_file", new_callable=mock.PropertyMock) as input_file, \
+                mock.patch.object(TestCaseModel, "output_file", new_callable=mock.PropertyMock) as output_file, \
+                mock.patch.object(TestCaseModel, "generator", None):
+            testcase.get_fingerprint()
+            self.assertEqual((testcase.input_hash, testcase.output_hash), ("a" * 40, "b" * 40))
+        self.assertFalse(input_file.called)
+        self.assertFalse(output_file.called)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RevisionFingerprintTests(TestCase):
+
+    def setUp(self):
+        self.revision = mommy.make(ProblemRevision, problem=mommy.make(Problem), revision_id=None)
+        self.objects = {("problem_data", ): mock.Mock(**{"get_fingerprint.return_value": "a"})}
+        patcher = mock.patch.object(ProblemRevision, "_get_matching_objects", side_effect=lambda: self.objects)
+        self.get_matching_objects = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_committed_fingerprint_is_cached(self):
+        self.revision.revision_id = "c"
+        self.revision.save()
+        fingerprint = self.revision.get_fingerprint()
+        self.objects[("problem_data", )].get_fingerprint.return_value = "b"
+        self.assertEqual(ProblemRevision.objects.get(pk=self.revision.pk).get_fingerprint(), fingerprint)
+        self.assertEqual(self.get_matching_objects.call_count, 1)
+
+    def test_working_copy_fingerprint_follows_its_objects(self):
+        fingerprint = self.revision.get_fingerprint()
+        self.objects[("problem_data", )].get_fingerprint.return_value = "b"
+        self.assertNotEqual(self.revision.get_fingerprint(), fingerprint)
@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from file_repository.models import FileModel
+from problems.models import GeneratedInput, GeneratedOutput
+
+
+class GenerationCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create_file(self, content):
+        file_model = FileModel(name="output.txt")
+        file_model.file.save("output.txt", ContentFile(content))
+        return file_model
+
+
+class GeneratedInputTests(GenerationCacheTestCase):
+
+    def test_miss(self):
+        self.assertIsNone(GeneratedInput.lookup(GeneratedInput.get_key("hash", "c++", "[]")))
+
+    def test_hit_returns_copy(self):
+        key = GeneratedInput.get_key("hash", "c++", '["1", "2"]')
+        generated = self.create_file(b"1 2\n")
+        GeneratedInput.store(key, generated, generator_hash="hash", arguments='["1", "2"]')
+
+        cached = GeneratedInput.lookup(key)
+        self.assertIsNotNone(cached)
+        self.assertNotEqual(cached.pk, generated.pk)
+        self.assertEqual(cached.get_file_hash(), generated.get_file_hash())
+        self.assertEqual(GeneratedInput.objects.get(key=key).hits, 1)
+
+    def test_same_content_shares_file(self):
+        first = GeneratedInput.store(GeneratedInput.get_key("a", "c++", "[]"), self.create_file(b"5\n"),
+                                     generator_hash="a", arguments="[]")
+        second = GeneratedInput.store(GeneratedInput.get_key("b", "c++", "[]"), self.create_file(b"5\n"),
+                                      generator_hash="b", arguments="[]")
+        self.assertEqual(first.file_id, second.file_id)
+
+    def test_key_depends_on_arguments(self):
+        self.assertNotEqual(
+            GeneratedInput.get_key("hash", "c++", '["1"]'),
+            GeneratedInput.get_key("hash", "c++", '["2"]'),
+        )
+
+
+class GeneratedOutputTests(GenerationCacheTestCase):
+
+    def store(self, key, content):
+        return GeneratedOutput.store(key, self.create_file(content), solution_hash="s", input_hash="i")
+
+    def test_key_depends_on_limits(self):
+        self.assertNotEqual(
+            GeneratedOutput.get_key("s", [("grader.cpp", "g")], "c++", "i", 1, 256),
+            GeneratedOutput.get_key("s", [("grader.cpp", "g")], "c++", "i", 2, 256),
+        )
+
+    def test_key_depends_on_judge(self):
+        self.assertNotEqual(
+            GeneratedOutput.get_key("s", [], "c++", "i", 1, 256, judge="local_runner"),
+            GeneratedOutput.get_key("s", [], "c++", "i", 1, 256, judge="cms"),
+        )
+
+    def test_key_ignores_grader_order(self):
+        self.assertEqual(
+            GeneratedOutput.get_key("s", [("a", "1"), ("b", "2")], "c++", "i", 1, 256),
+            GeneratedOutput.get_key("s", [("b", "2"), ("a", "1")], "c++", "i", 1, 256),
+        )
+
+    def test_evict_least_recently_used(self):
+        old = self.store("old", b"1234")
+        self.store("new", b"5678")
+        self.assertEqual(GeneratedOutput.total_size(), 8)
+
+        GeneratedOutput.evict_least_recently_used(4)
+
+        self.assertEqual(list(GeneratedOutput.objects.values_list("key", flat=True)), ["new"])
+        self.assertFalse(FileModel.objects.filter(pk=old.file_id).exists())
+
+    def test_shared_file_is_kept(self):
+        first = self.store("first", b"same")
+        self.store("second", b"same")
+        self.assertEqual(GeneratedOutput.total_size(), 4)
+
+        GeneratedOutput.evict(GeneratedOutput.objects.filter(key="first"))
+
+        self.assertTrue(FileModel.objects.filter(pk=first.file_id).exists())
+
+    def test_eviction_frees_shared_files_once(self):
+        self.store("first", b"same")
+        self.store("second", b"same")
+        self.store("new", b"5678")
+        self.assertEqual(GeneratedOutput.total_size(), 8)
+
+        GeneratedOutput.evict_least_recently_used(4)
+
+        self.assertEqual(list(GeneratedOutput.objects.values_list("key", flat=True)), ["new"])
+        self.assertEqual(GeneratedOutput.total_size(), 4)
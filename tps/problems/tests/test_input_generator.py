@@ -0,0 +1,141 @@
+import json
+import shutil
+import tempfile
+
+import mock
+import pygit2
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+
+from git_orm.transaction import Transaction
+from problems.models import InputGenerator, TestCase
+from tasks.serializers import DjangoPKSerializer, git_transaction_cache
+
+
+class InputGeneratorScriptTests(SimpleTestCase):
+
+    def setUp(self):
+        self.generator = InputGenerator(name="gen")
+        self.generator._transaction = mock.Mock()
+        self.problem = mock.Mock()
+        self.problem.subtasks.all.return_value = []
+        self.testcases = mock.Mock()
+        self.testcases.with_transaction.return_value.values_list.return_value = ["sample"]
+        patchers = [
+            mock.patch.object(InputGenerator, "problem", new_callable=mock.PropertyMock, return_value=self.problem),
+            mock.patch.object(TestCase, "objects", self.testcases),
+            mock.patch.object(InputGenerator, "delete_testcases"),
+            mock.patch.object(InputGenerator, "_create_test", side_effect=lambda data: data["name"]),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.subtasks_by_name = {"st": mock.Mock()}
+
+    def generate(self, text_data):
+        self.generator.text_data = text_data
+        return self.generator.generate_testcases(self.subtasks_by_name)
+
+    def test_creates_testcases(self):
+        self.assertEqual(self.generate("1 > a | st\n2 > b"), ["a", "b"])
+
+    def test_duplicate_names_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.generate("1 > a | st\n2 > a")
+        self.assertFalse(InputGenerator._create_test.called)
+
+    def test_names_clashing_with_existing_testcases_are_rejected(self):
+        with self.assertRaises(ValidationError):
+            self.generate("1 > a\n2 > sample")
+        self.assertFalse(InputGenerator._create_test.called)
+
+    def test_existing_testcases_are_listed_by_name(self):
+        self.generate("1 > a")
+        self.testcases.with_transaction.assert_called_once_with(self.generator._transaction)
+        self.testcases.with_transaction.return_value.values_list.assert_called_once_with("pk", flat=True)
+
+    def test_enable_generates_inputs_after_commit(self):
+        events = []
+        self.generator._transaction.on_commit.side_effect = lambda func: events.append(func)
+        with mock.patch.object(InputGenerator, "clean"), \
+                mock.patch.object(InputGenerator, "save", autospec=True,
+                                  side_effect=lambda generator: events.append(("save", generator.is_enabled))), \
+                mock.patch.object(TestCase, "generate_batch", side_effect=lambda testcases: events.append(testcases)):
+            self.generator.text_data = "1 > a"
+            self.generator.enable()
+            self.assertEqual(events[0], ("save", True))
+            self.assertEqual(len(events), 2)
+            events.pop()("commit id")
+        self.assertEqual(events, [("save", True), ["a"]])
+
+
+class InputGeneratorCommitTests(SimpleTestCase):
+    """
+    Follows the testcases of an enabled generator from its commit to the tasks generating them.
+    The testcases are kept as blobs, the storage of TestCase objects is not involved.
+    """
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        repo = pygit2.init_repository(path, bare=True)
+        signature = pygit2.Signature("author", "author@example.com")
+        self.initial_commit = repo.create_commit("refs/heads/master", signature, signature, "initial",
+                                                 repo.TreeBuilder().write(), [])
+        self.transaction = Transaction(repository_path=path, branch_name="master")
+        self.generator = InputGenerator(name="gen", text_data="1 > a")
+        self.generator._transaction = self.transaction
+        self.addCleanup(git_transaction_cache.clear)
+
+        self.payloads = []
+        patchers = [
+            mock.patch.object(InputGenerator, "problem", new_callable=mock.PropertyMock),
+            mock.patch.object(InputGenerator, "get_subtasks_by_name", return_value={}),
+            mock.patch.object(InputGenerator, "clean"),
+            mock.patch.object(InputGenerator, "save"),
+            mock.patch.object(InputGenerator, "delete_testcases"),
+            mock.patch.object(InputGenerator, "_create_test", autospec=True, side_effect=self.create_test),
+            mock.patch.object(TestCase, "generate_batch", side_effect=self.queue),
+            mock.patch.object(TestCase, "objects"),
+            mock.patch.object(TestCase, "_get_instance", side_effect=self.load),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        TestCase.objects.with_transaction.return_value.values_list.return_value = []
+
+    @staticmethod
+    def create_test(generator, data):
+        testcase = TestCase(name=data["name"])
+        testcase._transaction = generator._transaction
+        generator._transaction.set_blob("tests/{}.desc".format(data["name"]), b"generated")
+        return testcase
+
+    def queue(self, testcases):
+        self.payloads.extend(DjangoPKSerializer.model_encode(testcase) for testcase in testcases)
+
+    @staticmethod
+    def load(transaction, pk):
+        testcase = TestCase(name=pk)
+        testcase._transaction = transaction
+        testcase.description = transaction.get_blob("tests/{}.desc".format(pk))
+        return testcase
+
+    def test_testcases_are_queued_against_the_new_commit(self):
+        self.generator.enable()
+        self.assertEqual(self.payloads, [])
+
+        commit_id = self.transaction.commit(message="Enabled generator gen")
+        self.assertEqual(len(self.payloads), 1)
+        self.assertEqual(json.loads(self.payloads[0])["__git__"][2], str(commit_id))
+
+        testcase = DjangoPKSerializer.model_decode(self.payloads[0])
+        self.assertEqual(testcase.pk, "a")
+        self.assertEqual(testcase.description, b"generated")
+        self.assertEqual(testcase._transaction.parents, [commit_id])
+
+    def test_rolled_back_testcases_are_not_queued(self):
+        self.generator.enable()
+        self.transaction.rollback()
+        self.transaction.commit(message="empty", allow_empty=True)
+        self.assertEqual(self.payloads, [])
@@ -0,0 +1,81 @@
+import json
+
+import mock
+from django.test import SimpleTestCase
+
+from problems.models import SolutionRun
+from problems.utils import invocation_events
+
+
+class FakePubSub(object):
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+        self.closed = False
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+
+    def get_message(self, timeout=None):
+        return self.messages.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class InvocationEventsTests(SimpleTestCase):
+
+    def stream(self, solution_run, messages, refresh=None):
+        pubsub = FakePubSub(messages)
+        connection = mock.Mock(**{"pubsub.return_value": pubsub})
+        with mock.patch.object(invocation_events, "get_redis_connection", return_value=connection), \
+                mock.patch.object(SolutionRun, "refresh_from_db", side_effect=refresh):
+            events = list(invocation_events.stream_results(solution_run))
+        return pubsub, events
+
+    def test_streams_until_done(self):
+        solution_run = SolutionRun(pk=7, done_results=0, total_results=2)
+        messages = [
+            None,
+            {"data": json.dumps({"done": 1, "total": 2}).encode("utf-8")},
+            {"data": json.dumps({"done": 2, "total": 2}).encode("utf-8")},
+        ]
+        pubsub, events = self.stream(solution_run, messages)
+        self.assertEqual(pubsub.channels, ["solution_run_7_events"])
+        self.assertTrue(pubsub.closed)
+        self.assertEqual(events[0], 'event: progress\ndata: {"done": 0, "total": 2, "percent": 0}\n\n')
+        self.assertEqual(events[1], ": keep-alive\n\n")
+        self.assertEqual(len(events), 4)
+        self.assertTrue(events[3].startswith("event: result\n"))
+
+    def test_finished_run(self):
+        solution_run = SolutionRun(pk=7, done_results=2, total_results=2)
+        pubsub, events = self.stream(solution_run, [])
+        self.assertEqual(len(events), 1)
+        self.assertTrue(pubsub.closed)
+
+    def test_progress_is_reread_when_idle(self):
+        solution_run = SolutionRun(pk=7, done_results=0, total_results=2)
+        progress = iter([0, 2])
+
+        def refresh(fields):
+            solution_run.done_results = next(progress)
+
+        pubsub, events = self.stream(solution_run, [None], refresh=refresh)
+        self.assertEqual(events[-1], 'event: progress\ndata: {"done": 2, "total": 2, "percent": 100}\n\n')
+        self.assertEqual(len(events), 2)
+
+    def test_stalled_run(self):
+        solution_run = SolutionRun(pk=7, done_results=0, total_results=2)
+        with mock.patch.object(invocation_events, "STALL_TIMEOUT", 0):
+            pubsub, events = self.stream(solution_run, [])
+        self.assertTrue(events[-1].startswith("event: stalled\n"))
+        self.assertTrue(pubsub.closed)
+
+    def test_stream_duration_is_limited(self):
+        solution_run = SolutionRun(pk=7, done_results=0, total_results=2)
+        with mock.patch.object(invocation_events, "MAX_STREAM_DURATION", 0):
+            pubsub, events = self.stream(solution_run, [])
+        self.assertEqual(len(events), 1)
+        self.assertTrue(pubsub.closed)
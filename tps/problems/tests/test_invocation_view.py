@@ -0,0 +1,62 @@
+import mock
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, RequestFactory
+from model_mommy import mommy
+
+from problems.models import Problem, SolutionRun
+from problems.views import invocations
+from problems.views.invocations import InvocationDetailsView
+
+
+class MasterBranch(object):
+
+    def get_slug(self):
+        return "master"
+
+
+class InvocationDetailsViewTests(TestCase):
+
+    def setUp(self):
+        self.problem = mommy.make(Problem, code="sample")
+        self.revision = mock.Mock(commit_id="a" * 40)
+        self.solution_run = SolutionRun(pk=3, done_results=1, total_results=2)
+        self.summary = {
+            "testcases": [["1", "test1"]],
+            "solutions": [["10", "sol.cpp"]],
+            "subtasks": [["5", "subtask1"]],
+            "cells": {"1": {"10": None}},
+            "aggregates": {"10": {
+                "valid": False,
+                "max_time": 0.5,
+                "max_memory": 12,
+                "max_timing_error": False,
+                "subtasks": {"5": {"verdicts": [("AC", 1)], "valid": True, "min_score": 1}},
+            }},
+        }
+
+    def get(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.resolver_match = mock.Mock(kwargs={"problem_code": "sample", "revision_slug": "master"})
+        view = InvocationDetailsView()
+        view.request = request
+        view.problem = self.problem
+        view.revision = self.revision
+        with mock.patch.object(invocations, "get_object_or_404", return_value=self.solution_run), \
+                mock.patch.object(SolutionRun, "started", return_value=True), \
+                mock.patch.object(SolutionRun, "get_summary", return_value=self.summary), \
+                mock.patch("problems.views.context_processors.get_revision_data",
+                           return_value=(self.problem, None, self.revision)), \
+                mock.patch("problems.views.context_processors.get_revision_errors", return_value={}), \
+                mock.patch.object(Problem, "branches", new_callable=mock.PropertyMock,
+                                  return_value=mock.Mock(**{"all.return_value": []})), \
+                mock.patch.object(Problem, "get_master_branch", lambda problem: MasterBranch()):
+            return view.get(request, "sample", "master", "3")
+
+    def test_renders(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode("utf-8")
+        self.assertIn('<td class="alert alert-danger force-bgcolor" id="solution-10">sol.cpp</td>', content)
+        self.assertIn('<td class="alert alert-danger force-bgcolor">sol.cpp</td>', content)
+        self.assertIn("subtask1", content)
@@ -0,0 +1,40 @@
+import mock
+from django.test import SimpleTestCase
+
+from judge.results import EvaluationResult, JudgeVerdict
+from problems.models import TestCase
+
+
+class MissingInJudgeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.testcase = TestCase(name="t")
+        self.problem = mock.Mock()
+        patchers = [
+            mock.patch.object(TestCase, "problem", new_callable=mock.PropertyMock, return_value=self.problem),
+            mock.patch.object(TestCase, "save"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.testcase.judge_initialization_successful = True
+        self.testcase.judge_initialization_task_id = "init"
+
+    def check(self, **missing):
+        return self.testcase.invalidate_missing_in_judge(
+            EvaluationResult(success=False, verdict=JudgeVerdict.judge_failed, **missing)
+        )
+
+    def test_missing_problem_is_initialized_again(self):
+        self.assertTrue(self.check(problem_missing=True))
+        self.assertTrue(self.problem.invalidate_judge_initialization.called)
+
+    def test_missing_testcase_is_initialized_again(self):
+        self.assertTrue(self.check(testcase_missing=True))
+        self.assertFalse(self.testcase.judge_initialization_completed())
+        self.assertIsNone(self.testcase.judge_initialization_task_id)
+        self.assertFalse(self.problem.invalidate_judge_initialization.called)
+
+    def test_other_failures_keep_the_initialization(self):
+        self.assertFalse(self.check())
+        self.assertTrue(self.testcase.judge_initialization_completed())
@@ -0,0 +1,105 @@
+from collections import Counter
+
+import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from model_mommy import mommy
+
+from problems.models import Problem, Solution, SolutionRun, SolutionRunResult, TestCase as TestCaseModel
+from problems.models import fields
+
+
+class GitQuerySet(object):
+    """
+    Like the querysets of git models, reads the objects on the first iteration unless they are set by a prefetch.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._result_cache = None
+
+    def __iter__(self):
+        if self._result_cache is None:
+            self._result_cache = self._load()
+        return iter(self._result_cache)
+
+    def all(self):
+        return self
+
+
+class DBToGitPrefetchTests(TestCase):
+    """
+    The git repository is replaced by managers recording the objects read from each commit.
+    """
+
+    def setUp(self):
+        self.reads = Counter()
+        patchers = [
+            mock.patch.object(fields, "Transaction", side_effect=lambda **kwargs: mock.Mock(**kwargs)),
+            mock.patch.object(Solution, "objects", self.make_manager(Solution)),
+            mock.patch.object(TestCaseModel, "objects", self.make_manager(TestCaseModel)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        problem = mommy.make(Problem, repository_path="repo")
+        creator = mommy.make(get_user_model())
+        self.runs = [self.make_run(problem, creator, commit_id) for commit_id in ["c1", "c1", "c2"]]
+        self.reads.clear()
+
+    def make_manager(self, model):
+        def with_transaction(git_transaction):
+            def load(pks):
+                self.reads[model, git_transaction.commit_id] += 1
+                objects = []
+                for pk in pks:
+                    obj = model(name=pk)
+                    obj._transaction = git_transaction
+                    objects.append(obj)
+                return objects
+
+            def filter(pk__in):
+                return GitQuerySet(lambda: load(pk__in))
+            return mock.Mock(filter=filter)
+        return mock.Mock(with_transaction=with_transaction)
+
+    @staticmethod
+    def make_run(problem, creator, commit_id):
+        run = SolutionRun(base_problem=problem, commit_id=commit_id, creator=creator)
+        run.solutions = ["s1", "s2"]
+        run.testcases = ["t1", "t2"]
+        run.save()
+        for solution in ["s1", "s2"]:
+            for testcase in ["t1", "t2"]:
+                SolutionRunResult.objects.create(solution_run=run, solution=solution, testcase=testcase)
+        return run
+
+    def test_foreign_keys_are_read_once_per_commit(self):
+        results = list(SolutionRunResult.objects.select_related("solution_run__base_problem")
+                       .prefetch_related("testcase", "solution"))
+        self.assertEqual(self.reads, {
+            (Solution, "c1"): 1, (Solution, "c2"): 1, (TestCaseModel, "c1"): 1, (TestCaseModel, "c2"): 1,
+        })
+        for result in results:
+            self.assertEqual(result.testcase.pk, result.testcase_id)
+            self.assertEqual(result.solution.pk, result.solution_id)
+            self.assertEqual(result.testcase._transaction.commit_id, result.solution_run.commit_id)
+        self.assertEqual(sum(self.reads.values()), 4)
+
+    def test_many_to_many_fields_are_read_once_per_commit(self):
+        runs = list(SolutionRun.objects.select_related("base_problem").prefetch_related("testcases"))
+        self.assertEqual(self.reads, {(TestCaseModel, "c1"): 1, (TestCaseModel, "c2"): 1})
+        for run in runs:
+            self.assertEqual(sorted(testcase.pk for testcase in run.testcases.all()), ["t1", "t2"])
+        self.assertEqual(sum(self.reads.values()), 2)
+
+    def test_changing_many_to_many_fields_drops_prefetched_objects(self):
+        for change in [lambda manager: manager.add("t3"), lambda manager: manager.remove("t1"),
+                       lambda manager: manager.clear()]:
+            run = SolutionRun.objects.prefetch_related("testcases").get(pk=self.runs[0].pk)
+            self.assertIn("testcases", run._prefetched_objects_cache)
+            change(run.testcases)
+            self.assertNotIn("testcases", run._prefetched_objects_cache)
+            reads = sum(self.reads.values())
+            list(run.testcases.all())
+            self.assertEqual(sum(self.reads.values()), reads + 1)
@@ -0,0 +1,36 @@
+from django.test import TestCase
+from model_mommy import mommy
+
+from problems.models import Problem, ProblemRevision
+
+
+class RevisionAncestryTests(TestCase):
+
+    def setUp(self):
+        problem = mommy.make(Problem)
+        self.root = self.make_revision(problem)
+        self.left = self.make_revision(problem, self.root)
+        self.right = self.make_revision(problem, self.root)
+        self.left_child = self.make_revision(problem, self.left)
+        self.merged = self.make_revision(problem, self.left_child, self.right)
+
+    @staticmethod
+    def make_revision(problem, *parents):
+        revision = mommy.make(ProblemRevision, problem=problem)
+        revision.parent_revisions.add(*parents)
+        return revision
+
+    def test_merge_base(self):
+        self.assertEqual(self.left_child.find_merge_base(self.right), self.root)
+        self.assertEqual(self.merged.find_merge_base(self.right), self.right)
+        self.assertEqual(self.left.find_merge_base(self.left), self.left)
+
+    def test_merge_base_queries(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.left_child.find_merge_base(self.right), self.root)
+
+    def test_path_to_parent(self):
+        with self.assertNumQueries(2):
+            path = self.merged.path_to_parent(self.root)
+        self.assertEqual(path, [self.merged, self.left_child, self.right, self.left])
+        self.assertEqual(self.left.path_to_parent(None), [self.left, self.root])
@@ -0,0 +1,104 @@
+import json
+import shutil
+import tempfile
+
+import mock
+import pygit2
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase, override_settings
+
+from problems.utils import revision_difference
+from problems.utils.revision_difference import get_blob_difference, get_commit_difference, diff_text
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CommitDifferenceTests(SimpleTestCase):
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.repo = pygit2.init_repository(path, bare=True)
+        solutions = {"a.cpp": {"verdict": "correct"}, "b.cpp": {"verdict": "correct"}}
+        self.base_id = self.commit({
+            "solutions.json": json.dumps(solutions).encode("utf-8"),
+            "solution/a.cpp": b"int main() {}\n",
+            "solution/b.cpp": b"int main() {}\n",
+            "checker/checker.cpp": b"check\n",
+        })
+        solutions["b.cpp"]["verdict"] = "time_limit"
+        solutions["c.cpp"] = {"verdict": "correct"}
+        self.new_id = self.commit({
+            "solutions.json": json.dumps(solutions).encode("utf-8"),
+            "solution/a.cpp": b"int main() {}\n",
+            "solution/b.cpp": b"int main() { while (1); }\n",
+            "solution/c.cpp": b"int main() {}\n",
+            "checker/checker.cpp": b"check\n",
+        })
+
+    def commit(self, files):
+        index = pygit2.Index()
+        for path, content in files.items():
+            index.add(pygit2.IndexEntry(path, self.repo.create_blob(content), pygit2.GIT_FILEMODE_BLOB))
+        signature = pygit2.Signature("author", "author@example.com")
+        return str(self.repo.create_commit(None, signature, signature, "commit",
+                                           index.write_tree(self.repo), []))
+
+    def test_only_changed_objects(self):
+        titles = [title for title, _ in get_commit_difference(self.repo, self.base_id, self.new_id)]
+        self.assertEqual(sorted(titles), [
+            "Added solution - c.cpp",
+            "Added solution code - c.cpp",
+            "Changed solution - b.cpp",
+            "Changed solution code - b.cpp",
+        ])
+        self.assertEqual(get_commit_difference(self.repo, self.base_id, self.base_id), [])
+
+    def test_differences_are_lazy_and_cached(self):
+        with mock.patch.object(revision_difference, "diff_dict", wraps=revision_difference.diff_dict) as diff:
+            differences = dict(get_commit_difference(self.repo, self.base_id, self.new_id))
+            self.assertFalse(diff.called)
+            self.assertIn("while", dict(differences["Changed solution code - b.cpp"].items())["content"])
+            self.assertEqual(diff.call_count, 1)
+            differences = dict(get_commit_difference(self.repo, self.base_id, self.new_id))
+            for difference in differences.values():
+                difference.items()
+            self.assertEqual(diff.call_count, 4)
+
+    def test_blob_difference(self):
+        differences = dict(get_commit_difference(self.repo, self.base_id, self.new_id))
+        for title in ["Changed solution code - b.cpp", "Changed solution - b.cpp"]:
+            difference = get_blob_difference(self.repo, *differences[title].blob_ids)
+            self.assertEqual(dict(difference.items()), dict(differences[title].items()))
+        with self.assertRaises(KeyError):
+            get_blob_difference(self.repo, self.base_id, self.new_id).items()
+
+    def test_committed_differences_are_rendered_on_demand(self):
+        differences = get_commit_difference(self.repo, self.base_id, self.new_id)
+        for title, difference in differences:
+            difference.url = "/object_diff/{}/".format(title)
+        with mock.patch.object(revision_difference, "diff_dict") as diff:
+            html = render_to_string("problems/blocks/revision_diff.html", {"differences": differences})
+        self.assertFalse(diff.called)
+        self.assertIn('data-diff-url="/object_diff/Changed solution code - b.cpp/"', html)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   REVISION_DIFF_MAX_SIZE=1000)
+class DiffTextTests(SimpleTestCase):
+
+    def test_lines(self):
+        html = diff_text("a\nbcd\ne\n", "a\nbce\ne\n")
+        self.assertIn("<del style=\"background:#ffe6e6;\">bcd&para;<br></del>", html)
+        self.assertIn("<ins style=\"background:#e6ffe6;\">bce&para;<br></ins>", html)
+
+    def test_single_line(self):
+        self.assertIn("<ins style=\"background:#e6ffe6;\">e</ins>", diff_text("bcd", "bcde"))
+
+    def test_large_texts_are_summarized(self):
+        self.assertIn("Too large", diff_text("a\n" * 1000, "b\n" * 1000))
+
+    def test_memoized(self):
+        diff_text("a\nb\n", "a\nc\n")
+        with mock.patch.object(revision_difference, "diff_match_patch") as diff_match_patch:
+            diff_text("a\nb\n", "a\nc\n")
+            self.assertFalse(diff_match_patch.called)
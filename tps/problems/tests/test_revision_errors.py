@@ -0,0 +1,37 @@
+import mock
+from django.test import TestCase, override_settings
+from model_mommy import mommy
+
+from problems.models import Discussion, Problem
+from problems.utils import revision_errors
+from problems.utils.revision_errors import get_revision_errors
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RevisionErrorsTests(TestCase):
+
+    def setUp(self):
+        self.problem = mommy.make(Problem)
+        self.revision = mock.Mock(commit_id="a" * 40, **{"_transaction.has_changes": False})
+        patcher = mock.patch.object(revision_errors, "_count_commit_errors", return_value={"testcase": 3})
+        self.count_commit_errors = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_commit_errors_are_counted_once(self):
+        self.assertEqual(get_revision_errors(self.problem, self.revision)["testcase"], 3)
+        self.assertEqual(get_revision_errors(self.problem, self.revision)["testcase"], 3)
+        self.assertEqual(self.count_commit_errors.call_count, 1)
+
+    def test_uncommitted_changes_are_not_cached(self):
+        self.revision._transaction.has_changes = True
+        get_revision_errors(self.problem, self.revision)
+        get_revision_errors(self.problem, self.revision)
+        self.assertEqual(self.count_commit_errors.call_count, 2)
+
+    def test_discussions_invalidate_problem_errors(self):
+        self.assertEqual(get_revision_errors(self.problem, self.revision)["discussion"], 0)
+        discussion = mommy.make(Discussion, problem=self.problem)
+        self.assertEqual(get_revision_errors(self.problem, self.revision)["discussion"], 1)
+        discussion.closed = True
+        discussion.save()
+        self.assertEqual(get_revision_errors(self.problem, self.revision)["discussion"], 0)
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from model_mommy import mommy
+
+import mock
+
+from problems.models import Problem, ProblemRevision, SolutionSubtaskExpectedVerdict
+from problems.models.enums import SolutionVerdict
+
+
+class RevisionMergeTests(TestCase):
+    """
+    The objects of the revisions are replaced by expected verdicts, keyed by a single matching key.
+    """
+
+    def setUp(self):
+        self.problem = mommy.make(Problem)
+        self.base = self.make_revision()
+        self.ours = self.make_revision(self.base, revision_id="ours")
+        self.theirs = self.make_revision(self.base, revision_id="theirs")
+        self.objects = {}
+        patchers = [
+            mock.patch.object(ProblemRevision, "_get_matching_objects", autospec=True,
+                              side_effect=lambda revision: self.objects[revision]),
+            mock.patch.object(ProblemRevision, "_clone", autospec=True, side_effect=self.clone),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_revision(self, *parents, **kwargs):
+        revision = mommy.make(ProblemRevision, problem=self.problem, **kwargs)
+        revision.parent_revisions.add(*parents)
+        return revision
+
+    def set_verdicts(self, base, ours, theirs):
+        for revision, verdict in [(self.base, base), (self.ours, ours), (self.theirs, theirs)]:
+            self.objects[revision] = {("verdict", ): mommy.make(SolutionSubtaskExpectedVerdict, verdict=verdict)}
+
+    def clone(self, revision, cloned_instances=None, replace_objects=None):
+        cloned_instances = dict(cloned_instances or {})
+        if revision not in cloned_instances:
+            cloned_instances[revision] = self.make_revision()
+        for obj in self.objects[revision].values():
+            if obj not in cloned_instances:
+                cloned_instances[obj] = mommy.make(SolutionSubtaskExpectedVerdict, verdict=obj.verdict)
+        return cloned_instances
+
+    def merged_verdicts(self, known_verdicts):
+        return sorted(verdict.verdict.name for verdict in
+                      SolutionSubtaskExpectedVerdict.objects.exclude(pk__in=[obj.pk for obj in known_verdicts]))
+
+    def test_merge_without_conflict(self):
+        self.set_verdicts(SolutionVerdict.correct, SolutionVerdict.incorrect, SolutionVerdict.correct)
+        known_verdicts = list(SolutionSubtaskExpectedVerdict.objects.all())
+        merged = self.ours.merge(self.theirs)
+        self.assertFalse(merged.merge_result.conflicts.exists())
+        self.assertEqual(set(merged.parent_revisions.all()), {self.ours, self.theirs})
+        self.assertEqual(merged.merge_result.base_revision, self.base)
+        # Their unchanged verdict is replaced by ours instead of being cloned
+        self.assertEqual(self.merged_verdicts(known_verdicts), ["incorrect"])
+
+    def test_merge_with_conflict(self):
+        self.set_verdicts(SolutionVerdict.correct, SolutionVerdict.incorrect, SolutionVerdict.time_limit)
+        ours, theirs = self.objects[self.ours][("verdict", )], self.objects[self.theirs][("verdict", )]
+        merged = self.ours.merge(self.theirs)
+        conflict, = merged.merge_result.conflicts.all()
+        self.assertEqual((conflict.ours_id, conflict.theirs_id), (ours.pk, theirs.pk))
+        self.assertFalse(conflict.resolved)
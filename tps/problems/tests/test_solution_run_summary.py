@@ -0,0 +1,123 @@
+import json
+
+import mock
+from django.test import SimpleTestCase
+
+from problems.models import SolutionRun
+from problems.models.solution_run import _aggregate_solution_summary
+
+
+def make_cell(verdict="AC", score=1, time=None, memory=None, valid=True, strict_valid=True, subtasks=None):
+    return {
+        "id": 1,
+        "judging": verdict is None,
+        "verdict": verdict,
+        "score": score,
+        "execution_time": time,
+        "max_time": time,
+        "memory": memory,
+        "timing_error": None,
+        "valid": valid,
+        "strict_valid": strict_valid,
+        "failed_subtasks": [],
+        "subtasks": subtasks or {},
+    }
+
+
+def make_summary(cells):
+    return {
+        "testcases": [["1", "test1"], ["2", "test2"]],
+        "solutions": [["10", "sol"]],
+        "subtasks": [["5", "subtask"]],
+        "testcase_subtasks": {"1": ["5"], "2": ["5"]},
+        "subtask_testcases": {"5": ["1", "2"]},
+        "cells": cells,
+        "aggregates": {},
+    }
+
+
+class SolutionRunSummaryTests(SimpleTestCase):
+
+    def test_aggregates(self):
+        summary = make_summary({
+            "1": {"10": make_cell(time=0.5, memory=12, subtasks={"5": [True, True]})},
+            "2": {"10": make_cell("WA", 0, time=1.5, memory=8, subtasks={"5": [True, True]})},
+        })
+        _aggregate_solution_summary(summary, "10")
+        aggregate = summary["aggregates"]["10"]
+        self.assertEqual(aggregate["max_time"], 1.5)
+        self.assertEqual(aggregate["max_memory"], 12)
+        self.assertTrue(aggregate["valid"])
+        self.assertEqual(aggregate["subtasks"]["5"]["verdicts"], [("AC", 1), ("WA", 1)])
+        self.assertEqual(aggregate["subtasks"]["5"]["min_score"], 0)
+        self.assertTrue(aggregate["subtasks"]["5"]["valid"])
+
+    def test_invalid_result(self):
+        summary = make_summary({
+            "1": {"10": make_cell(subtasks={"5": [True, True]})},
+            "2": {"10": make_cell("TLE", None, valid=False, strict_valid=False, subtasks={"5": [False, False]})},
+        })
+        _aggregate_solution_summary(summary, "10")
+        aggregate = summary["aggregates"]["10"]
+        self.assertFalse(aggregate["valid"])
+        self.assertFalse(aggregate["subtasks"]["5"]["valid"])
+        self.assertEqual(aggregate["max_time"], 0)
+
+    def test_missing_results(self):
+        summary = make_summary({"1": {"10": make_cell(subtasks={"5": [True, True]})}})
+        _aggregate_solution_summary(summary, "10")
+        self.assertEqual(summary["aggregates"]["10"]["subtasks"]["5"]["verdicts"], [("AC", 1)])
+
+    def test_progress(self):
+        self.assertEqual(SolutionRun(done_results=3, total_results=4).get_progress(), (3, 4, 75))
+        self.assertEqual(SolutionRun(done_results=0, total_results=0).get_progress(), (0, 0, 100))
+
+
+class RecordResultTests(SimpleTestCase):
+
+    def setUp(self):
+        summary = json.dumps(make_summary({"1": {}, "2": {}}))
+        self.solution_run = SolutionRun(pk=7, summary=summary, total_results=2)
+        self.locked = SolutionRun(pk=7, summary=summary, total_results=2)
+        self.events = []
+        revision = mock.Mock()
+        revision.subtasks.all.side_effect = lambda: self.events.append("subtasks") or []
+        patchers = [
+            mock.patch.object(SolutionRun, "problem", new_callable=mock.PropertyMock, return_value=revision),
+            mock.patch.object(SolutionRun, "objects"),
+            mock.patch("problems.models.solution_run.transaction"),
+            mock.patch.object(SolutionRun, "_save_summary", autospec=True, side_effect=SolutionRun._save_summary),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        SolutionRun.objects.filter.return_value.values_list.return_value.get.return_value = summary
+        SolutionRun.objects.select_for_update.side_effect = \
+            lambda: self.events.append("lock") or mock.Mock(**{"get.return_value": self.locked})
+        self.save_summary = SolutionRun._save_summary
+
+    def make_result(self, testcase_id, verdict="AC"):
+        result = mock.Mock(testcase_id=testcase_id, solution_id=10)
+        result.get_summary_cell.side_effect = \
+            lambda subtasks: self.events.append("cell") or make_cell(verdict, subtasks={"5": [True, True]})
+        return result
+
+    def test_repository_is_read_before_locking(self):
+        result = self.make_result(1)
+        self.solution_run.record_result(result)
+        self.assertEqual(self.events, ["cell", "lock"])
+        self.assertEqual([subtask.pk for subtask in result.get_summary_cell.call_args[0][0]], ["5"])
+        self.assertEqual(json.loads(self.locked.summary)["cells"]["1"]["10"]["verdict"], "AC")
+        self.assertEqual(self.solution_run.done_results, 1)
+
+    def test_batch_is_recorded_once(self):
+        self.solution_run.record_results([self.make_result(1), self.make_result(2, "WA")])
+        self.assertEqual(self.events, ["cell", "cell", "lock"])
+        self.assertEqual(self.save_summary.call_count, 1)
+        summary = json.loads(self.locked.summary)
+        self.assertEqual(summary["aggregates"]["10"]["subtasks"]["5"]["verdicts"], [["AC", 1], ["WA", 1]])
+        self.assertEqual(self.solution_run.done_results, 2)
+
+    def test_empty_batch(self):
+        self.solution_run.record_results([])
+        self.assertEqual(self.events, [])
@@ -32,6 +32,8 @@ problem_urls = ([
 
         url(r'^history/$', HistoryView.as_view(), name="history"),
         url(r'^diff/(?P<other_slug>\w{1,40})/$', DiffView.as_view(), name="diff"),
+        url(r'^object_diff/(?P<old_id>[0-9a-f]{40})/(?P<new_id>[0-9a-f]{40})/$', ObjectDiffView.as_view(),
+            name="object_diff"),
 
         url(r'^$', Overview.as_view(), name="overview"),
 
@@ -44,6 +46,8 @@ problem_urls = ([
         url(r'^invocation/(?P<invocation_id>\d+)/run/$', InvocationRunView.as_view(), name="run_invocation"),
         url(r'^invocation/(?P<invocation_id>\d+)/clone/$', InvocationCloneView.as_view(), name="clone_invocation"),
         url(r'^invocation/(?P<invocation_id>\d+)/view/$', InvocationDetailsView.as_view(), name="view_invocation"),
+        url(r'^invocation/(?P<invocation_id>\d+)/progress/$', InvocationProgressView.as_view(), name="invocation_progress"),
+        url(r'^invocation/(?P<invocation_id>\d+)/events/$', InvocationEventsView.as_view(), name="invocation_events"),
         url(r'^invocation/(?P<invocation_id>\d+)/invocation_result/(?P<result_id>\d+)/view/$', InvocationResultView.as_view(), name="view_invocation_result"),
         url(r'^invocation/(?P<invocation_id>\d+)/invocation_result/(?P<result_id>\d+)/view/download/output/$', InvocationOutputDownloadView.as_view(), name="download_output"),
         url(r'^invocation/(?P<invocation_id>\d+)/invocation_result/(?P<result_id>\d+)/view/download/input/$', InvocationInputDownloadView.as_view(), name="download_input"),
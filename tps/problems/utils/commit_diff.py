@@ -0,0 +1,127 @@
+import logging
+import subprocess
+
+import pygit2
+from django.conf import settings
+from django.core.cache import cache
+
+from problems.models.generation_cache import get_cache_key
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["get_diff_files", "get_file_patches"]
+
+DIFF_FILES_PER_PAGE = 20
+
+NULL_OID = "0" * 40
+
+
+def _get_cache_timeout():
+    return getattr(settings, "DIFF_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def _get_max_file_size():
+    """
+    Files larger than this (in bytes) on either side of a diff are only summarized.
+    """
+    return getattr(settings, "DIFF_MAX_FILE_SIZE", 1024 * 1024)
+
+
+def _get_blob_sizes(repo, oids):
+    """
+    Returns the sizes of the given blobs, reading only the object headers.
+    """
+    oids = sorted(set(oids))
+    sizes = {}
+    if not oids:
+        return sizes
+    try:
+        output = subprocess.run(
+            ["git", "--git-dir", repo.path, "cat-file", "--batch-check"],
+            input="\n".join(oids).encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning("Couldn't read blob sizes from {}: {}".format(repo.path, e))
+    else:
+        for line in output.decode("utf-8").splitlines():
+            parts = line.split()
+            if len(parts) == 3:
+                sizes[parts[0]] = int(parts[2])
+    for oid in oids:
+        if oid not in sizes:
+            sizes[oid] = repo[oid].size
+    return sizes
+
+
+def get_diff_files(repo, theirs_id, ours_id):
+    """
+    Returns the files changed between the two commits (path, status and the sizes of both sides).
+    Only the trees are compared; no file contents are read. The list is cached by the commit ids.
+    """
+    key = "diff_files_{}_{}_{}".format(get_cache_key(repo.path), theirs_id, ours_id)
+    files = cache.get(key)
+    if files is not None:
+        return files
+
+    diff = repo.diff(a=theirs_id, b=ours_id, flags=pygit2.GIT_DIFF_SKIP_BINARY_CHECK)
+    deltas = list(diff.deltas)
+    blob_ids = []
+    for delta in deltas:
+        blob_ids.extend(str(diff_file.id) for diff_file in (delta.old_file, delta.new_file)
+                        if str(diff_file.id) != NULL_OID)
+    sizes = _get_blob_sizes(repo, blob_ids)
+
+    max_file_size = _get_max_file_size()
+    files = []
+    for delta in deltas:
+        old_size = sizes.get(str(delta.old_file.id), 0)
+        new_size = sizes.get(str(delta.new_file.id), 0)
+        files.append({
+            "path": delta.new_file.path,
+            "old_path": delta.old_file.path,
+            "status": delta.status_char(),
+            "old_size": old_size,
+            "new_size": new_size,
+            "too_large": max(old_size, new_size) > max_file_size,
+        })
+    cache.set(key, files, timeout=_get_cache_timeout())
+    return files
+
+
+def _get_patch_key(repo, theirs_id, ours_id, path):
+    return "diff_patch_{}_{}_{}_{}".format(get_cache_key(repo.path), theirs_id, ours_id, get_cache_key(path))
+
+
+def get_file_patches(repo, theirs_id, ours_id, files):
+    """
+    Returns the patches of the given files (as returned by get_diff_files), each with its
+    text, whether it is binary and the numbers of added and deleted lines. Files that are
+    too large are never read and get None. Patches are cached by the commit ids and the path.
+    """
+    keys = {
+        file["path"]: _get_patch_key(repo, theirs_id, ours_id, file["path"])
+        for file in files if not file["too_large"]
+    }
+    patches = cache.get_many(list(keys.values()))
+    missing = set(path for path, key in keys.items() if key not in patches)
+
+    if missing:
+        diff = repo.diff(a=theirs_id, b=ours_id)
+        for index, delta in enumerate(diff.deltas):
+            if delta.new_file.path not in missing:
+                continue
+            git_patch = diff[index]
+            _, additions, deletions = git_patch.line_stats
+            patch = {
+                "binary": git_patch.delta.is_binary,
+                "additions": additions,
+                "deletions": deletions,
+                "text": git_patch.data.decode("utf-8", "replace"),
+            }
+            patches[keys[delta.new_file.path]] = patch
+            cache.set(keys[delta.new_file.path], patch, timeout=_get_cache_timeout())
+
+    return [patches.get(keys.get(file["path"])) for file in files]
@@ -0,0 +1,87 @@
+import pygit2
+from django.conf import settings
+from django.core.cache import cache
+
+from problems.models.generation_cache import get_cache_key
+
+__all__ = ["get_commit_info", "get_commit_stats", "get_history_page"]
+
+HISTORY_PAGE_SIZE = 20
+
+
+def _get_cache_timeout():
+    return getattr(settings, "COMMIT_METADATA_CACHE_TIMEOUT", 7 * 24 * 60 * 60)
+
+
+def _get_commit_key(repo, commit_id, kind):
+    return "git_{}_{}_{}".format(kind, get_cache_key(repo.path), commit_id)
+
+
+def get_commit_info(repo, commit):
+    """
+    Returns the metadata of the commit (id, author, time, message and parents).
+    Commits never change, so the metadata is cached by the id of the commit.
+    """
+    key = _get_commit_key(repo, commit.id, "commit")
+    info = cache.get(key)
+    if info is None:
+        info = {
+            "id": str(commit.id),
+            "author_name": commit.author.name,
+            "author_email": commit.author.email,
+            "time": commit.commit_time,
+            "message": commit.message,
+            "parents": [str(parent_id) for parent_id in commit.parent_ids],
+        }
+        cache.set(key, info, timeout=_get_cache_timeout())
+    return info
+
+
+def get_commit_stats(repo, info):
+    """
+    Returns the number of changed files, insertions and deletions of the commit
+    with respect to its first parent, given the metadata of the commit.
+    """
+    key = _get_commit_key(repo, info["id"], "commit_stats")
+    stats = cache.get(key)
+    if stats is None:
+        if info["parents"]:
+            diff = repo.diff(a=info["parents"][0], b=info["id"])
+        else:
+            diff = repo[info["id"]].tree.diff_to_tree(swap=True)
+        diff_stats = diff.stats
+        stats = {
+            "files_changed": diff_stats.files_changed,
+            "insertions": diff_stats.insertions,
+            "deletions": diff_stats.deletions,
+        }
+        cache.set(key, stats, timeout=_get_cache_timeout())
+    return stats
+
+
+def get_history_page(transaction, start=None, page_size=HISTORY_PAGE_SIZE):
+    """
+    Returns the metadata of a page of the history of the transaction, newest first,
+    and the id of the first commit of the next page (None on the last page).
+    start: the id of the first commit of the page, None for the first page
+    The walk starts at the first commit of the page, so only the commits of the page are read.
+    Raises KeyError if start is not a commit in the history of the transaction.
+    """
+    walker = transaction.walk(reverse=True)
+    if start is not None:
+        head = transaction.parents[0]
+        try:
+            start_id = pygit2.Oid(hex=start)
+            found = start_id == head or transaction.repo.descendant_of(head, start_id)
+        except (ValueError, KeyError, pygit2.GitError):
+            found = False
+        if not found:
+            raise KeyError(start)
+        walker.reset()
+        walker.push(start_id)
+    commits = []
+    for commit in walker:
+        if len(commits) == page_size:
+            return commits, str(commit.id)
+        commits.append(get_commit_info(transaction.repo, commit))
+    return commits, None
@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments sent to idle event streams
+KEEP_ALIVE_INTERVAL = 15
+# Seconds after which a stream is closed, the browser then reconnects to a fresh one
+MAX_STREAM_DURATION = 30 * 60
+# Seconds without any finished result after which the watchers are told to stop
+STALL_TIMEOUT = 10 * 60
+
+
+def get_channel_name(solution_run_pk):
+    return "solution_run_{}_events".format(solution_run_pk)
+
+
+def format_event(event, data):
+    return "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
+
+def publish_result(solution_run, testcase_pk, solution_pk, cell):
+    """
+    Publishes a finished result of the solution run to the pages watching it.
+    """
+    summary = json.loads(solution_run.summary)
+    done_results, total_results, done_percent = solution_run.get_progress()
+    try:
+        get_redis_connection("default").publish(get_channel_name(solution_run.pk), json.dumps({
+            "testcase": str(testcase_pk),
+            "solution": str(solution_pk),
+            "cell": cell,
+            "aggregate": summary["aggregates"].get(str(solution_pk)),
+            "done": done_results,
+            "total": total_results,
+            "percent": done_percent,
+        }))
+    except Exception as e:
+        # Watchers only miss a live update, the summary itself is stored
+        logger.warning("Couldn't publish the result of solution run {}: {}".format(solution_run.pk, e))
+
+
+def _get_progress(solution_run):
+    done_results, total_results, done_percent = solution_run.get_progress()
+    return {"done": done_results, "total": total_results, "percent": done_percent}
+
+
+def stream_results(solution_run):
+    """
+    Yields server-sent events for the results of the solution run as they finish,
+    until all of them are done, the run stops progressing (a "stalled" event is sent)
+    or the stream gets older than MAX_STREAM_DURATION.
+    The progress is re-read from the database whenever the stream is idle,
+    so results whose messages were missed are still noticed.
+    """
+    pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(get_channel_name(solution_run.pk))
+    try:
+        # Results finished before subscribing are only reflected by the progress
+        solution_run.refresh_from_db(fields=["done_results", "total_results"])
+        done_results, total_results = solution_run.done_results, solution_run.total_results
+        yield format_event("progress", _get_progress(solution_run))
+        deadline = time.monotonic() + MAX_STREAM_DURATION
+        last_progress = time.monotonic()
+        while done_results < total_results:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now - last_progress >= STALL_TIMEOUT:
+                yield format_event("stalled", _get_progress(solution_run))
+                break
+            message = pubsub.get_message(timeout=min(KEEP_ALIVE_INTERVAL, deadline - now))
+            if message is None:
+                solution_run.refresh_from_db(fields=["done_results", "total_results"])
+                if (solution_run.done_results, solution_run.total_results) == (done_results, total_results):
+                    yield ": keep-alive\n\n"
+                else:
+                    done_results, total_results = solution_run.done_results, solution_run.total_results
+                    last_progress = time.monotonic()
+                    yield format_event("progress", _get_progress(solution_run))
+                continue
+            data = json.loads(message["data"].decode("utf-8"))
+            done_results, total_results = data["done"], data["total"]
+            solution_run.done_results, solution_run.total_results = done_results, total_results
+            last_progress = time.monotonic()
+            yield format_event("result", data)
+    finally:
+        pubsub.close()
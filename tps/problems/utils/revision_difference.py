@@ -0,0 +1,229 @@
+import hashlib
+import json
+
+import pygit2
+from django.conf import settings
+from django.core.cache import cache
+
+from problems.models.generation_cache import get_cache_key
+from problems.utils.diff_match_patch import diff_match_patch
+
+__all__ = ["diff_text", "diff_dict", "ObjectDifference", "get_blob_difference", "get_commit_difference"]
+
+NULL_OID = "0" * 40
+
+# Files holding one json object per revision object, keyed by primary key
+JSON_DB_LABELS = {
+    "solutions.json": "solution",
+    "subtasks.json": "subtask",
+}
+
+# Directories holding one file per revision object
+DIRECTORY_LABELS = {
+    "solution": "solution code",
+    "validator": "validator",
+    "checker": "checker",
+    "gen": "input generator",
+    "grader": "grader",
+    "resources": "resource",
+    "statement": "statement",
+}
+
+OPERATIONS = {
+    "A": "Added",
+    "D": "Deleted",
+}
+
+
+def _get_cache_timeout():
+    return getattr(settings, "DIFF_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def _get_max_diff_size():
+    """
+    Texts longer than this (in characters) on either side of a diff are only summarized.
+    """
+    return getattr(settings, "REVISION_DIFF_MAX_SIZE", 256 * 1024)
+
+
+def _get_text_hash(text):
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _compute_text_diff(diff_lib, text1, text2):
+    if "\n" not in text1 and "\n" not in text2:
+        return diff_lib.diff_main(text1, text2)
+    chars1, chars2, lines = diff_lib.diff_linesToChars(text1, text2)
+    diffs = diff_lib.diff_main(chars1, chars2, checklines=False)
+    diff_lib.diff_charsToLines(diffs, lines)
+    return diffs
+
+
+def diff_text(text1, text2):
+    """
+    Returns the html diff of two texts.
+    Multiline texts are compared line by line and texts larger than REVISION_DIFF_MAX_SIZE
+    are only summarized. The result is cached by the hashes of both texts.
+    """
+    key = "text_diff_{}_{}".format(_get_text_hash(text1), _get_text_hash(text2))
+    html = cache.get(key)
+    if html is None:
+        if max(len(text1), len(text2)) > _get_max_diff_size():
+            if text1 == text2:
+                html = "<span>Not changed ({} characters)</span>".format(len(text1))
+            else:
+                html = "<span>Too large to show ({} characters to {} characters)</span>".format(
+                    len(text1), len(text2))
+        else:
+            diff_lib = diff_match_patch()
+            html = diff_lib.diff_prettyHtml(_compute_text_diff(diff_lib, text1, text2))
+        cache.set(key, html, timeout=_get_cache_timeout())
+    return html
+
+
+def diff_dict(dict1, dict2):
+    keys = set(dict1.keys()).union(set(dict2.keys()))
+    result = {}
+    for key in keys:
+        result[key] = diff_text(dict1.get(key, ""), dict2.get(key, ""))
+    return result
+
+
+class ObjectDifference(object):
+    """
+    The html diff of the fields of an object, computed on first access.
+    get_values: a callable returning the base and the new values of the object as dicts
+    cache_key: if given, the diff is cached under this key, so it must identify the
+    contents of both versions (e.g. by their blob ids)
+    blob_ids: for committed objects, the base and the new blob ids along with the primary key
+    of the object within json databases (see get_blob_difference)
+    """
+
+    def __init__(self, get_values, cache_key=None, blob_ids=None):
+        self._get_values = get_values
+        self._cache_key = cache_key
+        self.blob_ids = blob_ids
+        self._diff = None
+
+    def get_diff(self):
+        if self._diff is None:
+            diff = cache.get(self._cache_key) if self._cache_key is not None else None
+            if diff is None:
+                base_dict, new_dict = self._get_values()
+                diff = diff_dict(base_dict, new_dict)
+                if self._cache_key is not None:
+                    cache.set(self._cache_key, diff, timeout=_get_cache_timeout())
+            self._diff = diff
+        return self._diff
+
+    def items(self):
+        return self.get_diff().items()
+
+
+def _read_blob(repo, oid):
+    if oid == NULL_OID:
+        return b""
+    blob = repo[oid]
+    if not isinstance(blob, pygit2.Blob):
+        raise KeyError(oid)
+    return blob.data
+
+
+def _get_file_values(repo, old_id, new_id):
+    return (
+        {"content": _read_blob(repo, old_id).decode("utf-8", "replace")},
+        {"content": _read_blob(repo, new_id).decode("utf-8", "replace")},
+    )
+
+
+def _load_json_db(repo, oid):
+    try:
+        return json.loads(_read_blob(repo, oid).decode("utf-8") or "{}")
+    except (ValueError, UnicodeError):
+        return {}
+
+
+def _get_entry_values(base_entry, new_entry):
+    def as_strings(entry):
+        return {key: str(value) for key, value in (entry or {}).items()}
+    return as_strings(base_entry), as_strings(new_entry)
+
+
+def _get_key(repo, *parts):
+    return "revision_diff_{}_{}".format(get_cache_key(repo.path), get_cache_key("_".join(parts)))
+
+
+def _get_json_db_differences(repo, path, old_id, new_id):
+    label = JSON_DB_LABELS[path]
+    base_entries = _load_json_db(repo, old_id)
+    new_entries = _load_json_db(repo, new_id)
+    result = []
+    for pk in sorted(set(base_entries).union(new_entries)):
+        base_entry = base_entries.get(pk)
+        new_entry = new_entries.get(pk)
+        if base_entry == new_entry:
+            continue
+        if base_entry is None:
+            operation = "Added"
+        elif new_entry is None:
+            operation = "Deleted"
+        else:
+            operation = "Changed"
+        result.append((
+            "{} {} - {}".format(operation, label, pk),
+            ObjectDifference(
+                lambda base_entry=base_entry, new_entry=new_entry: _get_entry_values(base_entry, new_entry),
+                cache_key=_get_key(repo, old_id, new_id, pk),
+                blob_ids=(old_id, new_id, pk),
+            )
+        ))
+    return result
+
+
+def get_blob_difference(repo, old_id, new_id, entry=None):
+    """
+    Returns the ObjectDifference of two blobs, or of the objects with primary key `entry`
+    if the blobs are json databases. Nothing is read until the difference is accessed.
+    Raises KeyError or ValueError when accessed if a blob id is invalid.
+    """
+    if entry is None:
+        return ObjectDifference(
+            lambda: _get_file_values(repo, old_id, new_id),
+            cache_key=_get_key(repo, old_id, new_id),
+            blob_ids=(old_id, new_id, None),
+        )
+    return ObjectDifference(
+        lambda: _get_entry_values(_load_json_db(repo, old_id).get(entry), _load_json_db(repo, new_id).get(entry)),
+        cache_key=_get_key(repo, old_id, new_id, entry),
+        blob_ids=(old_id, new_id, entry),
+    )
+
+
+def get_commit_difference(repo, base_id, new_id):
+    """
+    Returns the changed objects between two commits as (title, difference) pairs,
+    where difference is an ObjectDifference.
+    Only the trees of the commits are compared, so objects whose blobs are the same
+    on both sides are never read. The contents of the changed objects are only read
+    when their difference is accessed.
+    """
+    if base_id == new_id:
+        return []
+    diff = repo.diff(a=base_id, b=new_id, flags=pygit2.GIT_DIFF_SKIP_BINARY_CHECK)
+    result = []
+    for delta in diff.deltas:
+        path = delta.new_file.path
+        old_blob_id = str(delta.old_file.id)
+        new_blob_id = str(delta.new_file.id)
+        if path in JSON_DB_LABELS:
+            result.extend(_get_json_db_differences(repo, path, old_blob_id, new_blob_id))
+            continue
+        directory, _, name = path.partition("/")
+        label = DIRECTORY_LABELS.get(directory) if name else None
+        if label is None:
+            label, name = "file", path
+        result.append((
+            "{} {} - {}".format(OPERATIONS.get(delta.status_char(), "Changed"), label, name),
+            get_blob_difference(repo, old_blob_id, new_blob_id),
+        ))
+    return result
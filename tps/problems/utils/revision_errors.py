@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from problems.models import MergeRequest
+from problems.models.enums import SolutionVerdict
+
+__all__ = ["get_revision_errors", "invalidate_problem_errors"]
+
+
+def _get_commit_errors_key(problem, revision):
+    return "problem_{}_commit_{}_errors".format(problem.pk, revision.commit_id)
+
+
+def _get_problem_errors_key(problem_id):
+    return "problem_{}_errors".format(problem_id)
+
+
+def _get_cache_timeout():
+    return getattr(settings, "REVISION_ERRORS_CACHE_TIMEOUT", 24 * 60 * 60)
+
+
+def _count_commit_errors(revision):
+    errors = {}
+    errors["testcase"] = revision.testcase_set.all().count()
+    if revision.solution_set.filter(verdict=SolutionVerdict.model_solution).exists():
+        errors["solution"] = 0
+    else:
+        errors["solution"] = 1
+    if revision.problem_data.checker is None:
+        errors["checker"] = 1
+    else:
+        errors["checker"] = 0
+    if not revision.validator_set.all().exists():
+        errors["validator"] = 1
+    else:
+        errors["validator"] = 0
+    return errors
+
+
+def _count_problem_errors(problem):
+    return {
+        "discussion": problem.discussions.filter(closed=False).count(),
+        "merge_requests": problem.merge_requests.filter(status=MergeRequest.OPEN).count(),
+    }
+
+
+def get_revision_errors(problem, revision):
+    """
+    Returns the error counters shown in the sidebar of the revision.
+    The counters of a commit never change, so they are cached by its id. Revisions
+    with uncommitted changes are counted without being cached. The counters of the
+    problem (open discussions and merge requests) are cached until they change.
+    """
+    if revision._transaction.has_changes:
+        errors = _count_commit_errors(revision)
+    else:
+        key = _get_commit_errors_key(problem, revision)
+        errors = cache.get(key)
+        if errors is None:
+            errors = _count_commit_errors(revision)
+            cache.set(key, errors, timeout=_get_cache_timeout())
+
+    key = _get_problem_errors_key(problem.pk)
+    problem_errors = cache.get(key)
+    if problem_errors is None:
+        problem_errors = _count_problem_errors(problem)
+        cache.set(key, problem_errors, timeout=_get_cache_timeout())
+
+    errors = dict(errors)
+    errors.update(problem_errors)
+    return errors
+
+
+def invalidate_problem_errors(problem_id):
+    cache.delete(_get_problem_errors_key(problem_id))
@@ -1,12 +1,9 @@
 import logging
 
 from django.conf import settings
-from django.core.urlresolvers import reverse
-from django.db.models import Q
 
-from problems.models import MergeRequest
-from problems.models.enums import SolutionVerdict
-from .utils import extract_revision_data
+from problems.utils.revision_errors import get_revision_errors
+from .utils import get_revision_data
 
 logger = logging.getLogger(__name__)
 
@@ -15,35 +12,13 @@ def revision_data(request):
         return {}
     problem_code = request.resolver_match.kwargs["problem_code"]
     revision_slug = request.resolver_match.kwargs["revision_slug"]
-    problem, branch, revision = extract_revision_data(problem_code, revision_slug, request.user)
+    problem, branch, revision = get_revision_data(request, problem_code, revision_slug)
     revision_editable = False
 
-    errors = {}
     try:
-        errors["testcase"] = revision.testcase_set.all().count()
-        if revision.solution_set.filter(verdict=SolutionVerdict.model_solution).exists():
-            errors["solution"] = 0
-        else:
-            errors["solution"] = 1
-        """
-        invocations = revision.solutionrun_set.all()
-        failed_invocations = 0
-        for invocation in invocations:
-            if not invocation.validate():
-                failed_invocations += 1
-        errors["invocation"] = failed_invocations
-        """
-        if revision.problem_data.checker is None:
-            errors["checker"] = 1
-        else:
-            errors["checker"] = 0
-        if not revision.validator_set.all().exists():
-            errors["validator"] = 1
-        else:
-            errors["validator"] = 0
-        errors["discussion"] = problem.discussions.filter(closed=False).count()
-        errors["merge_requests"] = problem.merge_requests.filter(status=MergeRequest.OPEN).count()
+        errors = get_revision_errors(problem, revision)
     except Exception as e:
+        errors = {}
         logger.error(e, exc_info=e)
     branches = problem.branches.all()
     return {
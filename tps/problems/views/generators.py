@@ -11,6 +11,8 @@ from problems.forms.generator import GeneratorAddForm, GeneratorEditForm
 from problems.models import InputGenerator
 from problems.views.generics import ProblemObjectDeleteView, ProblemObjectAddView, RevisionObjectView, \
     ProblemObjectShowSourceView, ProblemObjectEditView
+from problems.views.utils import get_git_object_or_404
+from pygit2 import Signature
 
 
 __all__ = ["GeneratorsListView", "GeneratorEditView", "GeneratorAddView",
@@ -80,10 +82,18 @@ class GeneratorShowSourceView(ProblemObjectShowSourceView):
 
 class GeneratorEnableView(RevisionObjectView):
     def post(self, request, *args, **kwargs):
-        generator = get_object_or_404(InputGenerator, pk=kwargs['generator_id'])
+        generator = get_git_object_or_404(InputGenerator, pk=kwargs['generator_id'], problem=self.revision)
 
         try:
             generator.enable()
+            # The testcases are queued for generation once they are committed
+            generator._transaction.commit(
+                message="Enabled generator {}".format(generator.name),
+                author_signature=Signature(
+                    request.user.get_full_name(),
+                    request.user.email
+                )
+            )
         except ValidationError as e:
             messages.error(request, "\n".join(e.messages))
         except Exception as e:
@@ -14,7 +14,7 @@ from django.utils.decorators import classonlymethod
 from django.views.generic import View
 
 from file_repository.models import FileModel
-from problems.views.utils import extract_revision_data, get_git_object_or_404
+from problems.views.utils import get_revision_data, get_git_object_or_404
 from problems.models import SourceFile, NewProblemBranch
 from django.utils.translation import ugettext as _
 
@@ -56,7 +56,7 @@ class ProblemObjectView(View):
             self.revision_slug = revision_slug
 
             self.problem, self.branch, self.revision = \
-                extract_revision_data(problem_code, revision_slug, request.user)
+                get_revision_data(request, problem_code, revision_slug)
 
             git_transaction.set_default_transaction(self.revision._transaction)
 
@@ -1,10 +1,10 @@
-from collections import Counter
-
 from django.contrib import messages
 from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import View
 
@@ -13,18 +13,21 @@ from problems.forms.invocation import InvocationAddForm
 from problems.forms.solution import SolutionAddForm
 from problems.models import Solution, SolutionRun, SolutionRunResult, SolutionSubtaskExpectedVerdict
 from problems.models.enums import SolutionVerdict, SolutionRunVerdict
+from problems.utils.invocation_events import stream_results
 from .generics import ProblemObjectDeleteView, ProblemObjectAddView, RevisionObjectView
 from django.utils.translation import ugettext as _
 
 __all__ = ["InvocationsListView", "InvocationAddView", "InvocationRunView", "InvocationDetailsView",
            "InvocationAnswerDownloadView", "InvocationInputDownloadView", "InvocationOutputDownloadView",
-           "InvocationResultView", "InvocationCloneView"]
+           "InvocationResultView", "InvocationCloneView", "InvocationProgressView",
+           "InvocationEventsView"]
 
 
 class InvocationsListView(RevisionObjectView):
     def get(self, request, problem_code, revision_slug):
-        commit_invocations = self.revision.solutionrun_set.all()
-        old_invocations = self.problem.solutionrun_set.exclude(commit_id=self.revision.commit_id).all()[:5]
+        commit_invocations = self.revision.solutionrun_set.all().prefetch_related("solutions")
+        old_invocations = self.problem.solutionrun_set.exclude(
+            commit_id=self.revision.commit_id).prefetch_related("solutions")[:5]
         return render(request, "problems/invocations_list.html", context={
             "commit_invocations": commit_invocations,
             "old_invocations": old_invocations
@@ -73,98 +76,33 @@ class InvocationDetailsView(RevisionObjectView):
                 "revision_slug": revision_slug
             }))
 
-        invocation_results = obj.results.all()
-        dic = {}
-        testcases = list(obj.testcases.all())
-        for testcase in testcases:
-            dic[testcase.pk] = {}
-        done_results = 0
-        total_results = len(invocation_results)
-        for invocation_result in invocation_results:
-            dic[invocation_result.testcase_id][invocation_result.solution_id] = invocation_result
-            if invocation_result.verdict is not None and invocation_result.verdict != SolutionRunVerdict.judging:
-                done_results += 1
-        if total_results > 0:
-            done_percent = (done_results * 100) // total_results
-        else:
-            done_percent = 100
-        solutions = list(obj.solutions.all())
-        results = []
+        summary = obj.get_summary()
+        solutions = summary["solutions"]
+        aggregates = [summary["aggregates"][solution_pk] for solution_pk, __ in solutions]
 
-        for testcase in testcases:
-            current_results = []
-            failed_subtasks = []
-            subtasks = list(testcase.subtasks.all())
-            for solution in solutions:
-                testcase_subtasks = []
-                current_results.append(dic[testcase.pk][solution.pk])
-                if not dic[testcase.pk][solution.pk].validate():
-                    testcase_subtasks.append((None, solution.verdict.short_name))
-                for subtask in subtasks:
-                    if not dic[testcase.pk][solution.pk].validate(subtasks=[subtask]):
-                        try:
-                            subtask_verdict = solution.subtask_verdicts[subtask.name]
-                            short_name = subtask_verdict.short_name
-                        except KeyError:
-                            short_name = solution.verdict.short_name
-                        testcase_subtasks.append((subtask, short_name))
-                failed_subtasks.append(testcase_subtasks)
-            results.append((testcase, zip(current_results, failed_subtasks)))
-
-
-        solution_max_time = []
-        solution_max_memory = []
-        solution_max_diff = []
-        testcases_pk = [t.pk for t in testcases]
-        for solution in solutions:
-            max_time = 0
-            max_memory = 0
-            max_diff = 0
-            for testcase_pk in testcases_pk:
-                if dic[testcase_pk][solution.pk].solution_max_execution_time is not None:
-                    max_time = max(dic[testcase_pk][solution.pk].solution_max_execution_time, max_time)
-                elif dic[testcase_pk][solution.pk].solution_execution_time is not None:
-                    max_time = max(dic[testcase_pk][solution.pk].solution_execution_time, max_time)
-                if dic[testcase_pk][solution.pk].solution_memory_usage is not None:
-                    max_memory = max(dic[testcase_pk][solution.pk].solution_memory_usage, max_memory)
-                if dic[testcase_pk][solution.pk].timing_error() is not None:
-                    max_diff = max(max_diff, dic[testcase_pk][solution.pk].timing_error())
-            solution_max_time.append(max_time)
-            solution_max_memory.append(max_memory)
-            solution_max_diff.append(max_diff)
-
-        validations = []
-        for solution in solutions:
-            validations.append((solution, obj.validate_solution(solution)))
-
-        subtasks = list(obj.problem.subtasks.all())
+        results = []
+        for testcase_pk, testcase_name in summary["testcases"]:
+            cells = summary["cells"].get(testcase_pk, {})
+            results.append((testcase_pk, testcase_name, [
+                (solution_pk, cells.get(solution_pk)) for solution_pk, __ in solutions
+            ]))
 
         subtasks_results = []
-
-        for subtask in subtasks:
-            subtask_results = []
-            testcases = [t.pk for t in subtask.testcases.all()]
-            for solution in solutions:
-                subtask_solution_result = Counter()
-                only_dont_care_happend = True
-                verdict_happened = False
-                min_score = None
-                for testcase in testcases:
-                    if testcase in testcases_pk:
-                        if dic[testcase][solution.pk].score is not None:
-                            if min_score is not None:
-                                min_score = min(min_score, dic[testcase][solution.pk].score)
-                            else:
-                                min_score = dic[testcase][solution.pk].score
-                        subtask_solution_result[dic[testcase][solution.pk].get_short_name_for_verdict()] += 1
-                        if dic[testcase][solution.pk].validate(subtasks=[subtask], strict=True):
-                            verdict_happened = True
-                        elif not dic[testcase][solution.pk].validate(subtasks=[subtask], strict=False):
-                            only_dont_care_happend = False
-                validation = verdict_happened and only_dont_care_happend
-                subtask_results.append((subtask_solution_result.items(), validation, min_score))
-            subtasks_results.append((subtask, subtask_results))
-        max_time_and_memory = zip(solution_max_time, solution_max_memory, solution_max_diff)
+        for subtask_pk, subtask_name in summary["subtasks"]:
+            subtasks_results.append((subtask_name, [
+                (aggregate["subtasks"][subtask_pk]["verdicts"],
+                 aggregate["subtasks"][subtask_pk]["valid"],
+                 aggregate["subtasks"][subtask_pk]["min_score"])
+                for aggregate in aggregates
+            ]))
+
+        validations = [(solution_pk, solution_name, aggregate["valid"])
+                       for (solution_pk, solution_name), aggregate in zip(solutions, aggregates)]
+        max_time_and_memory = [
+            (solution_pk, aggregate["max_time"], aggregate["max_memory"], aggregate["max_timing_error"])
+            for (solution_pk, __), aggregate in zip(solutions, aggregates)
+        ]
+        done_results, total_results, done_percent = obj.get_progress()
 
         return render(request, "problems/invocation_view.html", context={
             "invocation": obj,
@@ -178,6 +116,32 @@ class InvocationDetailsView(RevisionObjectView):
         })
 
 
+class InvocationEventsView(RevisionObjectView):
+    def get(self, request, problem_code, revision_slug, invocation_id):
+        obj = get_object_or_404(SolutionRun, **{
+            "base_problem_id": self.problem.id,
+            "id": invocation_id
+        })
+        response = StreamingHttpResponse(stream_results(obj), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class InvocationProgressView(RevisionObjectView):
+    def get(self, request, problem_code, revision_slug, invocation_id):
+        done_results, total_results = get_object_or_404(
+            SolutionRun.objects.values_list("done_results", "total_results"),
+            base_problem_id=self.problem.id,
+            id=invocation_id
+        )
+        return JsonResponse({
+            "done": done_results,
+            "total": total_results,
+            "percent": (done_results * 100) // total_results if total_results else 100,
+        })
+
+
 class InvocationResultView(RevisionObjectView):
     def get(self, request, problem_code, revesion_slug, invocation_id, result_id):
         obj = get_object_or_404(SolutionRunResult, **{
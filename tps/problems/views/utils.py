@@ -4,9 +4,11 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.http import Http404
 from django.shortcuts import render, get_object_or_404
+from django.core.urlresolvers import reverse
+from django.utils.http import urlencode
 
 from git_orm.transaction import Transaction
-from problems.utils.diff_match_patch import diff_match_patch
+from problems.utils.revision_difference import diff_dict, get_commit_difference, ObjectDifference
 from problems.models import Problem, ProblemRevision, ProblemCommit
 from django.conf import settings
 from git_orm.models.base import ModelBase
@@ -41,18 +43,40 @@ def extract_revision_data(problem_code, revision_slug, user):
     return problem, branch, revision
 
 
-def diff_dict(dict1, dict2):
-    keys = set(dict1.keys()).union(set(dict2.keys()))
-    result = {}
-    diff_lib = diff_match_patch()
-    for key in keys:
-        str1 = dict1.get(key, "")
-        str2 = dict2.get(key, "")
-        result[key] = diff_lib.diff_prettyHtml(diff_lib.diff_main(str1, str2))
-    return result
+def get_revision_data(request, problem_code, revision_slug):
+    """
+    Returns the result of extract_revision_data, memoized on the request
+    so that the view and the context processors resolve the revision once.
+    """
+    resolved = request.__dict__.setdefault("_resolved_revisions", {})
+    key = (problem_code, revision_slug)
+    if key not in resolved:
+        resolved[key] = extract_revision_data(problem_code, revision_slug, request.user)
+    return resolved[key]
 
 
 def get_revision_difference(base, new):
+    """
+    Returns the changed objects between two revisions as (title, difference) pairs.
+    For commits only the objects whose blobs differ are considered, and each difference
+    has a `url` from which the page loads it once it is expanded (see ObjectDiffView).
+    The differences of other revisions are rendered along with the page.
+    """
+    if isinstance(base, ProblemCommit) and isinstance(new, ProblemCommit):
+        differences = get_commit_difference(base._transaction.repo, base.commit_id, new.commit_id)
+        problem_code = new.problem.code
+        for title, difference in differences:
+            old_id, new_id, entry = difference.blob_ids
+            difference.url = reverse("problems:object_diff", kwargs={
+                "problem_code": problem_code,
+                "revision_slug": new.commit_id,
+                "old_id": old_id,
+                "new_id": new_id,
+            })
+            if entry is not None:
+                difference.url += "?" + urlencode({"entry": entry})
+        return differences
+
     # TODO: Handle problem data manually
     result = []
     for base_object, new_object in base.find_differed_pairs(new):
@@ -63,12 +87,15 @@ def get_revision_difference(base, new):
             operation = "Deleted"
         else:
             operation = "Changed"
-        base_dict = base_object.get_value_as_dict() if base_object is not None else {}
-        new_dict = new_object.get_value_as_dict() if new_object is not None else {}
+
+        def get_values(base_object=base_object, new_object=new_object):
+            base_dict = base_object.get_value_as_dict() if base_object is not None else {}
+            new_dict = new_object.get_value_as_dict() if new_object is not None else {}
+            return base_dict, new_dict
 
         result.append((
             "{} {} - {}".format(operation, type(not_none_obj)._meta.verbose_name, str(not_none_obj)),
-            diff_dict(base_dict, new_dict)
+            ObjectDifference(get_values)
         ))
     if new.has_conflicts():
         result.append(("Resolved conflicts", ""))
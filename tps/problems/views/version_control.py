@@ -1,5 +1,6 @@
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
+from django.core.paginator import InvalidPage, Paginator
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import render, get_object_or_404
@@ -9,38 +10,65 @@ from django.utils.translation import ugettext as _
 from problems.forms.version_control import CommitForm
 from problems.models import Conflict, ProblemRevision, SolutionRun
 from problems.models.problem_data import ProblemData
+from problems.utils.commit_diff import DIFF_FILES_PER_PAGE, get_diff_files, get_file_patches
+from problems.utils.commit_history import get_history_page, get_commit_stats
+from problems.utils.revision_difference import get_blob_difference
 from problems.views.generics import RevisionObjectView, ProblemObjectView
-from problems.views.utils import extract_revision_data
+from problems.views.utils import get_revision_data
 
-__all__ = ["HistoryView", "DiffView"]
+__all__ = ["HistoryView", "DiffView", "ObjectDiffView"]
 
 
 class HistoryView(ProblemObjectView):
 
     def get(self, request, *args, **kwargs):
-        commit_list = list(self.revision._transaction.walk(reverse=True))
-        object_list = []
-        if len(commit_list) > 0:
-            for i in range(len(commit_list)):
-                if i + 1 < len(commit_list):
-                    object_list.append((commit_list[i], commit_list[i + 1]))
-                else:
-                    object_list.append((commit_list[i], None))
+        repo = self.revision._transaction.repo
+        try:
+            commits, next_start = get_history_page(self.revision._transaction, start=request.GET.get("start"))
+        except KeyError:
+            raise Http404
+        object_list = [(commit, get_commit_stats(repo, commit)) for commit in commits]
 
         return render(request, "problems/history.html", context={
             'object_list': object_list,
+            'next_start': next_start,
         })
 
 
 class DiffView(ProblemObjectView):
     def get(self, request, *args, **kwargs):
         other_slug = kwargs.pop("other_slug")
-        _, _, other_revision = extract_revision_data(self.problem.code, other_slug, request.user)
+        _, _, other_revision = get_revision_data(request, self.problem.code, other_slug)
         ours_id = self.revision.commit_id
         theirs_id = other_revision.commit_id
-        diff = self.revision._transaction.repo.diff(a=theirs_id, b=ours_id).patch
+        repo = self.revision._transaction.repo
+        files = get_diff_files(repo, theirs_id, ours_id)
+        paginator = Paginator(files, DIFF_FILES_PER_PAGE)
+        try:
+            page = paginator.page(request.GET.get("page", 1))
+        except InvalidPage:
+            raise Http404
+        patches = get_file_patches(repo, theirs_id, ours_id, page.object_list)
         return render(request, "problems/diff.html", context={
             "ours_id": ours_id,
             "theirs_id": theirs_id,
-            "diff": diff
+            "files": files,
+            "page": page,
+            "page_files": list(zip(page.object_list, patches)),
+        })
+
+
+class ObjectDiffView(ProblemObjectView):
+    """
+    Renders the difference of a committed object, which revision_diff.html loads when it is expanded.
+    """
+    def get(self, request, *args, **kwargs):
+        repo = self.revision._transaction.repo
+        difference = get_blob_difference(repo, kwargs["old_id"], kwargs["new_id"], request.GET.get("entry"))
+        try:
+            items = difference.items()
+        except (KeyError, ValueError):
+            raise Http404
+        return render(request, "problems/blocks/object_diff.html", context={
+            "items": items,
         })
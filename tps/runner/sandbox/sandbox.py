@@ -456,7 +456,7 @@ class IsolateSandbox(SandboxBase):
         # FIXME: current_process is internal
         self.box_lock = None
         while True:
-            for i in range(90):
+            for i in range(settings.SANDBOX_BOX_COUNT):
                 box_lock = cache.lock("box_{}".format(i), timeout=(10 * 60))
                 if box_lock.acquire(blocking=False):
                     self.box_lock = box_lock
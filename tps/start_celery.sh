@@ -1,2 +1 @@
-sudo /home/administrator/ioi/bin/celery -A tps multi start 16 -c:1-6 2 -c:7-16 3 -l DEBUG -Q:1-6 invoke -Q:7-16 celery --pidfile=celery-files/%n.pid  --logfile=celery-files/%n%I.log
-
+sudo /home/administrator/ioi/bin/python manage.py celery_workers start --celery /home/administrator/ioi/bin/celery -l DEBUG | sudo sh
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class TasksConfig(AppConfig):
     name = 'tasks'
+
+    def ready(self):
+        super(TasksConfig, self).ready()
+        from . import monitoring
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Prints the `celery multi` commands starting (or stopping) the worker pools in CELERY_WORKER_POOLS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['start', 'stop', 'restart'])
+        parser.add_argument('--celery', default='celery', help="celery executable")
+        parser.add_argument('-l', '--loglevel', default='INFO')
+
+    @staticmethod
+    def get_concurrency(pool):
+        if 'concurrency' in pool:
+            return pool['concurrency']
+        return max(1, int(settings.SANDBOX_BOX_COUNT * pool['box_share']) // pool['workers'])
+
+    def handle(self, *args, **options):
+        total_sandboxed = sum(
+            self.get_concurrency(pool) * pool['workers']
+            for pool in settings.CELERY_WORKER_POOLS if 'box_share' in pool
+        )
+        if total_sandboxed > settings.SANDBOX_BOX_COUNT:
+            self.stderr.write("Sandboxed pools use {} processes but only {} boxes are available".format(
+                total_sandboxed, settings.SANDBOX_BOX_COUNT
+            ))
+
+        for pool in settings.CELERY_WORKER_POOLS:
+            nodes = " ".join(
+                "{}{}".format(pool['queue'], i) for i in range(1, pool['workers'] + 1)
+            )
+            self.stdout.write(
+                "{celery} -A tps multi {action} {nodes} -Q {queue} -c {concurrency} "
+                "--prefetch-multiplier={prefetch} -O fair -l {loglevel} "
+                "--pidfile=celery-files/%n.pid --logfile=celery-files/%n%I.log".format(
+                    celery=options['celery'],
+                    action=options['action'],
+                    nodes=nodes,
+                    queue=pool['queue'],
+                    concurrency=self.get_concurrency(pool),
+                    prefetch=pool.get('prefetch_multiplier', 1),
+                    loglevel=options['loglevel'],
+                )
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tasks.monitoring import get_queue_stats, reset_queue_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the backlog and waiting time of each celery queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the collected latency statistics")
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_queue_stats()
+            return
+
+        row_format = "{:<12}{:>10}{:>10}{:>16}{:>16}\n"
+        self.stdout.write(row_format.format("queue", "backlog", "started", "avg wait (ms)", "last wait (ms)"))
+        for stats in get_queue_stats():
+            self.stdout.write(row_format.format(*[
+                "-" if stats[key] is None else stats[key]
+                for key in ('queue', 'backlog', 'started', 'average_latency', 'last_latency')
+            ]), ending='')
@@ -0,0 +1,99 @@
+import logging
+import time
+
+from celery import current_app
+from celery.signals import after_task_publish, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['get_queue_backlog', 'get_queue_stats', 'reset_queue_stats']
+
+READY_AT_CACHE_KEY = 'task_{task_id}_ready_at'
+QUEUE_STAT_CACHE_KEY = 'queue_{queue}_{stat}'
+READY_AT_TIMEOUT = 24 * 60 * 60
+
+
+def _queue_names():
+    return [queue.name for queue in settings.CELERY_TASK_QUEUES]
+
+
+@after_task_publish.connect
+def record_ready_time(sender=None, headers=None, body=None, **kwargs):
+    # The statistics are optional, so a failure (e.g. an unreachable cache) must not fail the publish
+    try:
+        info = headers if 'task' in headers else body
+        ready_at = time.time()
+        eta = info.get('eta')
+        if eta:
+            eta = parse_datetime(eta)
+            if eta is not None:
+                ready_at = max(ready_at, eta.timestamp())
+        cache.set(READY_AT_CACHE_KEY.format(task_id=info['id']), ready_at, timeout=READY_AT_TIMEOUT)
+    except Exception as e:
+        logger.warning(e, exc_info=True)
+
+
+@task_prerun.connect
+def record_queue_latency(task_id=None, task=None, **kwargs):
+    # The statistics are optional, so a failure (e.g. an unreachable cache) must not prevent running the task
+    try:
+        key = READY_AT_CACHE_KEY.format(task_id=task_id)
+        ready_at = cache.get(key)
+        if ready_at is None:
+            return
+        cache.delete(key)
+        latency = int(max(0, time.time() - ready_at) * 1000)
+        queue = getattr(task, 'queue', None) or current_app.conf.task_default_queue
+        for stat, value in (('count', 1), ('latency_total', latency)):
+            stat_key = QUEUE_STAT_CACHE_KEY.format(queue=queue, stat=stat)
+            cache.add(stat_key, 0, timeout=None)
+            cache.incr(stat_key, value)
+        cache.set(QUEUE_STAT_CACHE_KEY.format(queue=queue, stat='latency_last'), latency, timeout=None)
+    except Exception as e:
+        logger.warning(e, exc_info=True)
+
+
+def get_queue_backlog(queue_name):
+    """
+    Returns the number of messages waiting in the given queue,
+    or None if the broker doesn't know about the queue.
+    """
+    with current_app.connection_for_read() as connection:
+        try:
+            return connection.default_channel.queue_declare(queue=queue_name, passive=True).message_count
+        except connection.channel_errors:
+            return None
+
+
+def get_queue_stats():
+    """
+    Returns a list of dicts describing each configured queue, containing
+    the backlog, the number of started tasks and their waiting times (in ms).
+    """
+    stats = []
+    for queue in _queue_names():
+        values = cache.get_many([
+            QUEUE_STAT_CACHE_KEY.format(queue=queue, stat=stat)
+            for stat in ('count', 'latency_total', 'latency_last')
+        ])
+        count = values.get(QUEUE_STAT_CACHE_KEY.format(queue=queue, stat='count'), 0)
+        latency_total = values.get(QUEUE_STAT_CACHE_KEY.format(queue=queue, stat='latency_total'), 0)
+        stats.append({
+            'queue': queue,
+            'backlog': get_queue_backlog(queue),
+            'started': count,
+            'average_latency': latency_total // count if count else None,
+            'last_latency': values.get(QUEUE_STAT_CACHE_KEY.format(queue=queue, stat='latency_last')),
+        })
+    return stats
+
+
+def reset_queue_stats():
+    cache.delete_many([
+        QUEUE_STAT_CACHE_KEY.format(queue=queue, stat=stat)
+        for queue in _queue_names()
+        for stat in ('count', 'latency_total', 'latency_last')
+    ])
@@ -1,41 +1,154 @@
 from __future__ import absolute_import
 
+import copy
 import json
 import logging
+import threading
 
+from collections import OrderedDict
 from json import JSONDecoder
 from json import JSONEncoder
 
+from django.conf import settings
 from django.db import models
+from django.utils.functional import SimpleLazyObject, empty
 from git_orm import models as git_models
 from git_orm.transaction import Transaction
 
 logger = logging.getLogger(__name__)
 
 
+# Compact markers used in task payloads. A django model is encoded as
+# {"__dj__": ["app_label.model_name", pk]} and a git model as
+# {"__git__": ["app_label.model_name", pk, commit_id, repository_path]}.
+# Models listing attributes in `task_payload_fields` also carry their values
+# as a trailing {attribute: value} object, so that they can be read without loading.
+DJANGO_MODEL_MARKER = '__dj__'
+GIT_MODEL_MARKER = '__git__'
+
+
+def _model_label(o):
+    return '{}.{}'.format(o._meta.app_label, o._meta.model_name)
+
+
+def _get_model(label):
+    from django.apps import apps
+    return apps.get_model(label)
+
+
+def _get_prefetched_fields(o):
+    return {name: getattr(o, name) for name in getattr(o, 'task_payload_fields', ())}
+
+
+class PrefetchedLazyObject(SimpleLazyObject):
+    """
+    A lazy object that answers the prefetched attributes of the payload
+    without loading the object. Once loaded, the object itself is used.
+    """
+    def __init__(self, func, prefetched):
+        self.__dict__['_prefetched'] = prefetched
+        super(PrefetchedLazyObject, self).__init__(func)
+
+    def __getattr__(self, name):
+        if self._wrapped is empty and name in self._prefetched:
+            return self._prefetched[name]
+        return super(PrefetchedLazyObject, self).__getattr__(name)
+
+    def __copy__(self):
+        if self._wrapped is empty:
+            return PrefetchedLazyObject(self._setupfunc, self._prefetched)
+        return copy.copy(self._wrapped)
+
+    def __deepcopy__(self, memo):
+        if self._wrapped is empty:
+            result = PrefetchedLazyObject(self._setupfunc, copy.deepcopy(self._prefetched, memo))
+            memo[id(self)] = result
+            return result
+        return copy.deepcopy(self._wrapped, memo)
+
+
+def _lazy_object(func, prefetched=None):
+    if prefetched:
+        return PrefetchedLazyObject(func, prefetched)
+    return SimpleLazyObject(func)
+
+
+class GitTransactionCache(object):
+    """
+    A per-worker LRU cache of the git transactions used to load task arguments,
+    keyed by (repository_path, commit_id), so that tasks receiving objects of
+    the same commit don't reopen its repository. The objects themselves are
+    loaded afresh for every task, so that changes made by one task never leak
+    into another. Transactions that have been written to or committed are never reused.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._transactions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_transaction(self, repository_path, commit_id):
+        key = (repository_path, commit_id)
+        with self._lock:
+            transaction = self._transactions.pop(key, None)
+            # A transaction that has been written to or committed no longer matches its commit
+            if transaction is not None and (transaction.has_changes or
+                                            [str(parent) for parent in transaction.parents] != [commit_id]):
+                transaction = None
+            if transaction is None:
+                transaction = Transaction(repository_path=repository_path, commit_id=commit_id)
+            self._transactions[key] = transaction
+            while len(self._transactions) > self.max_size:
+                self._transactions.popitem(last=False)
+        return transaction
+
+    def get(self, repository_path, commit_id, label, pk):
+        model = _get_model(label)
+        transaction = self.get_transaction(repository_path, commit_id)
+        return model._get_instance(transaction, model._meta.pk.to_python(pk))
+
+    def clear(self):
+        with self._lock:
+            self._transactions.clear()
+
+
+git_transaction_cache = GitTransactionCache(getattr(settings, 'TASK_TRANSACTION_CACHE_SIZE', 16))
+
+
+def load_django_object(label, pk):
+    return _get_model(label).objects.get(pk=pk)
+
+
+def load_git_object(label, pk, commit_id, repository_path):
+    return git_transaction_cache.get(repository_path, commit_id, label, pk)
+
+
 class DjangoPKJSONEncoder(JSONEncoder):
 
     def default(self, o):
         if isinstance(o, models.Model):
-            return {
-                'django_pk_encoded': True,
-                'app_label': o._meta.app_label,
-                'model_name': o._meta.model_name,
-                'pk': o.pk,
-            }
+            encoded = {DJANGO_MODEL_MARKER: [_model_label(o), o.pk]}
         elif isinstance(o, git_models.Model):
-            return {
-                'git_pk_encoded': True,
-                'app_label': o._meta.app_label,
-                'model_name': o._meta.model_name,
-                'pk': o.pk,
-                'commit_id': str(o._transaction.parents[0]),
-                'repository_path': o._transaction.repo.path,
-            }
-        return super(DjangoPKJSONEncoder, self).default(o)
+            encoded = {GIT_MODEL_MARKER: [
+                _model_label(o),
+                o.pk,
+                str(o._transaction.parents[0]),
+                o._transaction.repo.path,
+            ]}
+        else:
+            return super(DjangoPKJSONEncoder, self).default(o)
+        prefetched = _get_prefetched_fields(o)
+        if prefetched:
+            next(iter(encoded.values())).append(prefetched)
+        return encoded
 
 
 class DjangoPKJSONDecoder(JSONDecoder):
+    """
+    Decodes model references into lazy objects. The database or git
+    repository is only hit when the task first touches the object, so
+    tasks that bail out early (e.g. on a dependency check) never pay for it.
+    """
     def __init__(self, object_hook=None, *args, **kwargs):
         if not object_hook:
             object_hook = self.pk_object_hook
@@ -43,18 +156,23 @@ class DjangoPKJSONDecoder(JSONDecoder):
 
     @staticmethod
     def pk_object_hook(json_dict):
-        if 'django_pk_encoded' in json_dict:
-            from django.apps import apps
-            model = apps.get_model(json_dict['app_label'], json_dict['model_name'])
-            return model.objects.get(pk=json_dict['pk'])
+        if DJANGO_MODEL_MARKER in json_dict:
+            label, pk, *prefetched = json_dict[DJANGO_MODEL_MARKER]
+            return _lazy_object(lambda: load_django_object(label, pk), *prefetched)
+        elif GIT_MODEL_MARKER in json_dict:
+            label, pk, commit_id, repository_path, *prefetched = json_dict[GIT_MODEL_MARKER]
+            return _lazy_object(lambda: load_git_object(label, pk, commit_id, repository_path), *prefetched)
+        # Payloads published before the compact format was introduced
+        elif 'django_pk_encoded' in json_dict:
+            label = '{}.{}'.format(json_dict['app_label'], json_dict['model_name'])
+            pk = json_dict['pk']
+            return SimpleLazyObject(lambda: load_django_object(label, pk))
         elif 'git_pk_encoded' in json_dict:
-            from django.apps import apps
-            model = apps.get_model(json_dict['app_label'], json_dict['model_name'])
-            transaction = Transaction(
-                repository_path=json_dict['repository_path'],
-                commit_id=json_dict['commit_id'],
-            )
-            return model.objects.with_transaction(transaction).get(pk=json_dict['pk'])
+            label = '{}.{}'.format(json_dict['app_label'], json_dict['model_name'])
+            pk = json_dict['pk']
+            commit_id = json_dict['commit_id']
+            repository_path = json_dict['repository_path']
+            return SimpleLazyObject(lambda: load_git_object(label, pk, commit_id, repository_path))
         else:
             return json_dict
 
@@ -65,7 +183,7 @@ class DjangoPKSerializer(object):
 
     @staticmethod
     def model_encode(data):
-        return json.dumps(data, cls=DjangoPKJSONEncoder)
+        return json.dumps(data, cls=DjangoPKJSONEncoder, separators=(',', ':'))
 
     @staticmethod
     def model_decode(data):
@@ -78,4 +196,3 @@ class DjangoPKSerializer(object):
     def register(cls):
         from kombu.serialization import register
         register(cls.name, cls.model_encode, cls.model_decode, 'application/json', 'utf-8')
-
@@ -13,6 +13,11 @@ from tasks.serializers import DjangoPKSerializer
 
 logger = logging.getLogger(__name__)
 
+# Message priorities within a queue. The redis transport consumes lower values first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 4
+PRIORITY_LOW = 8
+
 
 class TaskType(type):
     """Meta class for tasks.
@@ -95,6 +100,8 @@ class CeleryTask(celery.Task, metaclass=TaskType):
     MAX_DEPENDENCY_WAIT_TIME = 120
     track_started = True
     abstract = True
+    queue = 'celery'
+    priority = PRIORITY_NORMAL
     max_retries = None
 
     def validate_dependencies(self, *args, **kwargs):
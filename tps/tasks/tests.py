@@ -1,3 +1,184 @@
-from django.test import TestCase
+import copy
+import json
+from io import StringIO
 
-# Create your tests here.
+import mock
+from accounts.models import User
+from celery.app.base import Celery
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+from model_mommy import mommy
+
+from problems.models.export import ExportPackageCreationTask
+from problems.models.file import CompilationTask
+from problems.models.problem import CommitTestcaseGenerate, CommitVerify, ProblemJudgeInitialization
+from problems.models.solution_run import SolutionRunBatchExecutionTask, SolutionRunCollectTask, \
+    SolutionRunExecutionTask, SolutionRunStartTask
+from problems.models.testdata import TestCaseInputGeneration, TestCaseJudgeInitialization, TestCaseOutputGeneration
+from problems.models.validator import ValidatorResultComputationTask
+from tasks import monitoring, serializers
+from tasks.serializers import DjangoPKSerializer, GitTransactionCache
+from tasks.tasks import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+class DjangoPKSerializerTests(TestCase):
+
+    def test_django_model_round_trip(self):
+        user = mommy.make(User)
+        encoded = DjangoPKSerializer.model_encode([user, 1])
+        self.assertEqual(json.loads(encoded), [{'__dj__': ['accounts.user', user.pk]}, 1])
+        decoded_user, number = DjangoPKSerializer.model_decode(encoded)
+        self.assertIsInstance(decoded_user, SimpleLazyObject)
+        self.assertIsInstance(decoded_user, User)
+        self.assertEqual(decoded_user, user)
+        self.assertEqual(number, 1)
+
+    def test_decoding_is_lazy(self):
+        user = mommy.make(User)
+        encoded = DjangoPKSerializer.model_encode([user])
+        with self.assertNumQueries(0):
+            decoded_user, = DjangoPKSerializer.model_decode(encoded)
+        with self.assertNumQueries(1):
+            self.assertEqual(decoded_user.username, user.username)
+
+    def test_prefetched_fields(self):
+        user = mommy.make(User)
+        with mock.patch.object(User, "task_payload_fields", ("username",), create=True):
+            encoded = DjangoPKSerializer.model_encode([user])
+        self.assertEqual(json.loads(encoded), [{'__dj__': ['accounts.user', user.pk, {'username': user.username}]}])
+        decoded_user, = DjangoPKSerializer.model_decode(encoded)
+        with self.assertNumQueries(0):
+            self.assertEqual(decoded_user.username, user.username)
+            self.assertIsInstance(copy.deepcopy(decoded_user), SimpleLazyObject)
+        with self.assertNumQueries(1):
+            self.assertEqual(decoded_user.email, user.email)
+        self.assertEqual(decoded_user, user)
+
+    def test_legacy_payload(self):
+        user = mommy.make(User)
+        encoded = json.dumps([{
+            'django_pk_encoded': True,
+            'app_label': 'accounts',
+            'model_name': 'user',
+            'pk': user.pk,
+        }])
+        decoded_user, = DjangoPKSerializer.model_decode(encoded.encode('utf-8'))
+        self.assertEqual(decoded_user.pk, user.pk)
+
+
+class GitTransactionCacheTests(TestCase):
+
+    def setUp(self):
+        self.model = mock.Mock(**{"_get_instance.side_effect": lambda transaction, pk: mock.Mock(pk=pk)})
+        patchers = [
+            mock.patch.object(serializers, "_get_model", return_value=self.model),
+            mock.patch.object(serializers, "Transaction", side_effect=lambda **kwargs: mock.Mock(
+                has_changes=False, parents=[kwargs["commit_id"]])),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = GitTransactionCache(max_size=2)
+
+    def test_objects_are_not_shared(self):
+        first = self.cache.get("repo", "c1", "problems.solution", "a")
+        second = self.cache.get("repo", "c1", "problems.solution", "a")
+        self.assertIsNot(first, second)
+        self.assertEqual(serializers.Transaction.call_count, 1)
+
+    def test_transactions_are_capped(self):
+        for commit_id in ["c1", "c2", "c3", "c1"]:
+            self.cache.get_transaction("repo", commit_id)
+        self.assertEqual(serializers.Transaction.call_count, 4)
+        self.assertEqual(len(self.cache._transactions), 2)
+
+    def test_changed_transactions_are_not_reused(self):
+        self.cache.get_transaction("repo", "c1").has_changes = True
+        self.cache.get_transaction("repo", "c1")
+        self.assertEqual(serializers.Transaction.call_count, 2)
+
+    def test_committed_transactions_are_not_reused(self):
+        self.cache.get_transaction("repo", "c1").parents = ["c2"]
+        self.cache.get_transaction("repo", "c1")
+        self.assertEqual(serializers.Transaction.call_count, 2)
+
+
+class QueueRoutingTests(SimpleTestCase):
+
+    ROUTES = [
+        (CompilationTask, 'compile', PRIORITY_HIGH),
+        (TestCaseInputGeneration, 'generate', PRIORITY_HIGH),
+        (TestCaseOutputGeneration, 'generate', PRIORITY_HIGH),
+        (CommitTestcaseGenerate, 'generate', PRIORITY_LOW),
+        (CommitVerify, 'verify', PRIORITY_LOW),
+        (ValidatorResultComputationTask, 'verify', PRIORITY_NORMAL),
+        (SolutionRunStartTask, 'evaluate', PRIORITY_HIGH),
+        (SolutionRunExecutionTask, 'evaluate', PRIORITY_NORMAL),
+        (SolutionRunCollectTask, 'evaluate', PRIORITY_NORMAL),
+        (SolutionRunBatchExecutionTask, 'evaluate', PRIORITY_NORMAL),
+        (ExportPackageCreationTask, 'export', PRIORITY_NORMAL),
+        (TestCaseJudgeInitialization, 'celery', PRIORITY_NORMAL),
+        (ProblemJudgeInitialization, 'celery', PRIORITY_NORMAL),
+    ]
+
+    def test_tasks_are_published_to_their_queue(self):
+        with mock.patch.object(Celery, "send_task") as send_task:
+            for task_class, queue, priority in self.ROUTES:
+                task_class().apply_async(args=[mock.Mock()], kwargs={})
+                options = send_task.call_args[1]
+                self.assertEqual((options["queue"], options["priority"]), (queue, priority), task_class.__name__)
+
+    def test_queues_are_configured(self):
+        configured = {queue.name for queue in settings.CELERY_TASK_QUEUES}
+        pools = {pool['queue'] for pool in settings.CELERY_WORKER_POOLS}
+        for task_class, queue, priority in self.ROUTES:
+            self.assertIn(queue, configured)
+            self.assertIn(queue, pools)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class QueueStatsTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(monitoring, "get_queue_backlog", side_effect=lambda queue: len(queue))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(monitoring.reset_queue_stats)
+
+    def run_task(self, task_id, queue, waited):
+        with mock.patch.object(monitoring.time, "time", return_value=100):
+            monitoring.record_ready_time(headers={"task": "t", "id": task_id, "eta": None})
+        with mock.patch.object(monitoring.time, "time", return_value=100 + waited):
+            monitoring.record_queue_latency(task_id=task_id, task=mock.Mock(queue=queue))
+
+    def test_stats(self):
+        self.run_task("a", "compile", 1)
+        self.run_task("b", "compile", 3)
+        stats = {queue_stats["queue"]: queue_stats for queue_stats in monitoring.get_queue_stats()}
+        self.assertEqual(stats["compile"], {
+            "queue": "compile", "backlog": 7, "started": 2, "average_latency": 2000, "last_latency": 3000,
+        })
+        self.assertEqual(stats["export"]["started"], 0)
+        self.assertIsNone(stats["export"]["average_latency"])
+
+    def test_command(self):
+        self.run_task("a", "compile", 1)
+        out = StringIO()
+        call_command("queue_stats", stdout=out)
+        rows = {line.split()[0]: line.split()[1:] for line in out.getvalue().splitlines()[1:]}
+        self.assertEqual(rows["compile"], ["7", "1", "1000", "1000"])
+        self.assertEqual(rows["export"], ["6", "0", "-", "-"])
+
+        call_command("queue_stats", "--reset", stdout=StringIO())
+        self.assertEqual([queue_stats["started"] for queue_stats in monitoring.get_queue_stats()
+                          if queue_stats["queue"] == "compile"], [0])
+
+    def test_unreachable_cache_is_ignored(self):
+        with mock.patch.object(monitoring, "cache") as cache, \
+                mock.patch.object(monitoring.logger, "warning") as warning:
+            cache.set.side_effect = cache.get.side_effect = ConnectionError
+            monitoring.record_ready_time(headers={"task": "t", "id": "a"})
+            monitoring.record_queue_latency(task_id="a", task=mock.Mock(queue="compile"))
+        self.assertEqual(warning.call_count, 2)
@@ -189,6 +189,8 @@ SANDBOX_KEEP = False
 SANDBOX_USE_CGROUPS = True
 SANDBOX_MAX_FILE_SIZE = 1048576
 SANDBOX_BOX_ID_OFFSET = 0
+# Number of isolate boxes shared by all workers of this machine (isolate accepts ids up to 99)
+SANDBOX_BOX_COUNT = 90
 # isolate
 ISOLATE_PATH = os.path.join(BASE_DIR, "../isolate/isolate")
 
@@ -228,9 +230,38 @@ CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 
 CELERY_TASK_QUEUES = (
     Queue('celery', Exchange('celery'), routing_key='default'),
-    Queue('invoke', Exchange('invoke'), routing_key='invoke'),
+    Queue('compile', Exchange('compile'), routing_key='compile'),
+    Queue('generate', Exchange('generate'), routing_key='generate'),
+    Queue('verify', Exchange('verify'), routing_key='verify'),
+    Queue('evaluate', Exchange('evaluate'), routing_key='evaluate'),
+    Queue('export', Exchange('export'), routing_key='export'),
 )
 
+# Split every queue into priority levels (see tasks.tasks.PRIORITY_*)
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+}
+
+# Worker pools started by start_celery.sh (see the celery_workers command).
+# Pools marked as sandboxed run code inside isolate, so their concurrency is
+# derived from SANDBOX_BOX_COUNT according to their box_share instead of
+# being set explicitly.
+CELERY_WORKER_POOLS = (
+    {'queue': 'celery', 'workers': 2, 'concurrency': 2, 'prefetch_multiplier': 4},
+    {'queue': 'compile', 'workers': 2, 'box_share': 0.1, 'prefetch_multiplier': 4},
+    {'queue': 'generate', 'workers': 3, 'box_share': 0.3, 'prefetch_multiplier': 1},
+    {'queue': 'verify', 'workers': 1, 'box_share': 0.1, 'prefetch_multiplier': 1},
+    {'queue': 'evaluate', 'workers': 5, 'box_share': 0.5, 'prefetch_multiplier': 1},
+    {'queue': 'export', 'workers': 1, 'concurrency': 1, 'prefetch_multiplier': 1},
+)
+
+# Number of git transactions (open repositories, per worker) kept by the task argument decoder
+TASK_TRANSACTION_CACHE_SIZE = 16
+
+# Maximum size (in bytes) of the files kept by each generation cache
+# (generated inputs and outputs). None disables eviction.
+GENERATION_CACHE_MAX_SIZE = 10 * 1024 ** 3
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
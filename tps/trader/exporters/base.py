@@ -1,15 +1,116 @@
+import hashlib
+import io
+import json
 import os
 import shutil
+import tarfile
 import tempfile
+import time
+import zipfile
 
-from django.core.files import File
-
-from file_repository.models import FileModel
+from file_repository.models import FileModel, FileSystemModel, get_file_name
 
 __all__ = ["BaseExporter", ]
 
 
+# Entries with these extensions are already compressed, so deflating them only costs time
+STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jar",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".pdf", ".mp3", ".mp4",
+}
+# Entries smaller than this are stored, since deflate headers outweigh the gain
+MIN_DEFLATE_SIZE = 128
+
+TAR_MODES = {
+    "tar": "w",
+    "gztar": "w:gz",
+    "bztar": "w:bz2",
+    "xztar": "w:xz",
+}
+ARCHIVE_EXTENSIONS = {
+    "zip": ".zip",
+    "tar": ".tar",
+    "gztar": ".tar.gz",
+    "bztar": ".tar.bz2",
+    "xztar": ".tar.xz",
+}
+
+
+class HashingReader(object):
+    """
+    Wraps a binary file so that its content is hashed while it is read.
+    """
+    def __init__(self, file_, digest):
+        self.file = file_
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+
+class ArchiveEntry(object):
+    """
+    A member of the exported archive. The content is given either by `source_path`
+    (a file on disk, streamed into the archive) or by `content`, which may be
+    a callable so that files are only read while the archive is being written.
+    The content is not kept in memory after it is written, its digest is computed
+    while it is written unless it was needed before.
+    """
+    def __init__(self, path, source_path=None, content=None):
+        self.path = path
+        self.source_path = source_path
+        self.content = content
+        self._digest = None
+
+    def get_content(self):
+        content = self.content() if callable(self.content) else self.content
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return content
+
+    def set_digest(self, digest):
+        self._digest = digest.hexdigest()
+
+    def get_digest(self):
+        if self._digest is None:
+            digest = hashlib.sha1()
+            if self.source_path is not None:
+                with open(self.source_path, "rb") as source:
+                    for chunk in iter(lambda: source.read(1 << 20), b""):
+                        digest.update(chunk)
+            else:
+                digest.update(self.get_content())
+            self.set_digest(digest)
+        return self._digest
+
+    def get_size(self):
+        if self.source_path is not None:
+            return os.path.getsize(self.source_path)
+        return None
+
+    def should_deflate(self, size):
+        if os.path.splitext(self.path)[1].lower() in STORED_EXTENSIONS:
+            return False
+        return size >= MIN_DEFLATE_SIZE
+
+
 class BaseExporter(object):
+    """
+    Exporters describe the archive by calling write_to_file, extract_from_storage_to_path
+    and create_directory. Nothing is staged on disk: the entries are streamed from
+    storage straight into the archive by extract_archive_to_storage.
+    The temporary directory at `path` is only a workspace for files that
+    have to be produced by external tools.
+
+    After the archive is created, `manifest` maps each entry to the sha1 of its content,
+    which is computed while the entry is streamed into the archive.
+    Given the manifest of a previous export as `base_manifest`, a delta archive is made
+    instead: unchanged entries are left out and the removed ones are listed in DELTA_FILE_NAME.
+    """
+
+    DELTA_FILE_NAME = "delta.json"
 
     short_name = None
 
@@ -24,6 +125,9 @@ class BaseExporter(object):
 
         self.revision = revision
         self.exported = False
+        self.entries = {}
+        self.directories = set()
+        self.manifest = None
 
     def _cleanup(self):
         self.temp_dir.cleanup()
@@ -40,8 +144,8 @@ class BaseExporter(object):
 
     def _do_export(self):
         """
-            This method is responsible for exporting the revision data to
-            exporter's path.
+            This method is responsible for describing the revision data
+            as archive entries.
         """
 
         raise NotImplementedError("This must be implemented in subclasses")
@@ -55,43 +159,148 @@ class BaseExporter(object):
     def get_absolute_path(self, path):
         return os.path.join(self.path, path)
 
-    def extract_from_storage_to_path(self, file_model, relative_path):
+    @staticmethod
+    def get_file_path(file_model):
+        """
+        Returns the path of the file backing the given file model on disk,
+        or None if its content is only available in memory (e.g. git files).
+        """
         if isinstance(file_model, FileModel):
-            shutil.copyfile(file_model.file.path, self.get_absolute_path(relative_path))
+            return file_model.file.path
+        if isinstance(file_model, FileSystemModel) and os.path.isfile(file_model.file.name):
+            return file_model.file.name
+        return None
+
+    def _add_entry(self, entry):
+        self.entries[os.path.normpath(entry.path)] = entry
+        parent = os.path.dirname(os.path.normpath(entry.path))
+        if parent:
+            self.create_directory(parent)
+
+    def extract_from_storage_to_path(self, file_model, relative_path):
+        source_path = self.get_file_path(file_model)
+        if source_path is not None:
+            self._add_entry(ArchiveEntry(relative_path, source_path=source_path))
         else:
-            file_ = file_model.file
-            file_.open()
-            self.write_to_file(self.get_absolute_path(relative_path), file_.read())
+            def read_file():
+                file_ = file_model.file
+                file_.open()
+                return file_.read()
+            self._add_entry(ArchiveEntry(relative_path, content=read_file))
 
-    def extract_archive_to_storage(self, name, format="zip"):
-        if not self.exported:
-            raise ValueError("Export before requesting the archive")
+    def add_file_to_archive(self, source_path, relative_path):
+        self._add_entry(ArchiveEntry(relative_path, source_path=source_path))
 
-        full_name = os.path.join(self.archives_path, name)
+    def write_to_file(self, path, content):
+        self._add_entry(ArchiveEntry(path, content=content))
 
-        archive_name = shutil.make_archive(full_name, format,
-                                           root_dir=self.outer_temp_path,
-                                           base_dir=self.revision.problem_data.code_name)
+    def create_directory(self, path):
+        path = os.path.normpath(path)
+        while path and path not in self.directories:
+            self.directories.add(path)
+            path = os.path.dirname(path)
 
-        archive_ = open(archive_name, "rb")
+    def _get_entries_to_write(self, base_manifest):
+        if base_manifest is None:
+            return self.entries
 
-        file_model = FileModel.objects.create(
-            file=File(archive_),
-        )
+        entries = {
+            path: entry for path, entry in self.entries.items()
+            if base_manifest.get(path) != entry.get_digest()
+        }
+        removed = sorted(set(base_manifest.keys()) - set(self.entries.keys()))
+        unchanged = len(self.entries) - len(entries)
+        entries[self.DELTA_FILE_NAME] = ArchiveEntry(self.DELTA_FILE_NAME, content=json.dumps({
+            "removed": removed,
+            "unchanged": unchanged,
+        }))
+        return entries
 
-        archive_.close()
+    def _write_zip(self, archive_file, base_dir, entries):
+        date_time = time.localtime(time.time())[:6]
+        with zipfile.ZipFile(archive_file, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            for directory in sorted(self.directories):
+                info = zipfile.ZipInfo(os.path.join(base_dir, directory) + "/", date_time)
+                info.external_attr = 0o40775 << 16 | 0x10
+                archive.writestr(info, b"")
+            for path in sorted(entries):
+                entry = entries[path]
+                arcname = os.path.join(base_dir, path)
+                digest = hashlib.sha1()
+                if entry.source_path is not None:
+                    info = zipfile.ZipInfo.from_file(entry.source_path, arcname)
+                    info.compress_type = zipfile.ZIP_DEFLATED \
+                        if entry.should_deflate(info.file_size) else zipfile.ZIP_STORED
+                    with open(entry.source_path, "rb") as source, archive.open(info, "w") as destination:
+                        shutil.copyfileobj(HashingReader(source, digest), destination, 1 << 20)
+                else:
+                    content = entry.get_content()
+                    digest.update(content)
+                    info = zipfile.ZipInfo(arcname, date_time)
+                    info.external_attr = 0o664 << 16
+                    info.compress_type = zipfile.ZIP_DEFLATED \
+                        if entry.should_deflate(len(content)) else zipfile.ZIP_STORED
+                    archive.writestr(info, content)
+                entry.set_digest(digest)
 
-        return file_model
+    def _write_tar(self, archive_file, base_dir, mode, entries):
+        now = time.time()
+        with tarfile.open(fileobj=archive_file, mode=mode, dereference=True) as archive:
+            for directory in sorted(self.directories):
+                info = tarfile.TarInfo(os.path.join(base_dir, directory))
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o775
+                info.mtime = now
+                archive.addfile(info)
+            for path in sorted(entries):
+                entry = entries[path]
+                arcname = os.path.join(base_dir, path)
+                digest = hashlib.sha1()
+                if entry.source_path is not None:
+                    info = archive.gettarinfo(entry.source_path, arcname)
+                    with open(entry.source_path, "rb") as source:
+                        archive.addfile(info, HashingReader(source, digest))
+                else:
+                    content = entry.get_content()
+                    digest.update(content)
+                    info = tarfile.TarInfo(arcname)
+                    info.size = len(content)
+                    info.mode = 0o664
+                    info.mtime = now
+                    archive.addfile(info, io.BytesIO(content))
+                entry.set_digest(digest)
 
-    def write_to_file(self, path, content):
-        absolute_path = self.get_absolute_path(path)
-        if isinstance(content, str):
-            file_ = open(absolute_path, "w")
-        else:
-            file_ = open(absolute_path, "wb")
-        file_.write(content)
-        file_.close()
+    def extract_archive_to_storage(self, name, format="zip", base_manifest=None):
+        """
+        Streams all entries into an archive created directly in the storage of FileModel
+        and returns the resulting FileModel.
+        """
+        if not self.exported:
+            raise ValueError("Export before requesting the archive")
+        if format != "zip" and format not in TAR_MODES:
+            raise ValueError("Unknown archive format {}".format(format))
 
-    def create_directory(self, path):
-        absolute_path = self.get_absolute_path(path)
-        os.makedirs(absolute_path, exist_ok=True)
+        file_model = FileModel(name="{}{}".format(name, ARCHIVE_EXTENSIONS[format]))
+        storage = file_model.file.storage
+        storage_name = storage.get_available_name(get_file_name(file_model, file_model.name))
+        storage_path = storage.path(storage_name)
+        os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+
+        base_dir = self.revision.problem_data.code_name
+        entries = self._get_entries_to_write(base_manifest)
+        try:
+            with open(storage_path, "xb") as archive_file:
+                if format == "zip":
+                    self._write_zip(archive_file, base_dir, entries)
+                else:
+                    self._write_tar(archive_file, base_dir, TAR_MODES[format], entries)
+        except Exception:
+            if os.path.exists(storage_path):
+                os.remove(storage_path)
+            raise
+        # The digests of the written entries were computed while they were streamed
+        self.manifest = {path: entry.get_digest() for path, entry in self.entries.items()}
+
+        file_model.file.name = storage_name
+        file_model.save()
+        return file_model
@@ -88,12 +88,14 @@ class JSONExporter(BaseExporter):
 
         self.create_directory(self.TESTS_DIR_NAME)
         ignored_testcases = []
+        generated_testcases = []
 
         for testcase in self.revision.testcase_set.all():
             if not testcase.input_file_generated() or not testcase.output_file_generated():
                 ignored_testcases.append(testcase)
                 logger.warning("Testcase {} couldn't be generated. Skipping".format(testcase.name))
                 continue
+            generated_testcases.append(testcase)
 
             self.extract_from_storage_to_path(
                 testcase.input_file,
@@ -105,7 +107,7 @@ class JSONExporter(BaseExporter):
             self.extract_from_storage_to_path(
                 testcase.output_file,
                 os.path.join(
-                    "tests",
+                    self.TESTS_DIR_NAME,
                     "{testcase_name}.out".format(testcase_name=generate_clean_name(testcase.name))
                 )
 
@@ -194,7 +196,9 @@ class JSONExporter(BaseExporter):
         export_resources_to_path("validators")
 
         # Exporting public
-        self.create_directory("repo")
+        # The public archive is made by tps inside a worktree of the commit.
+        # The worktree only lives in the exporter's workspace and isn't part of the archive.
+        os.makedirs(self.get_absolute_path("repo"), exist_ok=True)
 
         os.system('git --git-dir="{repo_dir}" worktree add {work_dir} {commit_id}'.format(
             repo_dir=self.revision.repository_path,
@@ -202,49 +206,46 @@ class JSONExporter(BaseExporter):
             commit_id=self.revision.commit_id
         ))
 
-        tests_dir_in_repo = os.path.join('repo', 'tests')
-        self.create_directory(tests_dir_in_repo)
+        tests_dir_in_repo = self.get_absolute_path(os.path.join('repo', 'tests'))
+        os.makedirs(tests_dir_in_repo, exist_ok=True)
 
-        for testcase in self.revision.testcase_set.all():
-            if not testcase.input_file_generated() or not testcase.output_file_generated():
-                ignored_testcases.append(testcase)
-                logger.warning("Testcase {} couldn't be generated. Skipping".format(testcase.name))
-                continue
-
-            self.extract_from_storage_to_path(
+        for testcase in generated_testcases:
+            self.copy_to_path(
                 testcase.input_file,
-                os.path.join(
-                    tests_dir_in_repo,
-                    "{testcase_name}.in".format(testcase_name=testcase.name)
-                ),
+                os.path.join(tests_dir_in_repo, "{testcase_name}.in".format(testcase_name=testcase.name))
             )
-            self.extract_from_storage_to_path(
+            self.copy_to_path(
                 testcase.output_file,
-                os.path.join(
-                    tests_dir_in_repo,
-                    "{testcase_name}.out".format(testcase_name=testcase.name)
-                )
-
+                os.path.join(tests_dir_in_repo, "{testcase_name}.out".format(testcase_name=testcase.name))
             )
-        
+
         try:
             print(subprocess.check_output(['tps', 'make-public'], cwd=self.get_absolute_path("repo"), stderr=subprocess.STDOUT))
         except subprocess.CalledProcessError as e:
             print(e.output)
             raise e
 
-        self.create_directory("attachments")
+        public_archive_name = "{}.zip".format(problem_data.code_name)
+        public_archive_path = os.path.join(self.archives_path, public_archive_name)
         try:
-            shutil.move(os.path.join(self.get_absolute_path("repo"),
-                                     "{}.zip".format(problem_data.code_name)),
-                        self.get_absolute_path("attachments"))
-        except OSError:
-            try:
-                shutil.move(os.path.join(self.get_absolute_path("repo"),
-                                         "{}.zip".format(problem_data.code_name)),
-                            self.get_absolute_path("attachments"))
-            except OSError as e:
-                logger.error("Public archive not found")
-                raise e
+            shutil.move(os.path.join(self.get_absolute_path("repo"), public_archive_name), public_archive_path)
+        except OSError as e:
+            logger.error("Public archive not found")
+            raise e
+        self.add_file_to_archive(public_archive_path, os.path.join("attachments", public_archive_name))
 
         shutil.rmtree(self.get_absolute_path("repo"))
+
+    def copy_to_path(self, file_model, absolute_path):
+        """
+        Copies the file to the given path of the workspace. The files are copied rather than linked,
+        since `tps make-public` may modify them and they must not change in the storage.
+        """
+        source_path = self.get_file_path(file_model)
+        if source_path is not None:
+            shutil.copyfile(source_path, absolute_path)
+        else:
+            file_ = file_model.file
+            file_.open()
+            with open(absolute_path, "wb") as destination:
+                shutil.copyfileobj(file_, destination)
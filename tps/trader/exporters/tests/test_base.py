@@ -0,0 +1,103 @@
+import json
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+import mock
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from file_repository.models import FileModel
+from trader.exporters.base import BaseExporter
+
+
+class SampleExporter(BaseExporter):
+
+    def __init__(self, revision, file_model):
+        super(SampleExporter, self).__init__(revision)
+        self.file_model = file_model
+
+    def _do_export(self):
+        self.write_to_file("problem.json", '{"code": "sample"}' * 20)
+        self.write_to_file("statement.md", "short")
+        self.extract_from_storage_to_path(self.file_model, "tests/01.in")
+        self.create_directory("empty")
+
+
+class BaseExporterTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.revision = mock.Mock()
+        self.revision.problem_data.code_name = "sample"
+        self.file_model = FileModel(name="01.in")
+        self.file_model.file.save("01.in", ContentFile(b"1 2 3\n" * 100))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def export(self, format):
+        with SampleExporter(self.revision, self.file_model) as exporter:
+            exporter.do_export()
+            return exporter.extract_archive_to_storage("sample", format=format)
+
+    def test_zip(self):
+        archive = self.export("zip")
+        self.assertEqual(archive.name, "sample.zip")
+        with zipfile.ZipFile(archive.file.path) as zip_file:
+            infos = {info.filename: info for info in zip_file.infolist()}
+            self.assertIn("sample/empty/", infos)
+            self.assertIn("sample/tests/", infos)
+            self.assertEqual(zip_file.read("sample/tests/01.in"), b"1 2 3\n" * 100)
+            self.assertEqual(infos["sample/tests/01.in"].compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(infos["sample/problem.json"].compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(infos["sample/statement.md"].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zip_file.read("sample/statement.md"), b"short")
+
+    def test_tar(self):
+        archive = self.export("tar")
+        self.assertEqual(archive.name, "sample.tar")
+        with tarfile.open(archive.file.path) as tar_file:
+            self.assertTrue(tar_file.getmember("sample/empty").isdir())
+            self.assertEqual(tar_file.extractfile("sample/tests/01.in").read(), b"1 2 3\n" * 100)
+            self.assertEqual(tar_file.extractfile("sample/problem.json").read(), b'{"code": "sample"}' * 20)
+
+    def test_export_required(self):
+        with SampleExporter(self.revision, self.file_model) as exporter:
+            with self.assertRaises(ValueError):
+                exporter.extract_archive_to_storage("sample")
+
+    def test_delta(self):
+        with SampleExporter(self.revision, self.file_model) as exporter:
+            exporter.do_export()
+            exporter.extract_archive_to_storage("sample")
+            manifest = exporter.manifest
+        self.assertEqual(set(manifest.keys()), {"problem.json", "statement.md", "tests/01.in"})
+
+        base_manifest = dict(manifest)
+        base_manifest["statement.md"] = "outdated"
+        base_manifest["tests/02.in"] = "removed"
+        with SampleExporter(self.revision, self.file_model) as exporter:
+            exporter.do_export()
+            archive = exporter.extract_archive_to_storage("sample", base_manifest=base_manifest)
+        with zipfile.ZipFile(archive.file.path) as zip_file:
+            names = {name for name in zip_file.namelist() if not name.endswith("/")}
+            self.assertEqual(names, {"sample/statement.md", "sample/delta.json"})
+            delta = json.loads(zip_file.read("sample/delta.json").decode())
+        self.assertEqual(delta, {"removed": ["tests/02.in"], "unchanged": 2})
+
+    def test_content_is_read_once(self):
+        read_statement = mock.Mock(return_value="statement")
+        with SampleExporter(self.revision, self.file_model) as exporter:
+            exporter.do_export()
+            exporter.write_to_file("statement.md", read_statement)
+            with mock.patch("trader.exporters.base.open", create=True, wraps=open) as open_file:
+                exporter.extract_archive_to_storage("sample")
+            self.assertEqual(read_statement.call_count, 1)
+            self.assertEqual(len([call for call in open_file.call_args_list
+                                  if call[0][0] == self.file_model.file.path]), 1)
+            self.assertEqual(set(exporter.manifest.keys()), {"problem.json", "statement.md", "tests/01.in"})